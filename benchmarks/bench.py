@@ -0,0 +1,225 @@
+"""
+Benchmarks for controller ticks, maneuver planning and PID updates, run
+against the simulated connection in krpctoolkit.sim.
+
+For each controller, reports the time per tick, the RPCs per tick and the
+peak memory allocated during a tick. For the planners and PID controllers,
+reports the time and RPCs per call. Every metric is lower-is-better.
+
+    python benchmarks/bench.py --output results.json
+    python benchmarks/bench.py --baseline results.json --threshold 0.1
+
+With --baseline, exits with status 1 if any metric is worse than the
+baseline by more than the threshold fraction.
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import numpy as np
+from krpctoolkit import sim
+from krpctoolkit import maneuver
+from krpctoolkit import kepler
+from krpctoolkit.orbit import OrbitState
+from krpctoolkit.attitude import RollController, PitchController, RotationRateController, AttitudeController
+from krpctoolkit.throttle import ThrottleMaxQController
+from krpctoolkit.launch import Ascend
+from krpctoolkit.staging import AutoStage
+from krpctoolkit.pid import PIDController, PIDBank
+
+controllers = []
+functions = []
+
+def controller(fn):
+    controllers.append(fn)
+    return fn
+
+def function(fn):
+    functions.append(fn)
+    return fn
+
+def launched():
+    """ A simulation climbing through the lower atmosphere """
+    s = sim.Simulation()
+    conn = s.connect()
+    vessel = conn.space_center.active_vessel
+    vessel.control.activate_next_stage()
+    vessel.control.throttle = 1
+    s.sleep(20)
+    return s, conn, vessel
+
+@controller
+def roll_controller():
+    s, conn, vessel = launched()
+    return s, RollController(conn, vessel, 0, vessel.surface_reference_frame)
+
+@controller
+def pitch_controller():
+    s, conn, vessel = launched()
+    return s, PitchController(conn, vessel, 0, vessel.surface_reference_frame)
+
+@controller
+def rotation_rate_controller():
+    s, conn, vessel = launched()
+    return s, RotationRateController(conn, vessel, (0, 0, 0), vessel.surface_reference_frame)
+
+@controller
+def attitude_controller():
+    s, conn, vessel = launched()
+    return s, AttitudeController(conn, vessel, (1, 0, 0), None, vessel.surface_reference_frame)
+
+@controller
+def throttle_max_q_controller():
+    s, conn, vessel = launched()
+    return s, ThrottleMaxQController(conn, vessel, 7000)
+
+@controller
+def ascend():
+    s, conn, vessel = launched()
+    return s, Ascend(conn, vessel, 1e9)
+
+@controller
+def auto_stage():
+    s, conn, vessel = launched()
+    staging = AutoStage(conn, vessel)
+    staging()
+    return s, staging
+
+@controller
+def execute_node():
+    """ Ticks at the end of the burn, once the cutoff has been scheduled """
+    s, conn, vessel = sim.orbiting()
+    node = vessel.control.add_node(s.ut + 1, prograde=100)
+    burn = maneuver.ExecuteNode(conn, vessel, node)
+    while burn.cutoff_ut is None:
+        burn()
+        s.sleep(0.05)
+    return s, burn
+
+@function
+def circularize():
+    s, conn, vessel = launched()
+    def call():
+        maneuver.circularize(conn, vessel).remove()
+    return s, call
+
+@function
+def hohmann_transfer():
+    s, conn, vessel = sim.orbiting(100000)
+    target = sim.orbiting(500000)[2]
+    return s, lambda: maneuver.hohmann_transfer(conn, vessel, target).remove()
+
+@function
+def time_to_ascending_node():
+    s, conn, vessel = sim.orbiting()
+    s.velocity = (0., s.velocity[1] * 0.99, s.velocity[1] * 0.1)
+    orbit = vessel.orbit
+    return s, lambda: maneuver.time_to_ascending_node(OrbitState.fetch(conn, orbit))
+
+@function
+def kepler_propagate_1000():
+    elements = kepler.Elements(
+        np.linspace(7e5, 1e7, 10), np.linspace(0, 0.9, 10), 0.1, 0.2, 0.3, 0., 0., 3.5316e12)
+    ut = np.linspace(0, 1e5, 100)
+    return None, lambda: kepler.propagate(elements[:, None], ut[None, :])
+
+@function
+def pid_update():
+    pid = PIDController(1, 0.1, 0.01, 0.02)
+    error = np.array((0.1, -0.2, 0.3))
+    position = np.array((1., 2., 3.))
+    return None, lambda: pid.update(error, position, (-1, -1, -1), (1, 1, 1))
+
+@function
+def pid_bank_update():
+    bank = PIDBank(36, 1, 0.1, 0.01, 0.02)
+    error = np.linspace(-1, 1, 36)
+    position = np.linspace(0, 2, 36)
+    return None, lambda: bank.update(error, position)
+
+def measure(setup, iterations):
+    s, fn = setup()
+    fn()
+
+    rpcs = 0
+    if s is not None:
+        rpcs = s.rpcs
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    elapsed = time.perf_counter() - start
+    if s is not None:
+        rpcs = s.rpcs - rpcs
+
+    tracemalloc.start()
+    peak = 0
+    for _ in range(min(iterations, 100)):
+        tracemalloc.reset_peak()
+        current = tracemalloc.get_traced_memory()[0]
+        fn()
+        peak += tracemalloc.get_traced_memory()[1] - current
+    tracemalloc.stop()
+
+    return {
+        'us': elapsed / iterations * 1e6,
+        'rpcs': rpcs / float(iterations),
+        'alloc_bytes': peak / float(min(iterations, 100))
+    }
+
+def run(iterations):
+    results = {}
+    for setup in controllers:
+        m = measure(setup, iterations)
+        results['controller.%s.us_per_tick' % setup.__name__] = m['us']
+        results['controller.%s.rpcs_per_tick' % setup.__name__] = m['rpcs']
+        results['controller.%s.alloc_bytes_per_tick' % setup.__name__] = m['alloc_bytes']
+    for setup in functions:
+        m = measure(setup, iterations)
+        results['function.%s.us_per_call' % setup.__name__] = m['us']
+        results['function.%s.rpcs_per_call' % setup.__name__] = m['rpcs']
+    return results
+
+def compare(results, baseline, threshold):
+    regressions = []
+    for name, value in sorted(results.items()):
+        if name not in baseline:
+            continue
+        base = baseline[name]
+        if value > base * (1 + threshold) and value - base > 1e-9:
+            regressions.append((name, base, value))
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark krpctoolkit controllers and planners')
+    parser.add_argument('--iterations', type=int, default=1000)
+    parser.add_argument('--output', help='write results to this JSON file')
+    parser.add_argument('--baseline', help='compare against results in this JSON file')
+    parser.add_argument('--threshold', type=float, default=0.1,
+                        help='fraction by which a metric may exceed the baseline')
+    args = parser.parse_args()
+
+    results = run(args.iterations)
+    for name, value in sorted(results.items()):
+        print('{:60} {:12.2f}'.format(name, value))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'iterations': args.iterations, 'results': results}, f, indent=2, sort_keys=True)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)['results']
+        regressions = compare(results, baseline, args.threshold)
+        for name, base, value in regressions:
+            print('REGRESSION {}: {:.2f} -> {:.2f}'.format(name, base, value))
+        if regressions:
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -1,14 +1,17 @@
-import krpc, curses, time, sys
-import numpy as np
-import numpy.linalg as la
+import krpc, curses
+from krpctoolkit.dashboard import Dashboard
 
-# Set up curses
-stdscr = curses.initscr()
-curses.nocbreak()
-stdscr.keypad(1)
-curses.noecho()
+def sas_text(sas, sas_mode):
+    if sas:
+        return 'SAS enabled (%s)' % str(sas_mode).split('.')[1]
+    return 'SAS disabled'
 
-try:
+def rcs_text(rcs):
+    if rcs:
+        return 'RCS enabled'
+    return 'RCS disabled'
+
+def main(stdscr):
 
     # Connect to kRPC
     conn = krpc.connect(name='Control Display')
@@ -22,34 +25,19 @@ try:
     sas_mode = conn.add_stream(getattr, control, 'sas_mode')
     rcs = conn.add_stream(getattr, control, 'rcs')
 
-    while True:
-
-        stdscr.clear()
-        stdscr.addstr(0,0,'-- Controls --')
-
-        if sas():
-            sas_text = 'SAS enabled (%s)' % str(sas_mode()).split('.')[1]
-        else:
-            sas_text = 'SAS disabled'
-        if rcs():
-            rcs_text = 'RCS enabled'
-        else:
-            rcs_text = 'RCS disabled'
-
-        # Output information
-        stdscr.addstr(2,0,'Pitch: {:+6.3f}'.format(pitch()))
-        stdscr.addstr(3,0,'Yaw:   {:+6.3f}'.format(yaw()))
-        stdscr.addstr(4,0,'Roll:  {:+6.3f}'.format(roll()))
-        stdscr.addstr(5,0,'Throttle: {:>3.0f}%'.format(throttle()*100.0))
-        stdscr.addstr(6,0,sas_text)
-        stdscr.addstr(7,0,rcs_text)
-
-        stdscr.refresh()
-        time.sleep(0.1)
-
-finally:
-    # Shutdown curses
-    curses.nocbreak()
-    stdscr.keypad(0)
-    curses.echo()
-    curses.endwin()
+    dash = Dashboard(stdscr)
+    panel = dash.panel('-- Controls --')
+    panel.text(2, 0, 'Pitch:')
+    panel.text(3, 0, 'Yaw:')
+    panel.text(4, 0, 'Roll:')
+    panel.text(5, 0, 'Throttle:')
+    panel.field(2, 7, '{:+6.3f}', pitch)
+    panel.field(3, 7, '{:+6.3f}', yaw)
+    panel.field(4, 7, '{:+6.3f}', roll)
+    panel.field(5, 10, lambda x: '{:>3.0f}%'.format(x*100.0), throttle)
+    panel.field(6, 0, sas_text, sas, sas_mode)
+    panel.field(7, 0, rcs_text, rcs)
+
+    dash.run(rate=20)
+
+curses.wrapper(main)
@@ -0,0 +1,47 @@
+import krpc, curses
+from krpctoolkit.dashboard import Dashboard
+from krpctoolkit.docking import DockingGuidance
+
+def main(stdscr):
+
+    # Connect to kRPC
+    conn = krpc.connect(name='Docking Guidance')
+    guidance = DockingGuidance(conn)
+
+    dash = Dashboard(stdscr, update=guidance.update)
+
+    dash.panel('-- Docking Guidance --', when=lambda: guidance.current is None) \
+        .text(2, 0, 'Awaiting control from docking port...')
+
+    dash.panel('-- Docking Guidance --',
+               when=lambda: guidance.current is not None and guidance.target is None) \
+        .text(2, 0, 'Awaiting target docking port...')
+
+    panel = dash.panel('-- Docking Guidance --', when=lambda: guidance.ready)
+    panel.text(2, 0, 'Current ship:')
+    panel.text(3, 0, 'Current port:')
+    panel.text(5, 0, 'Target ship:')
+    panel.text(6, 0, 'Target port:')
+    panel.text(8, 0, 'Status:')
+    panel.field(2, 14, lambda: '{:30}'.format(guidance.current.vessel_name[:30]))
+    panel.field(3, 14, lambda: '{:30}'.format(guidance.current.title[:30]))
+    panel.field(5, 14, lambda: '{:30}'.format(guidance.target.vessel_name[:30]))
+    panel.field(6, 14, lambda: '{:30}'.format(guidance.target.title[:30]))
+    panel.field(8, 8, lambda: '{:10}'.format(guidance.state_text))
+    panel.text(10, 0, '          +---------------------------+')
+    panel.text(11, 0, '          |  Distance  |  Speed       |')
+    panel.text(12, 0, '+---------+------------+--------------+')
+    panel.text(13, 0, '|         |            |              |')
+    panel.text(14, 0, '|   Axial |            |              |')
+    panel.text(15, 0, '|  Radial |            |              |')
+    panel.text(16, 0, '+---------+------------+--------------+')
+    panel.field(13, 13, '{:>+6.2f} m', lambda: guidance.distance)
+    panel.field(13, 26, '{:>+6.2f} m/s', lambda: guidance.speed)
+    panel.field(14, 13, '{:>+6.2f} m', lambda: guidance.axial_distance)
+    panel.field(14, 26, '{:>+6.2f} m/s', lambda: guidance.axial_speed)
+    panel.field(15, 13, '{:>+6.2f} m', lambda: guidance.radial_distance)
+    panel.field(15, 26, '{:>+6.2f} m/s', lambda: guidance.radial_speed)
+
+    dash.run(rate=20)
+
+curses.wrapper(main)
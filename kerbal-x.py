@@ -1,33 +1,44 @@
+import sys
 import krpc
-import time
+from krpctoolkit import events
 from krpctoolkit.launch import Ascend
+from krpctoolkit.ascent import PitchProgram
 from krpctoolkit.staging import AutoStage
 from krpctoolkit.maneuver import circularize, ExecuteNode
+from krpctoolkit.scheduler import Scheduler
+from krpctoolkit.streams import registry
 
 target_altitude = 120000
 
+# Optionally fly a pitch program from python -m krpctoolkit.ascent
+program = PitchProgram.load(sys.argv[1]) if len(sys.argv) > 1 else None
+
 conn = krpc.connect(name='Kerbal-X')
 vessel = conn.space_center.active_vessel
 
+scheduler = Scheduler()
+
 print('Launching')
-ascend = Ascend(conn, vessel, target_altitude)
-staging = AutoStage(conn, vessel)
-while not ascend():
-    staging()
-    time.sleep(0.1)
+ascend = scheduler.add(Ascend(conn, vessel, target_altitude, program=program), rate=10)
+staging = scheduler.add(AutoStage(conn, vessel, rate=2), rate=2)
+scheduler.run(until=ascend)
+scheduler.remove(staging)
 
 print('Coasting out of atmosphere')
-altitude = conn.add_stream(getattr, vessel.flight(), 'mean_altitude')
 atmosphere_altitude = vessel.orbit.body.atmosphere_depth * 1.01
-while altitude() < atmosphere_altitude:
-    pass
+coast = events.above(conn, atmosphere_altitude, getattr, vessel.flight(), 'mean_altitude')
+# Nothing to do until the vessel leaves the atmosphere
+coast.stream.rate = 2
+coast.wait()
+coast.remove()
 
 print('Circularizing')
 vessel.control.remove_nodes()
 node = circularize(conn, vessel)
-execute = ExecuteNode(conn, vessel, node)
-while not execute():
-    time.sleep(0.1)
+burn = ExecuteNode(conn, vessel, node)
+execute = scheduler.add(burn, rate=20)
+scheduler.run(until=execute)
+print('Cutoff error %.3f m/s' % burn.cutoff_error)
 node.remove()
 
-print('Complete')
+print('Complete, %d streams live' % registry(conn).live)
@@ -0,0 +1,315 @@
+"""
+Offline optimization of the pitch program flown by launch.Ascend.
+
+simulate() flies a planar ascent of a point mass described by its stages
+(mass, thrust and specific impulse) and drag area, with the same models as
+krpctoolkit.sim: an exponential atmosphere, specific impulse that varies
+with pressure, and the throttle limited by ThrottleMaxQController. The
+engines are cut once the apoapsis reaches the target, and the vessel
+coasts out of the atmosphere. An ascent is scored by the delta-v the
+vessel has left once it has circularized at the target altitude.
+
+optimize() searches turn start altitude, turn shape and turn end altitude
+on a grid, refining around the best ascent, with the simulations split
+across a process pool. The result is a PitchProgram: pitch at evenly
+spaced altitudes through the turn. Ascend interpolates it, in constant
+time and with no RPCs:
+
+    stages = [Stage(71250., 19250., 2000e3, 310., 285.), Stage(12250., 4250., 215e3, 320., 170.)]
+    program = optimize(stages, 120000, processes=4).program
+    program.save('kerbal-x.json')
+    ascend = Ascend(conn, vessel, 120000, program=PitchProgram.load('kerbal-x.json'))
+"""
+
+import itertools
+import json
+import math
+from concurrent.futures import ProcessPoolExecutor
+from krpctoolkit.sim import BodySpec, G0
+
+# Number of pitches stored in a program, evenly spaced through the turn
+POINTS = 32
+
+class Stage(object):
+    """
+    A stage of a vessel, in firing order. mass is the mass of the vessel when
+    the stage ignites, dry_mass its mass when the stage's fuel runs out,
+    and thrust the vacuum thrust in N.
+    """
+
+    def __init__(self, mass, dry_mass, thrust, isp_vac, isp_asl):
+        self.mass = mass
+        self.dry_mass = dry_mass
+        self.thrust = thrust
+        self.isp_vac = isp_vac
+        self.isp_asl = isp_asl
+
+    @property
+    def flow(self):
+        return self.thrust / (self.isp_vac * G0)
+
+    @property
+    def delta_v(self):
+        return self.isp_vac * G0 * math.log(self.mass / self.dry_mass)
+
+def stages_from_specs(parts):
+    """
+    Stages of a vessel built from simulator PartSpecs, where each stage's
+    engines burn the fuel decoupled with them at the next stage.
+    """
+    current = max([p.stage for p in parts] + [p.decouple_stage for p in parts]) + 1
+    stages = []
+    for stage in range(current - 1, -1, -1):
+        remaining = [p for p in parts if p.decouple_stage < stage]
+        dropped = [p for p in remaining if p.decouple_stage == stage - 1]
+        engines = [p.engine for p in dropped if p.engine is not None and p.stage >= stage]
+        fuel = sum(p.fuel_mass for p in dropped)
+        if not engines or fuel <= 0:
+            continue
+        mass = sum(p.dry_mass + p.fuel_mass for p in remaining)
+        thrust = sum(e.thrust for e in engines)
+        flow = sum(e.thrust / e.isp_vac for e in engines)
+        flow_asl = sum(e.thrust / e.isp_vac / e.isp_asl for e in engines)
+        stages.append(Stage(mass, mass - fuel, thrust, thrust / flow, flow / flow_asl))
+    return stages
+
+class PitchProgram(object):
+    """
+    Pitch in degrees against altitude. The vessel climbs vertically below
+    turn_start, follows the table (evenly spaced from turn_start to
+    turn_end) through the turn, and holds the last pitch above it.
+    """
+
+    def __init__(self, turn_start, turn_end, pitches):
+        self.turn_start = float(turn_start)
+        self.turn_end = float(turn_end)
+        self.pitches = [float(x) for x in pitches]
+        self._scale = (len(self.pitches) - 1) / (self.turn_end - self.turn_start)
+        self._last = len(self.pitches) - 1
+
+    @classmethod
+    def turn(cls, turn_start, turn_end, shape=1., points=POINTS):
+        """ Pitch falling from 90 to 0 degrees as 90 (1 - x^shape), where x is the fraction of the turn """
+        return cls(turn_start, turn_end, [90. * (1 - (float(i) / (points - 1))**shape) for i in range(points)])
+
+    def __call__(self, altitude):
+        x = (altitude - self.turn_start) * self._scale
+        if x <= 0:
+            return 90.
+        i = int(x)
+        if i >= self._last:
+            return self.pitches[-1]
+        pitches = self.pitches
+        return pitches[i] + (pitches[i+1] - pitches[i]) * (x - i)
+
+    def __repr__(self):
+        return 'PitchProgram(turn_start=%g, turn_end=%g, %d points)' % (
+            self.turn_start, self.turn_end, len(self.pitches))
+
+    def to_dict(self):
+        return {'turn_start': self.turn_start, 'turn_end': self.turn_end,
+                'pitches': [round(x, 3) for x in self.pitches]}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data['turn_start'], data['turn_end'], data['pitches'])
+
+    def save(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.to_dict(), f)
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as f:
+            return cls.from_dict(json.load(f))
+
+class Ascent(object):
+    """ The outcome of a simulated ascent """
+
+    def __init__(self, program, time, apoapsis, periapsis, mass, burned, circularize, delta_v):
+        self.program = program
+        self.time = time
+        self.apoapsis = apoapsis
+        self.periapsis = periapsis
+        self.mass = mass
+        self.burned = burned
+        self.circularize = circularize
+        # Delta-v left after circularizing at the target altitude
+        self.delta_v = delta_v
+
+    def __repr__(self):
+        return 'Ascent(delta_v=%.1f, apoapsis=%.0f, periapsis=%.0f, mass=%.0f)' % (
+            self.delta_v, self.apoapsis, self.periapsis, self.mass)
+
+def _apsides(mu, x, y, vx, vy):
+    r = math.hypot(x, y)
+    energy = (vx*vx + vy*vy) / 2 - mu / r
+    h = x*vy - y*vx
+    if energy >= 0:
+        return float('inf'), float('nan')
+    a = -mu / (2 * energy)
+    e = math.sqrt(max(0., 1 + 2*energy*h*h / (mu*mu)))
+    return a * (1 + e), a * (1 - e)
+
+def _circularize(mu, apoapsis, periapsis, target):
+    """ Delta-v to circularize at apoapsis, then move to a circular orbit at target """
+    a = (apoapsis + periapsis) / 2
+    delta_v = math.sqrt(mu / apoapsis) - math.sqrt(mu * (2/apoapsis - 1/a))
+    if target != apoapsis:
+        a = (apoapsis + target) / 2
+        delta_v += abs(math.sqrt(mu * (2/apoapsis - 1/a)) - math.sqrt(mu / apoapsis))
+        delta_v += abs(math.sqrt(mu / target) - math.sqrt(mu * (2/target - 1/a)))
+    return delta_v
+
+def simulate(stages, program, target_altitude, body=None, drag_area=1.5, max_q=7000., step=0.1,
+             max_time=1000.):
+    """
+    Fly an ascent with a pitch program. Returns an Ascent, or None if the
+    vessel runs out of delta-v or its apoapsis is inside the atmosphere.
+    """
+    if body is None:
+        body = BodySpec()
+    mu = body.gravitational_parameter
+    R = body.equatorial_radius
+    atmosphere = body.atmosphere_depth
+    target = R + target_altitude
+    high = max_q * 1.1
+    low = max_q * 0.9
+
+    x, y = R, 0.
+    vx, vy = 0., 0.
+    time = 0.
+    index = 0
+    stage = stages[0]
+    mass = stage.mass
+    burned = 0.
+    burning = True
+
+    while time < max_time:
+        r = math.hypot(x, y)
+        altitude = r - R
+        ux, uy = x / r, y / r
+        ratio = math.exp(-max(0., altitude) / body.scale_height) if altitude < atmosphere else 0.
+        speed = math.hypot(vx, vy)
+        q = 0.5 * body.surface_density * ratio * speed * speed
+
+        g = -mu / (r*r)
+        ax, ay = g*ux, g*uy
+        if speed > 0:
+            drag = q * drag_area / (mass * speed)
+            ax -= drag * vx
+            ay -= drag * vy
+
+        if burning:
+            if _apsides(mu, x, y, vx, vy)[0] > target:
+                burning = False
+            else:
+                while mass <= stage.dry_mass:
+                    index += 1
+                    if index == len(stages):
+                        return None
+                    stage = stages[index]
+                    mass = stage.mass
+                if q < low:
+                    throttle = 1.
+                elif q > high:
+                    throttle = 0.
+                else:
+                    throttle = (high - q) / (high - low)
+                isp = stage.isp_vac + (stage.isp_asl - stage.isp_vac) * ratio
+                accel = stage.flow * throttle * isp * G0 / mass
+                pitch = math.radians(program(altitude))
+                c, s = math.cos(pitch), math.sin(pitch)
+                # Heading east, perpendicular to up in the plane of the ascent
+                ax += accel * (s*ux - c*uy)
+                ay += accel * (s*uy + c*ux)
+                burned += accel * step
+                mass = max(stage.dry_mass, mass - stage.flow * throttle * step)
+        elif altitude > atmosphere:
+            break
+        elif ux*vx + uy*vy < 0:
+            return None
+
+        vx += ax * step
+        vy += ay * step
+        x += vx * step
+        y += vy * step
+        time += step
+        if math.hypot(x, y) < R:
+            x, y = R * ux, R * uy
+            vx, vy = 0., 0.
+    else:
+        return None
+
+    apoapsis, periapsis = _apsides(mu, x, y, vx, vy)
+    if not apoapsis < float('inf'):
+        return None
+    circularize = _circularize(mu, apoapsis, periapsis, target)
+
+    # Check the remaining stages can make the circularization burn
+    available = stage.isp_vac * G0 * math.log(mass / stage.dry_mass)
+    available += sum(s.delta_v for s in stages[index+1:])
+    if available < circularize:
+        return None
+    return Ascent(program, time, apoapsis - R, periapsis - R, mass, burned, circularize,
+                  available - circularize)
+
+def _simulate(args):
+    stages, target_altitude, body, drag_area, max_q, (turn_start, shape, turn_end) = args
+    program = PitchProgram.turn(turn_start, turn_end, shape)
+    return simulate(stages, program, target_altitude, body, drag_area, max_q)
+
+def _grid(center, spacing, count, bounds):
+    low, high = bounds
+    values = [center + spacing * (i - (count - 1) / 2.) for i in range(count)]
+    return sorted(set(min(high, max(low, x)) for x in values))
+
+def optimize(stages, target_altitude, body=None, drag_area=1.5, max_q=7000., count=6, refinements=2,
+             processes=None):
+    """
+    Search for the pitch program that leaves the most delta-v once the
+    vessel has circularized at target_altitude. Each pass simulates a grid of count values of turn start
+    altitude, turn shape and turn end altitude, and each refinement halves
+    the spacing of the grid around the best so far. If processes is given,
+    the simulations are split across a pool of that many processes.
+    Returns the best Ascent; its program is the pitch program to fly.
+    """
+    if body is None:
+        body = BodySpec()
+    atmosphere = body.atmosphere_depth
+    bounds = ((50., atmosphere * 0.2), (0.2, 2.), (atmosphere * 0.2, atmosphere * 1.2))
+    center = [sum(b) / 2 for b in bounds]
+    spacing = [(b[1] - b[0]) / (count - 1) for b in bounds]
+
+    pool = ProcessPoolExecutor(processes) if processes and processes > 1 else None
+    try:
+        best = None
+        for _ in range(refinements + 1):
+            grids = [_grid(c, s, count, b) for c, s, b in zip(center, spacing, bounds)]
+            points = [p for p in itertools.product(*grids) if p[0] < p[2]]
+            args = [(stages, target_altitude, body, drag_area, max_q, p) for p in points]
+            if pool is None:
+                results = map(_simulate, args)
+            else:
+                results = pool.map(_simulate, args, chunksize=max(1, len(args) // (4 * processes)))
+            for point, ascent in zip(points, results):
+                if ascent is not None and (best is None or ascent.delta_v > best.delta_v):
+                    best = ascent
+                    center = list(point)
+            spacing = [s / 2 for s in spacing]
+    finally:
+        if pool is not None:
+            pool.shutdown()
+    if best is None:
+        raise ValueError('No pitch program reaches %g m' % target_altitude)
+    return best
+
+if __name__ == '__main__':
+    import sys
+    from krpctoolkit.sim import kerbal_x
+    target_altitude = float(sys.argv[1]) if len(sys.argv) > 1 else 120000.
+    best = optimize(stages_from_specs(kerbal_x()), target_altitude)
+    print(best)
+    print(best.program)
+    if len(sys.argv) > 2:
+        best.program.save(sys.argv[2])
@@ -1,19 +1,27 @@
 #https://ghowen.me/build-your-own-quadcopter-autopilot/
 import numpy as np
 from krpctoolkit.pid import PIDController
+from krpctoolkit.streams import add_stream
 import math
 
 class RollController(object):
     def __init__(self, conn, vessel, target, ref, mult=1):
         self.control = vessel.control
         self.target = target * (math.pi/180.)
-        self.roll = conn.add_stream(getattr, vessel.flight(ref), 'roll')
+        self.roll = add_stream(conn, getattr, vessel.flight(ref), 'roll')
         self.mult = mult
 
     def __call__(self):
         roll = self.error * self.mult
         self.control.roll = roll
 
+    @property
+    def streams(self):
+        return (self.roll,)
+
+    def close(self):
+        self.roll.remove()
+
     @property
     def error(self):
         return self.target - self.roll()
@@ -22,14 +30,20 @@ class PitchController(object):
     def __init__(self, conn, vessel, target, ref, mult=1):
         self.control = vessel.control
         self.target = target * (math.pi/180.)
-        #self.velocity = conn.add_stream(getattr, vessel.flight(ref), 'prograde')
-        self.velocity = lambda: vessel.flight(ref).prograde
+        self.velocity = add_stream(conn, getattr, vessel.flight(ref), 'prograde')
         self.mult = mult
 
     def __call__(self):
         pitch = self.error * self.mult
         self.control.pitch = float(pitch) #TODO: why is this double?!?!
 
+    @property
+    def streams(self):
+        return (self.velocity,)
+
+    def close(self):
+        self.velocity.remove()
+
     @property
     def error(self):
         angle = np.dot(self.velocity(), (1,0,0))
@@ -40,12 +54,12 @@ class RotationRateController(object):
         self.pid = PIDController()
         self.target = np.array(target)
         self._control = vessel.control
-        self._velocity = conn.add_stream(vessel.angular_velocity, ref)
-        self._pitch_dir = conn.add_stream(
-            conn.space_center.transform_direction, (1,0,0), vessel.reference_frame, ref)
-        self._yaw_dir = conn.add_stream(
-            conn.space_center.transform_direction, (0,0,1), vessel.reference_frame, ref)
-        self._roll_dir = conn.add_stream(vessel.direction, ref)
+        self._velocity = add_stream(conn, vessel.angular_velocity, ref)
+        self._pitch_dir = add_stream(
+            conn, conn.space_center.transform_direction, (1,0,0), vessel.reference_frame, ref)
+        self._yaw_dir = add_stream(
+            conn, conn.space_center.transform_direction, (0,0,1), vessel.reference_frame, ref)
+        self._roll_dir = add_stream(conn, vessel.direction, ref)
 
     def __call__(self):
         output = self.pid.update(self.error, self.target, (-1,-1,-1), (1,1,1))
@@ -53,6 +67,14 @@ class RotationRateController(object):
         self._control.yaw = float(output[1])
         self._control.roll = float(output[2])
 
+    @property
+    def streams(self):
+        return (self._velocity, self._pitch_dir, self._yaw_dir, self._roll_dir)
+
+    def close(self):
+        for stream in self.streams:
+            stream.remove()
+
     @property
     def error(self):
         err = self.target - np.array(self._velocity())
@@ -65,8 +87,8 @@ class AttitudeController(object):
     def __init__(self, conn, vessel, target_direction, target_roll, ref):
         self.target_direction = target_direction
         self.target_roll = target_roll
-        self._direction = conn.add_stream(vessel.direction, ref)
-        self._roll = conn.add_stream(getattr, vessel.flight(ref), 'roll')
+        self._direction = add_stream(conn, vessel.direction, ref)
+        self._roll = add_stream(conn, getattr, vessel.flight(ref), 'roll')
         self.rate_controller = RotationRateController(conn, vessel, (0,0,0), ref)
         self.pid = self.rate_controller.pid
 
@@ -76,6 +98,15 @@ class AttitudeController(object):
             self.rate_controller.target += self.target_direction * (self.roll_error/90)
         self.rate_controller()
 
+    @property
+    def streams(self):
+        return (self._direction, self._roll) + self.rate_controller.streams
+
+    def close(self):
+        self._direction.remove()
+        self._roll.remove()
+        self.rate_controller.close()
+
     @property
     def target_direction(self):
         return self._target_direction
@@ -0,0 +1,48 @@
+from krpctoolkit import strict
+
+def batch(conn, calls):
+    """
+    Make several calls in a single request, and return their results.
+    Calls are given in the same form as for add_stream, for example
+    (getattr, orbit, 'eccentricity') or (vessel.position, frame). The
+    server executes all of them in the same physics frame, so the results
+    are consistent with each other.
+
+    The request is sent through conn._invoke_batch, if set, so that it is
+    seen by the profiler, and is checked by strict mode like a call
+    through conn._invoke.
+    """
+    if not hasattr(conn, '_rpc_connection'):
+        return conn._batch(calls)
+    from krpc.schema import KRPC_pb2 as KRPC
+    from krpc.decoder import Decoder
+
+    request = KRPC.Request()
+    return_types = []
+    for call in calls:
+        func, args = call[0], call[1:]
+        request.calls.extend([conn.get_call(func, *args)])
+        return_types.append(conn._get_return_type(func, *args))
+
+    strict.check(conn, 'batch', _procedures(request), any(t is not None for t in return_types))
+    invoke = getattr(conn, '_invoke_batch', None)
+    response = invoke(request) if invoke is not None else invoke_batch(conn, request)
+
+    if response.HasField('error'):
+        raise conn._build_error(response.error)
+    results = []
+    for result, return_type in zip(response.results, return_types):
+        if result.HasField('error'):
+            raise conn._build_error(result.error)
+        results.append(Decoder.decode(conn, result.value, return_type))
+    return results
+
+def invoke_batch(conn, request):
+    """ Send a request of several calls, and return the response """
+    from krpc.schema import KRPC_pb2 as KRPC
+    with conn._rpc_connection_lock:
+        conn._rpc_connection.send_message(request)
+        return conn._rpc_connection.receive_message(KRPC.Response)
+
+def _procedures(request):
+    return ','.join('%s.%s' % (call.service, call.procedure) for call in request.calls)
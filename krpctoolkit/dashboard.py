@@ -0,0 +1,134 @@
+"""
+Curses telemetry displays that only redraw what has changed.
+
+A dashboard is made of panels. Each panel has static text, which is drawn
+once, and fields, which format the values of streams (or any other
+callables). Each frame, a field is only written to the screen if its
+formatted text differs from what is already there, and the screen is never
+cleared, so the display does not flicker and little is sent to the
+terminal. A panel can be given a condition, and is only shown while the
+condition holds. An update function can be given to compute values shared
+by several fields once at the start of each frame.
+
+Calling the dashboard draws one frame, so it can be scheduled alongside
+controllers, at a rate independent of the rate the data arrives:
+
+    def main(stdscr):
+        dash = Dashboard(stdscr)
+        panel = dash.panel('-- Controls --')
+        panel.text(2, 0, 'Pitch:')
+        panel.field(2, 7, '{:+6.3f}', pitch)
+        dash.run(rate=20)
+
+    curses.wrapper(main)
+"""
+
+import curses
+from krpctoolkit.scheduler import Scheduler
+
+class Field(object):
+    def __init__(self, row, col, fmt, sources):
+        self.row = row
+        self.col = col
+        self.fmt = fmt
+        self.sources = sources
+        self.text = None
+
+    def format(self):
+        values = [source() for source in self.sources]
+        if callable(self.fmt):
+            return self.fmt(*values)
+        return self.fmt.format(*values)
+
+class Panel(object):
+    def __init__(self, title=None, row=0, col=0, when=None):
+        self.row = row
+        self.col = col
+        self.when = when
+        self.static = []
+        self.fields = []
+        if title is not None:
+            self.text(0, 0, title)
+
+    def text(self, row, col, text):
+        """ Add static text, at a position relative to the panel """
+        self.static.append((row, col, text))
+
+    def field(self, row, col, fmt, *sources):
+        """
+        Add a field showing the values of sources, formatted with fmt. fmt
+        is either a format string or a function taking the values and
+        returning a string.
+        """
+        field = Field(row, col, fmt, sources)
+        self.fields.append(field)
+        return field
+
+    @property
+    def visible(self):
+        return self.when is None or bool(self.when())
+
+class Dashboard(object):
+    def __init__(self, stdscr, update=None):
+        self.stdscr = stdscr
+        self.update = update
+        self.panels = []
+        self.writes = 0
+        self._shown = None
+        try:
+            curses.curs_set(0)
+        except curses.error:
+            pass
+
+    def panel(self, title=None, row=0, col=0, when=None):
+        panel = Panel(title, row, col, when)
+        self.panels.append(panel)
+        return panel
+
+    def __call__(self):
+        """ Draw a frame """
+        if self.update is not None:
+            self.update()
+        shown = [panel for panel in self.panels if panel.visible]
+        if shown != self._shown:
+            # The layout has changed, so start again from a blank screen
+            self._shown = shown
+            self.stdscr.erase()
+            for panel in shown:
+                for row, col, text in panel.static:
+                    self._write(panel.row + row, panel.col + col, text)
+                for field in panel.fields:
+                    field.text = None
+
+        for panel in shown:
+            for field in panel.fields:
+                text = field.format()
+                if text == field.text:
+                    continue
+                # Blank out the end of longer text left from the last frame
+                padded = text
+                if field.text is not None and len(field.text) > len(text):
+                    padded = text.ljust(len(field.text))
+                self._write(panel.row + field.row, panel.col + field.col, padded)
+                field.text = text
+
+        self.stdscr.noutrefresh()
+        curses.doupdate()
+
+    def _write(self, row, col, text):
+        self.writes += 1
+        try:
+            self.stdscr.addstr(row, col, text)
+        except curses.error:
+            # Text that does not fit in the terminal is clipped
+            pass
+
+    def run(self, rate=20, scheduler=None):
+        """ Redraw rate times per second, until interrupted """
+        if scheduler is None:
+            scheduler = Scheduler()
+        scheduler.add(self, rate=rate, name='dashboard')
+        try:
+            scheduler.run()
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,322 @@
+"""
+Compute the delta-v of each stage of a vessel.
+
+The parts of the vessel are fetched once, and converted to arrays and
+adjacency lists indexed by part number. Each burn segment then finds the
+tanks each engine draws from using the fuel flow rules, with an iterative
+search over the precomputed crossfeed and fuel line graph, and burns until
+the first tank empties, updating an array of tank masses. Stage masses are
+sums over a mask of the parts still attached.
+
+    python -m krpctoolkit.deltav
+
+See http://forum.kerbalspaceprogram.com/threads/64362-Fuel-Flow-Rules-%280-24-2%29
+for the fuel flow rules.
+"""
+
+import math
+import numpy as np
+from krpctoolkit.pool import snapshot_parts
+
+G0 = 9.82
+
+# Propellants below this mass (in kg) are treated as empty
+EMPTY = 0.1
+
+class PartData(object):
+    """ The properties of a part needed to compute delta-v. Parts are referred to by index. """
+
+    def __init__(self, mass, dry_mass, stage, decouple_stage, parent=None, children=(),
+                 crossfeed=True, axially_attached=True, fuel_lines_from=(), resources=None,
+                 engine=None, launch_clamp=False):
+        self.mass = mass
+        self.dry_mass = dry_mass
+        self.stage = stage
+        self.decouple_stage = decouple_stage
+        self.parent = parent
+        self.children = list(children)
+        self.crossfeed = crossfeed
+        self.axially_attached = axially_attached
+        self.fuel_lines_from = list(fuel_lines_from)
+        self.resources = resources or {}
+        self.engine = engine
+        self.launch_clamp = launch_clamp
+
+class EngineData(object):
+    """ ratios are the fractions of the mass flow of each propellant, split evenly if not given """
+
+    def __init__(self, thrust, isp, propellants, ratios=None):
+        self.thrust = thrust
+        self.isp = isp
+        self.propellants = list(propellants)
+        if ratios is None:
+            ratios = dict((name, 1. / len(self.propellants)) for name in self.propellants)
+        self.ratios = ratios
+
+class StageInfo(object):
+    def __init__(self, stage, time, mass, dry_mass, isp, delta_v, twr):
+        self.stage = stage
+        self.time = time
+        self.mass = mass
+        self.dry_mass = dry_mass
+        self.isp = isp
+        self.delta_v = delta_v
+        self.twr = twr
+
+def _resources(part):
+    resources = part.resources
+    return dict((name, resources.amount(name)) for name in resources.names)
+
+def _engine(part):
+    engine = part.engine
+    if engine is None:
+        return None
+    # Ratios by volume for now, converted to mass by fetch_parts
+    return EngineData(
+        engine.max_thrust * engine.thrust_limit,
+        engine.vacuum_specific_impulse,
+        engine.propellants,
+        dict(engine.propellant_ratios))
+
+PART_FIELDS = [
+    'mass', 'dry_mass', 'stage', 'decouple_stage', 'parent', 'children', 'crossfeed',
+    'axially_attached', 'fuel_lines_from', 'launch_clamp',
+    ('resources', _resources), ('engine', _engine)
+]
+
+def fetch_parts(conn, vessel, pool=None):
+    """
+    Get the data for all parts of a vessel. If a ConnectionPool is given,
+    the parts are fetched in parallel across its connections.
+    """
+    table = snapshot_parts(pool, vessel, PART_FIELDS)
+    index = dict((part, i) for i, part in enumerate(table.parts))
+    densities = {}
+
+    def density(name):
+        if name not in densities:
+            densities[name] = conn.space_center.Resources.density(name)
+        return densities[name]
+
+    result = []
+    for i in range(len(table)):
+        row = table.row(i)
+        resources = dict((name, amount * density(name)) for name, amount in row['resources'].items())
+        engine = row['engine']
+        if engine is not None and engine.ratios:
+            masses = dict((name, ratio * density(name)) for name, ratio in engine.ratios.items())
+            total = sum(masses.values())
+            engine.ratios = dict((name, mass / total) for name, mass in masses.items())
+        parent = row['parent']
+        result.append(PartData(
+            mass=row['mass'],
+            dry_mass=row['dry_mass'],
+            stage=row['stage'],
+            decouple_stage=row['decouple_stage'],
+            parent=index[parent] if parent is not None else None,
+            children=[index[x] for x in row['children']],
+            crossfeed=row['crossfeed'],
+            axially_attached=row['axially_attached'],
+            fuel_lines_from=[index[x] for x in row['fuel_lines_from']],
+            resources=resources,
+            engine=engine,
+            launch_clamp=row['launch_clamp'] is not None))
+    return result
+
+class FuelGraph(object):
+    """ The parts of a vessel as arrays, with the tank masses that change as it burns """
+
+    def __init__(self, parts):
+        n = len(parts)
+        self.n = n
+        self.propellants = sorted(set(name for part in parts for name in part.resources))
+        self.propellant_index = dict((name, i) for i, name in enumerate(self.propellants))
+
+        # Parts with resources count their dry mass plus the fuel left
+        self.base_mass = np.array([
+            part.dry_mass if part.resources else part.mass for part in parts], dtype=float)
+        self.decouple_stage = np.array([part.decouple_stage for part in parts])
+        self.stage = np.array([part.stage for part in parts])
+        self.launch_clamp = np.array([part.launch_clamp for part in parts], dtype=bool)
+        self.fuel = np.zeros((n, len(self.propellants)))
+        for i, part in enumerate(parts):
+            for name, mass in part.resources.items():
+                self.fuel[i, self.propellant_index[name]] = mass
+        self.attached = np.ones(n, dtype=bool)
+
+        # Where a part draws fuel from: fuel lines (rule 2), then the
+        # axially attached parts it can crossfeed from (rule 4)
+        self.fuel_lines_from = [part.fuel_lines_from for part in parts]
+        self.crossfeed_from = []
+        for part in parts:
+            neighbours = []
+            if part.crossfeed:
+                neighbours = [x for x in part.children if parts[x].axially_attached]
+                if part.parent is not None and part.axially_attached:
+                    neighbours.append(part.parent)
+            self.crossfeed_from.append(neighbours)
+
+        self.engines = [(i, part.engine) for i, part in enumerate(parts) if part.engine is not None]
+
+    def has_fuel(self, part, propellant):
+        return self.attached[part] and self.fuel[part, propellant] > EMPTY
+
+    def find_tanks(self, root, propellant):
+        """
+        The tanks an engine on part root draws a propellant from. This is
+        a depth first search, with an explicit stack of (part, rule, next
+        neighbour, tanks found) frames in place of recursion.
+        """
+        visited = bytearray(self.n)
+        visited[root] = 1
+        stack = [[root, 0, 0, []]]
+        result = None
+        while stack:
+            frame = stack[-1]
+            part, rule, i, tanks = frame
+            if result is not None:
+                tanks.extend(result)
+                result = None
+            sources = self.fuel_lines_from[part] if rule == 0 else self.crossfeed_from[part]
+            while i < len(sources) and visited[sources[i]]:
+                i += 1
+            if i < len(sources):
+                frame[2] = i + 1
+                visited[sources[i]] = 1
+                stack.append([sources[i], 0, 0, []])
+                continue
+            if tanks:
+                result = tanks
+            elif rule == 0 and self.crossfeed_from[part]:
+                frame[1] = 1
+                frame[2] = 0
+                continue
+            elif self.has_fuel(part, propellant):
+                # Rule 5
+                result = [part]
+            else:
+                # Rules 6 and 8
+                result = []
+            stack.pop()
+        return result
+
+    def stage_mass(self, stage):
+        """ Mass of the parts that have not been decoupled by the given stage """
+        mask = self.decouple_stage < stage
+        return self.base_mass[mask].sum() + self.fuel[mask].sum()
+
+def stage_table(parts):
+    """ Compute the burn time, masses, Isp, delta-v and TWR of each stage """
+    graph = FuelGraph(parts)
+    if graph.n == 0:
+        return []
+
+    # Parts activated in each stage, excluding those decoupled in the same stage
+    stages = {}
+    for i in range(graph.n):
+        stages.setdefault(int(graph.stage[i]), [])
+        if graph.decouple_stage[i] != graph.stage[i]:
+            stages[int(graph.stage[i])].append(i)
+
+    # Merge adjacent stages that do not decouple any parts (ignoring launch clamps)
+    decouples = np.bincount(graph.decouple_stage[~graph.launch_clamp] + 1,
+                            minlength=max(stages) + 2)
+    for stage in range(max(stages), 0, -1):
+        if stage in stages and decouples[stage+1] == 0 and decouples[stage] == 0:
+            stages.setdefault(stage-1, []).extend(stages.pop(stage))
+
+    engine_of = dict(graph.engines)
+    active = {}
+    table = []
+    for stage in sorted(stages, reverse=True):
+
+        # Remove jettisoned parts
+        jettisoned = graph.decouple_stage == stage
+        graph.attached[jettisoned] = False
+        for part in np.flatnonzero(jettisoned):
+            active.pop(int(part), None)
+
+        total_mass = graph.stage_mass(stage)
+
+        for part in stages[stage]:
+            if part in engine_of:
+                active[part] = engine_of[part]
+
+        # Burn until an engine flames out
+        burn_time = 0
+        while active:
+            flow = np.zeros_like(graph.fuel)
+            flameout = False
+            for part, engine in active.items():
+                flow_rate = engine.thrust / (engine.isp * G0)
+                if 'SolidFuel' in engine.propellants:
+                    # An SRB is its own fuel tank
+                    k = graph.propellant_index.get('SolidFuel')
+                    if k is None or not graph.has_fuel(part, k):
+                        flameout = True
+                        break
+                    flow[part, k] += flow_rate
+                    continue
+                for propellant in engine.propellants:
+                    k = graph.propellant_index.get(propellant)
+                    tanks = [] if k is None else graph.find_tanks(part, k)
+                    if not tanks:
+                        flameout = True
+                        break
+                    ratio = engine.ratios.get(propellant, 1. / len(engine.propellants))
+                    flow[tanks, k] += flow_rate * ratio / len(tanks)
+                if flameout:
+                    break
+            if flameout:
+                break
+
+            # Burn until the first tank is empty
+            burning = flow > 0
+            if not burning.any():
+                break
+            segment = (graph.fuel[burning] / flow[burning]).min()
+            graph.fuel -= flow * segment
+            burn_time += segment
+
+        dry_mass = graph.stage_mass(stage)
+
+        # Combined Isp of the active engines
+        thrust = sum(engine.thrust for engine in active.values())
+        fuel_flow = sum(engine.thrust / engine.isp for engine in active.values())
+        isp = 0
+        if fuel_flow > 0:
+            isp = thrust / fuel_flow
+
+        delta_v = 0
+        if dry_mass > 0:
+            delta_v = isp * G0 * math.log(total_mass / dry_mass)
+        twr = 0
+        if total_mass > 0:
+            twr = thrust / (total_mass * G0)
+
+        table.append(StageInfo(stage, burn_time, total_mass, dry_mass, isp, delta_v, twr))
+    return table
+
+def delta_v(conn, vessel, pool=None):
+    return stage_table(fetch_parts(conn, vessel, pool))
+
+def output_table(table):
+    def output_row(cells):
+        print(' | '.join('% 10s' % x for x in cells))
+    cols = ('Stage', 'Time', 'Mass', 'Dry Mass', 'Isp', 'Delta-V', 'TWR')
+    output_row(cols)
+    print('-+-'.join(['-'*10] * len(cols)))
+    total = 0
+    for info in table:
+        if info.delta_v <= 0:
+            continue
+        total += info.delta_v
+        output_row(('%d' % info.stage, '%d s' % info.time,
+                    '%.1f t' % (info.mass/1000.), '%.1f t' % (info.dry_mass/1000.),
+                    '%d s' % info.isp, '%d m/s' % info.delta_v, '%.2f' % info.twr))
+    output_row(('Total', '', '', '', '', '%d m/s' % total, ''))
+
+if __name__ == '__main__':
+    import krpc
+    conn = krpc.connect(name='Delta-V')
+    output_table(delta_v(conn, conn.space_center.active_vessel))
@@ -0,0 +1,139 @@
+import numpy as np
+from krpctoolkit.streams import add_stream
+
+class DockingPort(object):
+    """ Metadata for a docking port, fetched once when the port is resolved """
+
+    def __init__(self, port):
+        self.port = port
+        self.part = port.part
+        self.title = self.part.title
+        self.vessel_name = self.part.vessel.name
+
+class DockingGuidance(object):
+    """
+    Position and velocity of the controlling docking port relative to the
+    target docking port, split into the components along the docking axis
+    (the direction the target port faces, y in its reference frame) and
+    perpendicular to it.
+
+    The controlling part and the target port are streamed, and the ports,
+    their metadata and the position, velocity and state streams are only
+    resolved again when one of them changes. Unless a vessel is given, the
+    guidance follows the active vessel, which is streamed too, and the
+    controlling part stream is rebuilt when it changes. Call update() (or
+    the guidance itself, so that it can be scheduled) each frame; it makes
+    no blocking RPCs unless the vessel or a port changed.
+
+    Axial speed is positive when closing along the docking axis, and radial
+    speed is positive when closing on the axis.
+    """
+
+    def __init__(self, conn, vessel=None):
+        self.conn = conn
+        self.active_vessel = None
+        if vessel is None:
+            self.active_vessel = add_stream(conn, getattr, conn.space_center, 'active_vessel')
+            vessel = self.active_vessel()
+        self.vessel = vessel
+        self.controlling = add_stream(conn, getattr, vessel.parts, 'controlling')
+        self.target_port = add_stream(conn, getattr, conn.space_center, 'target_docking_port')
+        DockingPortState = conn.space_center.DockingPortState
+        self.state_names = {
+            DockingPortState.ready: 'Ready to dock',
+            DockingPortState.docked: 'Docked',
+            DockingPortState.docking: 'Docking...'
+        }
+        self.current = None
+        self.target = None
+        self.position = None
+        self.velocity = None
+        self.state = None
+        self._key = None
+
+        # Row 0 is the displacement, row 1 the velocity
+        self._relative = np.zeros((2, 3))
+        self._squared = np.zeros((2, 3))
+        self.distance = 0.
+        self.speed = 0.
+        self.axial_distance = 0.
+        self.axial_speed = 0.
+        self.radial_distance = 0.
+        self.radial_speed = 0.
+
+    @property
+    def streams(self):
+        streams = (self.controlling, self.target_port)
+        if self.active_vessel is not None:
+            streams += (self.active_vessel,)
+        if self.ready:
+            streams += (self.position, self.velocity, self.state)
+        return streams
+
+    @property
+    def ready(self):
+        return self.current is not None and self.target is not None
+
+    @property
+    def state_text(self):
+        if not self.ready:
+            return 'Unknown'
+        return self.state_names.get(self.state(), 'Unknown')
+
+    def close(self):
+        self._remove_port_streams()
+        for stream in (self.controlling, self.target_port, self.active_vessel):
+            if stream is not None:
+                stream.remove()
+
+    def _remove_port_streams(self):
+        for stream in (self.position, self.velocity, self.state):
+            if stream is not None:
+                stream.remove()
+
+    def _resolve(self, part, target):
+        self._remove_port_streams()
+        self.position = self.velocity = self.state = None
+        self.current = self.target = None
+        port = part.docking_port if part is not None else None
+        if port is not None:
+            self.current = DockingPort(port)
+        if target is not None:
+            self.target = DockingPort(target)
+        if self.ready:
+            frame = target.reference_frame
+            self.position = add_stream(self.conn, port.position, frame)
+            self.velocity = add_stream(self.conn, self.current.part.velocity, frame)
+            self.state = add_stream(self.conn, getattr, port, 'state')
+
+    def update(self):
+        if self.active_vessel is not None:
+            vessel = self.active_vessel()
+            if vessel != self.vessel:
+                self.vessel = vessel
+                self.controlling.remove()
+                self.controlling = add_stream(self.conn, getattr, vessel.parts, 'controlling')
+        key = (self.controlling(), self.target_port())
+        if key != self._key:
+            self._key = key
+            self._resolve(*key)
+        if not self.ready:
+            return
+
+        relative = self._relative
+        squared = self._squared
+        relative[0] = self.position()
+        relative[1] = self.velocity()
+        np.multiply(relative, relative, out=squared)
+
+        self.distance, self.speed = np.sqrt(squared.sum(axis=1))
+        self.axial_distance, self.axial_speed = relative[:,1]
+        if self.axial_distance > 0:
+            self.axial_speed = -self.axial_speed
+        self.radial_distance, self.radial_speed = np.sqrt(squared[:,0] + squared[:,2])
+        if relative[0,0]*relative[1,0] + relative[0,2]*relative[1,2] > 0:
+            self.radial_speed = -self.radial_speed
+
+    def __call__(self):
+        self.update()
+        return False
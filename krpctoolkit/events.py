@@ -0,0 +1,141 @@
+import threading
+import time
+from krpctoolkit.streams import add_stream
+
+class Condition(object):
+    """ A predicate on the value of a stream, evaluated locally. """
+
+    def __init__(self, stream, predicate):
+        self.stream = stream
+        self.predicate = predicate
+
+    def __call__(self):
+        return bool(self.predicate(self.stream()))
+
+    def wait(self, timeout=None):
+        return wait_until(self.stream, self.predicate, timeout)
+
+    def remove(self):
+        self.stream.remove()
+
+class ServerCondition(object):
+    """ A condition evaluated by the server, using a kRPC expression event. """
+
+    def __init__(self, conn, expression):
+        self.event = conn.krpc.add_event(expression)
+        self.stream = self.event.stream
+
+    def __call__(self):
+        return bool(self.stream())
+
+    def wait(self, timeout=None):
+        return wait_until(self.stream, bool, timeout)
+
+    def remove(self):
+        self.event.remove()
+
+def above(conn, threshold, func, *args):
+    """ Condition that func(*args) > threshold, for a call returning a double.
+        Evaluated on the server if it supports expressions. """
+    return _threshold(conn, 'greater_than', lambda x: x > threshold, threshold, func, args)
+
+def below(conn, threshold, func, *args):
+    """ Condition that func(*args) < threshold, for a call returning a double.
+        Evaluated on the server if it supports expressions. """
+    return _threshold(conn, 'less_than', lambda x: x < threshold, threshold, func, args)
+
+def _threshold(conn, op, predicate, threshold, func, args):
+    expr = getattr(conn.krpc, 'Expression', None)
+    if expr is None:
+        return Condition(add_stream(conn, func, *args), predicate)
+    call = expr.call(conn.get_call(func, *args))
+    return ServerCondition(conn, getattr(expr, op)(call, expr.constant_double(threshold)))
+
+def on(condition, callback):
+    """
+    Call callback() once, as soon as the condition holds. The callback is
+    made from the thread that receives stream updates, so it runs as soon
+    as the update arrives, whatever the rate of the caller's loop. Returns
+    a function that cancels the callback, which should be called once it
+    is no longer needed, whether or not it has been made.
+    """
+    lock = threading.Lock()
+    fired = [False]
+
+    def check(value):
+        with lock:
+            if fired[0] or not condition():
+                return
+            fired[0] = True
+        callback()
+
+    def cancel():
+        with lock:
+            fired[0] = True
+        condition.stream.remove_callback(check)
+
+    condition.stream.add_callback(check)
+    condition.stream.start(wait=False)
+    return cancel
+
+def wait_until(stream, predicate, timeout=None):
+    """
+    Block until predicate(stream()) is true, waking only when the stream
+    receives an update. Returns False if timeout seconds pass first.
+    """
+    deadline = None
+    if timeout is not None:
+        deadline = time.monotonic() + timeout
+    with stream.condition:
+        while not predicate(stream()):
+            remaining = None
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+            stream.wait(remaining)
+    return True
+
+def wait_any(conditions, timeout=None):
+    """ Block until any of the conditions holds. Returns False on timeout. """
+    return _wait(conditions, any, timeout)
+
+def wait_all(conditions, timeout=None):
+    """ Block until all of the conditions hold. Returns False on timeout. """
+    return _wait(conditions, all, timeout)
+
+def _wait(conditions, test, timeout):
+    streams = []
+    for condition in conditions:
+        if condition.stream not in streams:
+            streams.append(condition.stream)
+    for stream in streams:
+        stream.start()
+
+    # Wait on the first stream, and have updates to the others wake it
+    first = streams[0]
+    cv = first.condition
+
+    def notify(value):
+        with cv:
+            cv.notify_all()
+
+    for stream in streams[1:]:
+        stream.add_callback(notify)
+
+    deadline = None
+    if timeout is not None:
+        deadline = time.monotonic() + timeout
+    try:
+        with cv:
+            while not test(condition() for condition in conditions):
+                remaining = None
+                if deadline is not None:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        return False
+                first.wait(remaining)
+        return True
+    finally:
+        for stream in streams[1:]:
+            stream.remove_callback(notify)
@@ -0,0 +1,184 @@
+"""
+Vectorized propagation of Keplerian orbits with NumPy.
+
+Orbits are held as arrays of the same elements as OrbitState: semi-major
+axis, eccentricity, inclination, longitude of ascending node, argument of
+periapsis and mean anomaly at an epoch, plus the gravitational parameter.
+propagate() returns positions and velocities for arrays of orbits and
+times, broadcast against each other, in one pass of array operations.
+
+Kepler's equation is solved with a fixed number of Halley iterations, so
+there is no data dependent looping. Near periapsis the starting guess
+solves the cubic truncation of Kepler's equation, which stays accurate as
+the eccentricity approaches 1 from either side, so near-parabolic escape
+and capture trajectories converge too. Elliptic and hyperbolic orbits can
+be mixed.
+
+Positions and velocities are in a right-handed frame with z along the
+body's pole and x towards the reference direction, in which the node and
+periapsis angles are measured.
+
+    elements = Elements.from_states([OrbitState.fetch(conn, v.orbit) for v in vessels])
+    ut = np.linspace(now, now + 3600, 1000)
+    position, velocity = propagate(elements[:, None], ut[None, :])
+"""
+
+import numpy as np
+
+# Enough Halley iterations to converge from the starting guesses, as far as
+# Kepler's equation can be evaluated in floating point. Close to e = 1 that
+# limits the relative error to about 1e-16 / |1 - e| near periapsis.
+ITERATIONS = 6
+
+class Elements(object):
+    """ Orbital elements of any number of orbits, as arrays of the same shape """
+
+    FIELDS = ('semi_major_axis', 'eccentricity', 'inclination', 'longitude_of_ascending_node',
+              'argument_of_periapsis', 'mean_anomaly', 'epoch', 'mu')
+
+    def __init__(self, semi_major_axis, eccentricity, inclination, longitude_of_ascending_node,
+                 argument_of_periapsis, mean_anomaly, epoch, mu):
+        arrays = np.broadcast_arrays(*[np.asarray(x, dtype=float) for x in (
+            semi_major_axis, eccentricity, inclination, longitude_of_ascending_node,
+            argument_of_periapsis, mean_anomaly, epoch, mu)])
+        for name, array in zip(self.FIELDS, arrays):
+            setattr(self, name, array)
+        self._frame = None
+
+    @classmethod
+    def from_states(cls, states):
+        """ Elements from a sequence of OrbitState """
+        return cls(*[[getattr(state, name) for state in states] for name in (
+            'semi_major_axis', 'eccentricity', 'inclination', 'longitude_of_ascending_node',
+            'argument_of_periapsis', 'mean_anomaly', 'ut', 'mu')])
+
+    @property
+    def shape(self):
+        return self.semi_major_axis.shape
+
+    def __len__(self):
+        return len(self.semi_major_axis)
+
+    def __getitem__(self, index):
+        return Elements(*[getattr(self, name)[index] for name in self.FIELDS])
+
+    @property
+    def frame(self):
+        """ The perifocal axes of each orbit (towards periapsis, and 90 degrees ahead of it) """
+        if self._frame is None:
+            cos_lan, sin_lan = np.cos(self.longitude_of_ascending_node), np.sin(self.longitude_of_ascending_node)
+            cos_arg, sin_arg = np.cos(self.argument_of_periapsis), np.sin(self.argument_of_periapsis)
+            cos_i, sin_i = np.cos(self.inclination), np.sin(self.inclination)
+            p = np.stack((
+                cos_lan*cos_arg - sin_lan*sin_arg*cos_i,
+                sin_lan*cos_arg + cos_lan*sin_arg*cos_i,
+                sin_arg*sin_i), axis=-1)
+            q = np.stack((
+                -cos_lan*sin_arg - sin_lan*cos_arg*cos_i,
+                -sin_lan*sin_arg + cos_lan*cos_arg*cos_i,
+                cos_arg*sin_i), axis=-1)
+            self._frame = (p, q)
+        return self._frame
+
+def _cubic_guess(e, M):
+    """
+    Root of |1 - e| x + e x^3 / 6 = M, Kepler's equation with sin or sinh
+    expanded to third order, which is close to the anomaly for small x
+    """
+    with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+        p = 6 * np.abs(1 - e) / e
+        q = 6 * M / e
+        A = np.cbrt(q/2 + np.sign(q) * np.sqrt(q*q/4 + p*p*p/27))
+        x = A - p / (3*A)
+    return np.where(A == 0, 0., x)
+
+def solve_kepler(e, M, iterations=ITERATIONS):
+    """
+    Eccentric anomaly (hyperbolic anomaly where e > 1) for arrays of
+    eccentricity and mean anomaly, using Halley's method.
+    """
+    e, M = np.broadcast_arrays(np.asarray(e, dtype=float), np.asarray(M, dtype=float))
+    E = np.empty(M.shape)
+    elliptic = e < 1
+
+    if elliptic.any():
+        ee = e[elliptic]
+        MM = M[elliptic]
+        # Wrapping would round away small anomalies, so only wrap where needed
+        MM = np.where(np.abs(MM) > np.pi, np.remainder(MM + np.pi, 2*np.pi) - np.pi, MM)
+        x = MM + 0.85 * ee * np.sign(np.sin(MM))
+        # Near periapsis of eccentric orbits the cubic is a far better guess
+        cubic = _cubic_guess(ee, MM)
+        x = np.where(np.abs(cubic) < 1, cubic, x)
+        for _ in range(iterations):
+            s, c = ee*np.sin(x), ee*np.cos(x)
+            f = x - s - MM
+            df = 1 - c
+            x -= 2*f*df / (2*df*df - f*s)
+        E[elliptic] = x
+    if not elliptic.all():
+        hyperbolic = ~elliptic
+        ee = e[hyperbolic]
+        MM = M[hyperbolic]
+        x = np.arcsinh(MM / ee)
+        # Closer starting guess for large anomalies, where arcsinh undershoots
+        large = np.abs(MM) > ee
+        x[large] = np.sign(MM[large]) * np.log(2*np.abs(MM[large])/ee[large] + 1.8)
+        cubic = _cubic_guess(ee, MM)
+        x = np.where(np.abs(cubic) < 1, cubic, x)
+        for _ in range(iterations):
+            s, c = ee*np.sinh(x), ee*np.cosh(x)
+            f = s - x - MM
+            df = c - 1
+            x -= 2*f*df / (2*df*df - f*s)
+        E[hyperbolic] = x
+    return E
+
+def propagate(elements, ut):
+    """
+    Positions and velocities of orbits at times ut. The shape of ut is
+    broadcast against the shape of the elements, and the results have that
+    shape with a trailing axis of length 3.
+    """
+    ut = np.asarray(ut, dtype=float)
+    a = elements.semi_major_axis
+    e = elements.eccentricity
+    mu = elements.mu
+    p, q = elements.frame
+
+    abs_a = np.abs(a)
+    n = np.sqrt(mu / abs_a**3)
+    M = elements.mean_anomaly + n * (ut - elements.epoch)
+    e, a, abs_a, mu, M = np.broadcast_arrays(e, a, abs_a, mu, M)
+    E = solve_kepler(e, M)
+
+    x = np.empty(M.shape)
+    y = np.empty(M.shape)
+    vx = np.empty(M.shape)
+    vy = np.empty(M.shape)
+    k = np.sqrt(mu * abs_a)
+    elliptic = e < 1
+
+    if elliptic.any():
+        ee, EE, aa, kk = e[elliptic], E[elliptic], abs_a[elliptic], k[elliptic]
+        s, c = np.sin(EE), np.cos(EE)
+        root = np.sqrt(1 - ee*ee)
+        r = aa * (1 - ee*c)
+        x[elliptic] = aa * (c - ee)
+        y[elliptic] = aa * root * s
+        vx[elliptic] = -kk * s / r
+        vy[elliptic] = kk * root * c / r
+    if not elliptic.all():
+        hyperbolic = ~elliptic
+        ee, EE, aa, kk = e[hyperbolic], E[hyperbolic], abs_a[hyperbolic], k[hyperbolic]
+        s, c = np.sinh(EE), np.cosh(EE)
+        root = np.sqrt(ee*ee - 1)
+        r = aa * (ee*c - 1)
+        x[hyperbolic] = aa * (ee - c)
+        y[hyperbolic] = aa * root * s
+        vx[hyperbolic] = -kk * s / r
+        vy[hyperbolic] = kk * root * c / r
+
+    position = x[..., None]*p + y[..., None]*q
+    velocity = vx[..., None]*p + vy[..., None]*q
+    return position, velocity
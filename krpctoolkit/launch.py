@@ -3,53 +3,92 @@ import time
 import math
 from krpctoolkit.throttle import *
 from krpctoolkit.attitude import *
+from krpctoolkit.ascent import PitchProgram
+from krpctoolkit.streams import add_stream, set_rates
 
 class Ascend(object):
     """
     Launch a rocket to a target apoapsis with zero inclination.
+
+    Pitch follows a PitchProgram, such as one found by
+    krpctoolkit.ascent.optimize. By default this is a linear turn from
+    250 m to 75% of the height of the atmosphere.
+
+    Streams update rate times per second, to match the rate the controller
+    is called at. Once the apoapsis is rising fast enough to reach the
+    target within final_time seconds, they update as fast as possible so
+    the engines are cut with fresh values.
     """
 
-    def __init__(self, conn, vessel, target_altitude):
+    def __init__(self, conn, vessel, target_altitude, program=None, rate=10, final_time=2):
         self.conn = conn
         self.vessel = vessel
-        self.turn_start_altitude = 250
-        self.turn_end_altitude = self.vessel.orbit.body.atmosphere_depth * 0.75
+        if program is None:
+            program = PitchProgram.turn(250, self.vessel.orbit.body.atmosphere_depth * 0.75)
+        self.program = program
+        self.turn_start_altitude = program.turn_start
+        self.turn_end_altitude = program.turn_end
         self.target_altitude = target_altitude
         self.max_q = 7000
+        self.rate = rate
+        self.final_time = final_time
+        self._rate = None
+        self._last = None
 
         # Set up streams for telemetry
-        self.ut = self.conn.add_stream(getattr, self.conn.space_center, 'ut')
-        self.altitude = self.conn.add_stream(getattr, self.vessel.flight(), 'mean_altitude')
-        self.apoapsis = self.conn.add_stream(getattr, self.vessel.orbit, 'apoapsis_altitude')
-        self.periapsis = self.conn.add_stream(getattr, self.vessel.orbit, 'periapsis_altitude')
-        self.eccentricity = self.conn.add_stream(getattr, self.vessel.orbit, 'eccentricity')
+        self.ut = add_stream(self.conn, getattr, self.conn.space_center, 'ut', rate=rate)
+        self.altitude = add_stream(self.conn, getattr, self.vessel.flight(), 'mean_altitude', rate=rate)
+        self.apoapsis = add_stream(self.conn, getattr, self.vessel.orbit, 'apoapsis_altitude', rate=rate)
 
         # Set up controllers
         self.throttle_controller = ThrottleMaxQController(self.conn, self.vessel, max_q=self.max_q)
         self.auto_pilot = vessel.auto_pilot
+        self.control = vessel.control
+        self._set_rate(rate)
 
         # Pre-launch setup
-        self.vessel.control.sas = False
-        self.vessel.control.rcs = False
-        self.vessel.control.throttle = 1
+        self.control.sas = False
+        self.control.rcs = False
+        self.control.throttle = 1
         self.auto_pilot.reference_frame = vessel.surface_reference_frame
         self.auto_pilot.target_pitch_and_heading(90,90)
         self.auto_pilot.target_roll = float('nan')
         self.auto_pilot.engage()
 
     def __call__(self):
-        if self.altitude() < self.turn_start_altitude:
-            self.auto_pilot.target_pitch_and_heading(90,90)
-        elif self.turn_start_altitude < self.altitude() and self.altitude() < self.turn_end_altitude:
-            frac = (self.altitude()-self.turn_start_altitude) / (self.turn_end_altitude-self.turn_start_altitude)
-            self.auto_pilot.target_pitch_and_heading(90*(1-frac),90)
-        else:
-            self.auto_pilot.target_pitch_and_heading(0,90)
+        self.auto_pilot.target_pitch_and_heading(self.program(self.altitude()),90)
 
-        if self.apoapsis() > self.target_altitude:
-            self.vessel.control.throttle = 0
+        apoapsis = self.apoapsis()
+        self._update_rate(self.ut(), apoapsis)
+        if apoapsis > self.target_altitude:
+            self.control.throttle = 0
             self.auto_pilot.disengage()
             return True
         else:
             self.throttle_controller()
             return False
+
+    @property
+    def streams(self):
+        return (self.altitude, self.apoapsis) + self.throttle_controller.streams
+
+    def _set_rate(self, rate):
+        if rate != self._rate:
+            self._rate = rate
+            set_rates((self.ut, self.altitude, self.apoapsis) + self.throttle_controller.streams, rate)
+
+    def _update_rate(self, ut, apoapsis):
+        last = self._last
+        if last is not None and ut <= last[0]:
+            return
+        self._last = (ut, apoapsis)
+        if last is None:
+            return
+        rise = (apoapsis - last[1]) / (ut - last[0])
+        near = rise > 0 and self.target_altitude - apoapsis < rise * self.final_time
+        self._set_rate(0 if near else self.rate)
+
+    def close(self):
+        for stream in (self.ut, self.altitude, self.apoapsis):
+            stream.remove()
+        self.throttle_controller.close()
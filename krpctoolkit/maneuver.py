@@ -1,186 +1,181 @@
 import krpc
+import threading
 import time
 import math
 from krpctoolkit.throttle import *
 from krpctoolkit.attitude import *
 from krpctoolkit.staging import *
-
-def circularize(conn, vessel, at_apoapsis=True):
-    orbit = vessel.orbit
-    mu = orbit.body.gravitational_parameter
+from krpctoolkit import events, strict
+from krpctoolkit.scheduler import Scheduler
+from krpctoolkit.orbit import OrbitState
+from krpctoolkit.streams import add_stream, set_rates
+
+def _state(conn, vessel, state):
+    if state is None:
+        state = OrbitState.fetch(conn, vessel.orbit)
+    return state
+
+def circularize(conn, vessel, at_apoapsis=True, state=None):
+    state = _state(conn, vessel, state)
     if at_apoapsis:
-        r = orbit.apoapsis
+        r = state.apoapsis
+        ut = state.ut + state.time_to_apoapsis
     else:
-        r = orbit.periapsis
-    a1 = orbit.semi_major_axis
-    a2 = r
-    v1 = math.sqrt(mu*((2./r)-(1./a1)))
-    v2 = math.sqrt(mu*((2./r)-(1./a2)))
+        r = state.periapsis
+        ut = state.ut + state.time_to_periapsis
+    v1 = state.speed_at_radius(r)
+    v2 = math.sqrt(state.mu / r)
     delta_v = v2 - v1
-    ut = conn.space_center.ut
-    if at_apoapsis:
-        ut += orbit.time_to_apoapsis
-    else:
-        ut += orbit.time_to_periapsis
     node = vessel.control.add_node(ut, prograde=delta_v)
     return node
 
-def change_apoapsis(conn, vessel, new_apoapsis):
-    orbit = vessel.orbit
-    mu = orbit.body.gravitational_parameter
-    ut = conn.space_center.ut + orbit.time_to_periapsis
-    r1 = orbit.periapsis
-    a1 = orbit.semi_major_axis
-    v1 = math.sqrt(mu*((2./r1)-(1./a1)))
-    r2 = r1
-    a2 = (r1 + new_apoapsis) / 2
-    v2 = math.sqrt(mu*((2./r2)-(1./a2)))
+def _change_sma_at(vessel, state, r, sma, ut):
+    """ Add a prograde node at ut, where the radius is r, that changes the semi-major axis to sma """
+    mu = state.mu
+    v1 = state.speed_at_radius(r)
+    v2 = math.sqrt(mu*((2./r)-(1./sma)))
     delta_v = v2 - v1
-    node = vessel.control.add_node(ut, prograde=delta_v)
-    return node
-
-def change_periapsis(conn, vessel, new_periapsis):
-    orbit = vessel.orbit
-    mu = orbit.body.gravitational_parameter
-    ut = conn.space_center.ut + orbit.time_to_apoapsis
-    r1 = orbit.apoapsis
-    a1 = orbit.semi_major_axis
-    v1 = math.sqrt(mu*((2./r1)-(1./a1)))
-    r2 = r1
-    a2 = (r1 + new_periapsis) / 2
-    v2 = math.sqrt(mu*((2./r2)-(1./a2)))
-    delta_v = v2 - v1
-    node = vessel.control.add_node(ut, prograde=delta_v)
-    return node
-
-def change_sma(conn, vessel, sma, ut):
-    orbit = vessel.orbit
-    mu = orbit.body.gravitational_parameter
-    r1 = orbit.radius
-    a1 = orbit.semi_major_axis
-    v1 = math.sqrt(mu*((2./r1)-(1./a1)))
-    r2 = r1
-    a2 = sma
-    v2 = math.sqrt(mu*((2./r2)-(1./a2)))
-    delta_v = v2 - v1
-    node = vessel.control.add_node(ut, prograde=delta_v)
-    return node
-
-def hohmann_transfer(conn, vessel, target):
-    orbit = vessel.orbit
-    mu = orbit.body.gravitational_parameter
-    r1 = orbit.radius
-    r2 = target.orbit.radius
-
-    transfer_time = math.pi * math.sqrt(((r1+r2)**3)/(8*mu))
+    return vessel.control.add_node(ut, prograde=delta_v)
+
+def change_apoapsis(conn, vessel, new_apoapsis, state=None):
+    state = _state(conn, vessel, state)
+    r = state.periapsis
+    ut = state.ut + state.time_to_periapsis
+    return _change_sma_at(vessel, state, r, (r + new_apoapsis) / 2, ut)
+
+def change_periapsis(conn, vessel, new_periapsis, state=None):
+    state = _state(conn, vessel, state)
+    r = state.apoapsis
+    ut = state.ut + state.time_to_apoapsis
+    return _change_sma_at(vessel, state, r, (r + new_periapsis) / 2, ut)
+
+def change_sma(conn, vessel, sma, ut, state=None):
+    state = _state(conn, vessel, state)
+    return _change_sma_at(vessel, state, state.radius_at(ut), sma, ut)
+
+def hohmann_transfer(conn, vessel, target, state=None, target_state=None):
+    """
+    Transfer to the orbit of a target orbiting the same body. Assumes that
+    both orbits are close to circular and coplanar.
+    """
+    state = _state(conn, vessel, state)
+    if target_state is None:
+        target_state = OrbitState.fetch(conn, target.orbit)
+    mu = state.mu
+    r1 = state.radius
+    r2 = target_state.semi_major_axis
+
+    # Angle the target must lead the vessel by at departure
     transfer_angle = math.pi * (1 - (1/(2*math.sqrt(2))) * math.sqrt(((r1/r2)+1)**3))
 
-    Mv = orbit.mean_anomaly
-    Mt = target.orbit.mean_anomaly
-    av = orbit.semi_major_axis
-    at = target.orbit.semi_major_axis
-    nv = math.sqrt(mu/(av**3))
-    nt = math.sqrt(mu/(at**3))
+    # Time until the phase angle reaches the transfer angle, as it
+    # changes at the difference between the mean motions
+    phase = target_state.true_longitude - state.true_longitude
+    rate = target_state.mean_motion - state.mean_motion
+    time_until_transfer = ((transfer_angle - phase) / rate) % (2*math.pi / abs(rate))
 
-    Mt += 2*math.pi
-
-    time_until_transfer = (transfer_angle - Mt + Mv) / (nt - nv)
-
-    print(Mt, Mv, transfer_angle, transfer_angle - Mt + Mv, nt - nv, time_until_transfer)
-
-    ut = conn.space_center.ut + time_until_transfer
-
-    a1 = orbit.semi_major_axis
-    v1 = math.sqrt(mu*((2./r1)-(1./a1)))
-    a2 = (target.orbit.radius + r1) / 2
-    v2 = math.sqrt(mu*((2./r1)-(1./a2)))
+    ut = state.ut + time_until_transfer
+    r = state.radius_at(ut)
+    v1 = state.speed_at_radius(r)
+    a2 = (r2 + r) / 2
+    v2 = math.sqrt(mu*((2./r)-(1./a2)))
     delta_v = v2 - v1
 
     node = vessel.control.add_node(ut, prograde=delta_v)
     return node
 
-def total_area(orbit):
-    a = orbit.semi_major_axis
-    b = orbit.semi_minor_axis
-    return math.pi * a * b
+def mean_anomaly_from_true_anomaly(state, theta):
+    return state.mean_anomaly_from_true_anomaly(theta)
 
-def area_since_periapsis(orbit, E):
-    a = orbit.semi_major_axis
-    b = orbit.semi_minor_axis
-    return 0.5 * a * b * E
+def time_to_ascending_node(state):
+    return state.time_to_ascending_node
 
-def mean_anomaly_from_true_anomaly(orbit, theta):
-    e = orbit.eccentricity
-    adj = e + math.cos(theta)
-    hyp = 1 + e*math.cos(theta)
-    return math.acos(adj / hyp)
+def time_to_descending_node(state):
+    return state.time_to_descending_node
 
-def area_between_mean_anomalies(orbit, E0, E1):
-    A0 = area_since_periapsis(orbit, E0)
-    A1 = area_since_periapsis(orbit, E1)
-    return A1 - A0
-
-def time_to_ascending_node(orbit):
-    A0 = total_area(orbit)
-
-    E = orbit.mean_anomaly
-    Ap = area_since_periapsis(orbit, E)
-
-    theta = orbit.argument_of_periapsis - math.pi
-    En = mean_anomaly_from_true_anomaly(orbit, theta)
-    En += math.pi
-    An = area_since_periapsis(orbit, En)
-
-    frac = (An-Ap)/A0
-    return orbit.period * frac
-
-def time_to_descending_node(orbit):
-    A0 = total_area(orbit)
-
-    E = orbit.mean_anomaly
-    Ap = area_since_periapsis(orbit, E)
-
-    theta = orbit.argument_of_periapsis - math.pi
-    En = mean_anomaly_from_true_anomaly(orbit, theta)
-    An = area_since_periapsis(orbit, En)
-
-    frac = (An-Ap)/A0
-    return orbit.period * frac
-
-def change_inclination(conn, vessel, new_inclination):
-    orbit = vessel.orbit
-    i = new_inclination - orbit.inclination
-    v = orbit.speed
+def change_inclination(conn, vessel, new_inclination, state=None):
+    state = _state(conn, vessel, state)
+    i = new_inclination - state.inclination
+    ut = state.ut + state.time_to_ascending_node
+    v = state.speed_at(ut)
     normal = v*math.sin(i)
     prograde = v*math.cos(i) - v
-    ut = conn.space_center.ut + time_to_ascending_node(orbit)
     node = vessel.control.add_node(ut, normal=normal, prograde=prograde)
     return node
 
-def execute_node(conn, vessel, node):
-    x = ExecuteNode(conn, vessel, node)
-    while x():
-        time.sleep(0.025)
+def execute_node(conn, vessel, node, rate=40):
+    scheduler = Scheduler()
+    task = scheduler.add(ExecuteNode(conn, vessel, node, rate=rate), rate)
+    scheduler.run(until=task)
     node.remove()
 
 class ExecuteNode(object):
-
-    def __init__(self, conn, vessel, node, lead_time=5):
+    """
+    Executes a maneuver node, burning at full throttle centred on the node.
+
+    For the last tail_time seconds the throttle is lowered, down to
+    min_throttle, so that the remaining burn keeps taking tail_time
+    seconds. Once the throttle is at min_throttle and the remaining burn
+    would take less than cutoff_horizon seconds, the UT at which it
+    completes is predicted from the remaining delta-v, thrust, specific
+    impulse and mass, using the rocket equation. The engines are shut down
+    at that UT from an event (evaluated by the server if it supports
+    expressions, otherwise from the ut stream), so the end of the burn
+    does not depend on how often the controller is called. The prediction
+    is refined from fresh values on every tick, but the event is only
+    moved when it changes by more than a frame, as moving it takes
+    blocking RPCs.
+
+    The engines burn until the end of the physics frame in which the event
+    fires, so with a low throttle one frame of acceleration is a small
+    delta-v, and the event fires half a frame (frame_time) early to centre
+    the error on zero.
+
+    Once the burn is complete, cutoff_error is the delta-v left along the
+    burn direction in m/s, negative if the burn overshot.
+
+    Stream rates follow the phase of the burn. While waiting for the node
+    ut updates rate times per second and the other streams idle_rate times
+    per second, and during warp every stream updates idle_rate times per
+    second. During the burn the streams update at rate, and once the burn
+    has less than twice cutoff_horizon seconds left they update as fast as
+    possible, so the cutoff is predicted from fresh values.
+    """
+
+    idle_rate = 1
+
+    def __init__(self, conn, vessel, node, lead_time=5, cutoff_horizon=2, tail_time=0.5,
+                 min_throttle=0.01, frame_time=0.02, rate=20):
         self.conn = conn
         self.vessel = vessel
+        self.control = vessel.control
         self.node = node
-        self.ut = conn.add_stream(getattr, conn.space_center, 'ut')
+        self.ut = add_stream(conn, getattr, conn.space_center, 'ut', rate=rate)
         self.lead_time = lead_time
-        self.remaining_burn = conn.add_stream(node.remaining_burn_vector, node.reference_frame)
+        self.cutoff_horizon = cutoff_horizon
+        self.tail_time = tail_time
+        self.min_throttle = min_throttle
+        self.frame_time = frame_time
+        self.rate = rate
+        self.remaining_burn = add_stream(
+            conn, node.remaining_burn_vector, node.reference_frame, rate=self.idle_rate)
         self.node_ut = node.ut
+        self.available_thrust = add_stream(conn, getattr, vessel, 'available_thrust', rate=self.idle_rate)
+        self.specific_impulse = add_stream(conn, getattr, vessel, 'specific_impulse', rate=self.idle_rate)
+        self.mass = add_stream(conn, getattr, vessel, 'mass', rate=self.idle_rate)
+        self.cutoff_ut = None
+        self.cutoff_error = None
+        self.throttle = 0
+        self._cut = threading.Event()
+        # Held while the throttle is set, as the cutoff runs on the stream thread
+        self._throttle_lock = threading.Lock()
+        self._cutoff_condition = None
+        self._cancel_cutoff = None
+        self._phase = None
 
         # Calculate burn time using rocket equation
-        F = vessel.available_thrust
-        Isp = vessel.specific_impulse * 9.82
-        m0 = vessel.mass
-        m1 = m0 / math.exp(node.delta_v/Isp)
-        flow_rate = F / Isp
-        self.burn_time = (m0 - m1) / flow_rate
+        self.burn_time = self._burn_time(node.delta_v)
+        self._set_phase('waiting')
 
         # Orientate ship
         ap = vessel.auto_pilot
@@ -188,45 +183,110 @@ class ExecuteNode(object):
         ap.target_direction = (0,1,0)
         ap.engage()
 
+    @property
+    def streams(self):
+        return (self.ut, self.remaining_burn)
+
+    def close(self):
+        self._remove_cutoff()
+        for stream in (self.ut, self.remaining_burn, self.available_thrust, self.specific_impulse, self.mass):
+            stream.remove()
+
+    def _set_phase(self, phase):
+        """ Set the rates of the streams for a phase of the burn """
+        if phase == self._phase:
+            return
+        self._phase = phase
+        burn = (self.remaining_burn, self.available_thrust, self.specific_impulse, self.mass)
+        if phase == 'waiting':
+            self.ut.rate = self.rate
+            set_rates(burn, self.idle_rate)
+        elif phase == 'warping':
+            set_rates((self.ut,) + burn, self.idle_rate)
+        elif phase == 'burning':
+            set_rates((self.ut,) + burn, self.rate)
+        elif phase == 'final':
+            set_rates((self.ut,) + burn, 0)
+
+    def _burn_time(self, delta_v):
+        """ Time to burn delta_v at full thrust """
+        F = self.available_thrust()
+        Isp = self.specific_impulse() * 9.82
+        m0 = self.mass()
+        m1 = m0 / math.exp(delta_v/Isp)
+        flow_rate = F / Isp
+        return (m0 - m1) / flow_rate
+
+    def _set_throttle(self, throttle):
+        with self._throttle_lock:
+            if throttle != self.throttle and not self._cut.is_set():
+                self.control.throttle = throttle
+                self.throttle = throttle
+
     def __call__(self):
         if not self.node:
             return True
 
+        if self._cut.is_set():
+            # Burn complete. The cutoff has already set the throttle to
+            # zero, but make sure nothing set it again.
+            self.control.throttle = 0
+            self.cutoff_error = self.remaining_burn()[1]
+            self._remove_cutoff()
+            self.node = None
+            return True
+
         burn_ut = self.node_ut - (self.burn_time/2.)
 
         #TODO: check vessel is pointing in the correct direction before warping
         #      and if the error is large, drop out of warp and reorient the vessel
         if self.ut() < burn_ut - self.lead_time:
+            self._set_phase('warping')
             self.conn.space_center.warp_to(burn_ut - self.lead_time)
+            self._set_phase('waiting')
 
         if self.ut() < burn_ut:
             return False
 
-        # Burn time remaining
+        if self._phase == 'waiting':
+            self._set_phase('burning')
         try:
-            F = self.vessel.available_thrust
-            Isp = self.vessel.specific_impulse * 9.82
-            m0 = self.vessel.mass
-            m1 = m0 / math.exp(self.remaining_burn()[1]/Isp)
-            flow_rate = F / Isp
-            remaining_burn_time = (m0 - m1) / flow_rate
+            remaining_burn_time = self._burn_time(self.remaining_burn()[1])
         except ZeroDivisionError:
             return False
-
-        if remaining_burn_time > 2:
-            # Burn at full throttle
-            self.vessel.control.throttle = 1
-            return False
-        elif self.remaining_burn()[1] > 0:
-            # Burn at a throttle setting that maintains a
-            # remaining burn time of t seconds
-            t = 2
-            F = ((m0 - m1) / t) * Isp
-            throttle = F / self.vessel.available_thrust
-            self.vessel.control.throttle = max(0.005, throttle)
+        if remaining_burn_time <= 0:
+            # Passed the end of the burn between updates
+            self._cutoff()
             return False
-        else:
-            # Burn complete
-            self.vessel.control.throttle = 0
-            self.node = None
-            return True
+        if remaining_burn_time < 2 * self.cutoff_horizon:
+            self._set_phase('final')
+
+        # Lower the throttle so the tail of the burn takes tail_time seconds
+        self._set_throttle(max(self.min_throttle, min(1., remaining_burn_time / self.tail_time)))
+        remaining_burn_time /= self.throttle
+        if self.throttle == self.min_throttle and remaining_burn_time < self.cutoff_horizon:
+            self._schedule_cutoff(self.ut() + remaining_burn_time)
+        return False
+
+    def _schedule_cutoff(self, ut):
+        """ Move the cutoff event to a new prediction, if it has changed by more than a frame """
+        if self.cutoff_ut is not None and abs(ut - self.cutoff_ut) <= self.frame_time:
+            return
+        self._remove_cutoff()
+        self.cutoff_ut = ut
+        with strict.allowed():
+            self._cutoff_condition = events.above(
+                self.conn, ut - self.frame_time / 2, getattr, self.conn.space_center, 'ut')
+        self._cancel_cutoff = events.on(self._cutoff_condition, self._cutoff)
+
+    def _cutoff(self):
+        with self._throttle_lock:
+            self.control.throttle = 0
+            self.throttle = 0
+            self._cut.set()
+
+    def _remove_cutoff(self):
+        if self._cancel_cutoff is not None:
+            self._cancel_cutoff()
+            self._cutoff_condition.remove()
+            self._cancel_cutoff = None
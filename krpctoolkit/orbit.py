@@ -0,0 +1,229 @@
+"""
+A local model of a Keplerian orbit.
+
+OrbitState holds the elements of an orbit at an instant, fetched from the
+server in a single batch of calls. The batch needs the body the orbit is
+around, which is remembered for each orbit, so only the first fetch for
+an orbit (or the first after it changes sphere of influence) takes a
+second round trip. Everything else (anomalies, radii, speeds and the
+times of apsides and node crossings) is computed locally from the
+elements, so planning a maneuver costs one round trip.
+
+Angles are in radians. The mean anomaly of a hyperbolic orbit is the
+hyperbolic mean anomaly, e sinh(F) - F.
+"""
+
+import math
+from krpctoolkit.batch import batch
+
+TWO_PI = 2 * math.pi
+
+# The body each orbit fetched so far was around
+_bodies = {}
+
+def solve_kepler(e, M, tolerance=1e-14, max_iterations=50):
+    """ Eccentric anomaly (or hyperbolic anomaly if e > 1) for a mean anomaly """
+    if e < 1:
+        M = math.fmod(M, TWO_PI)
+        E = M if e < 0.8 else math.pi * (1 if M > 0 else -1)
+        for _ in range(max_iterations):
+            dE = (E - e*math.sin(E) - M) / (1 - e*math.cos(E))
+            E -= dE
+            if abs(dE) < tolerance:
+                break
+        return E
+    F = math.asinh(M / e)
+    for _ in range(max_iterations):
+        dF = (e*math.sinh(F) - F - M) / (e*math.cosh(F) - 1)
+        F -= dF
+        if abs(dF) < tolerance:
+            break
+    return F
+
+class OrbitState(object):
+    """ An immutable snapshot of an orbit at time ut """
+
+    __slots__ = ('ut', 'mu', 'body_radius', 'semi_major_axis', 'eccentricity', 'inclination',
+                 'longitude_of_ascending_node', 'argument_of_periapsis', 'mean_anomaly')
+
+    def __init__(self, ut, mu, body_radius, semi_major_axis, eccentricity, inclination,
+                 longitude_of_ascending_node, argument_of_periapsis, mean_anomaly):
+        set_ = object.__setattr__
+        set_(self, 'ut', ut)
+        set_(self, 'mu', mu)
+        set_(self, 'body_radius', body_radius)
+        set_(self, 'semi_major_axis', semi_major_axis)
+        set_(self, 'eccentricity', eccentricity)
+        set_(self, 'inclination', inclination)
+        set_(self, 'longitude_of_ascending_node', longitude_of_ascending_node)
+        set_(self, 'argument_of_periapsis', argument_of_periapsis)
+        set_(self, 'mean_anomaly', mean_anomaly)
+
+    def __setattr__(self, name, value):
+        raise AttributeError('OrbitState is immutable')
+
+    def __repr__(self):
+        return 'OrbitState(ut=%g, a=%g, e=%g, i=%g)' % (
+            self.ut, self.semi_major_axis, self.eccentricity, self.inclination)
+
+    @classmethod
+    def fetch(cls, conn, orbit, body=None):
+        """
+        Get the current state of an orbit, in one request if body is given
+        or the orbit has been fetched before
+        """
+        if body is None:
+            body = _bodies.get(orbit)
+        if body is None:
+            body = orbit.body
+        values = batch(conn, [
+            (getattr, orbit, 'body'),
+            (getattr, conn.space_center, 'ut'),
+            (getattr, body, 'gravitational_parameter'),
+            (getattr, body, 'equatorial_radius'),
+            (getattr, orbit, 'semi_major_axis'),
+            (getattr, orbit, 'eccentricity'),
+            (getattr, orbit, 'inclination'),
+            (getattr, orbit, 'longitude_of_ascending_node'),
+            (getattr, orbit, 'argument_of_periapsis'),
+            (getattr, orbit, 'mean_anomaly')])
+        if values[0] != body:
+            # Changed sphere of influence, so the body's constants are wrong
+            return cls.fetch(conn, orbit, values[0])
+        _bodies[orbit] = body
+        return cls(*values[1:])
+
+    # Shape
+
+    @property
+    def hyperbolic(self):
+        return self.eccentricity >= 1
+
+    @property
+    def semi_latus_rectum(self):
+        return self.semi_major_axis * (1 - self.eccentricity**2)
+
+    @property
+    def semi_minor_axis(self):
+        return self.semi_major_axis * math.sqrt(abs(1 - self.eccentricity**2))
+
+    @property
+    def periapsis(self):
+        return self.semi_major_axis * (1 - self.eccentricity)
+
+    @property
+    def apoapsis(self):
+        if self.hyperbolic:
+            return float('inf')
+        return self.semi_major_axis * (1 + self.eccentricity)
+
+    @property
+    def periapsis_altitude(self):
+        return self.periapsis - self.body_radius
+
+    @property
+    def apoapsis_altitude(self):
+        return self.apoapsis - self.body_radius
+
+    @property
+    def mean_motion(self):
+        return math.sqrt(self.mu / abs(self.semi_major_axis)**3)
+
+    @property
+    def period(self):
+        if self.hyperbolic:
+            return float('inf')
+        return TWO_PI / self.mean_motion
+
+    # Anomalies
+
+    def mean_anomaly_at(self, ut):
+        M = self.mean_anomaly + self.mean_motion * (ut - self.ut)
+        if not self.hyperbolic:
+            M %= TWO_PI
+        return M
+
+    def eccentric_anomaly_from_mean_anomaly(self, M):
+        return solve_kepler(self.eccentricity, M)
+
+    def true_anomaly_from_mean_anomaly(self, M):
+        e = self.eccentricity
+        E = solve_kepler(e, M)
+        if e < 1:
+            return 2 * math.atan2(math.sqrt(1 + e) * math.sin(E/2), math.sqrt(1 - e) * math.cos(E/2))
+        return 2 * math.atan(math.sqrt((e + 1) / (e - 1)) * math.tanh(E/2))
+
+    def mean_anomaly_from_true_anomaly(self, theta):
+        e = self.eccentricity
+        if e < 1:
+            E = 2 * math.atan2(math.sqrt(1 - e) * math.sin(theta/2), math.sqrt(1 + e) * math.cos(theta/2))
+            return (E - e*math.sin(E)) % TWO_PI
+        F = 2 * math.atanh(math.sqrt((e - 1) / (e + 1)) * math.tan(theta/2))
+        return e*math.sinh(F) - F
+
+    @property
+    def true_anomaly(self):
+        return self.true_anomaly_from_mean_anomaly(self.mean_anomaly)
+
+    def true_anomaly_at(self, ut):
+        return self.true_anomaly_from_mean_anomaly(self.mean_anomaly_at(ut))
+
+    # Radius and speed
+
+    def radius_at_true_anomaly(self, theta):
+        return self.semi_latus_rectum / (1 + self.eccentricity * math.cos(theta))
+
+    def radius_at(self, ut):
+        return self.radius_at_true_anomaly(self.true_anomaly_at(ut))
+
+    @property
+    def radius(self):
+        return self.radius_at_true_anomaly(self.true_anomaly)
+
+    def speed_at_radius(self, r):
+        """ Speed at radius r, from the vis-viva equation """
+        return math.sqrt(max(0., self.mu * (2./r - 1./self.semi_major_axis)))
+
+    def speed_at(self, ut):
+        return self.speed_at_radius(self.radius_at(ut))
+
+    @property
+    def speed(self):
+        return self.speed_at_radius(self.radius)
+
+    # Times
+
+    def time_to_mean_anomaly(self, M):
+        """ Time until the orbit next reaches mean anomaly M. Negative if a
+            hyperbolic orbit has already passed it. """
+        dM = M - self.mean_anomaly
+        if not self.hyperbolic:
+            dM %= TWO_PI
+        return dM / self.mean_motion
+
+    def time_to_true_anomaly(self, theta):
+        return self.time_to_mean_anomaly(self.mean_anomaly_from_true_anomaly(theta))
+
+    @property
+    def time_to_periapsis(self):
+        return self.time_to_mean_anomaly(0.)
+
+    @property
+    def time_to_apoapsis(self):
+        if self.hyperbolic:
+            return float('inf')
+        return self.time_to_mean_anomaly(math.pi)
+
+    @property
+    def time_to_ascending_node(self):
+        # The ascending node is where the argument of latitude is zero
+        return self.time_to_true_anomaly(-self.argument_of_periapsis)
+
+    @property
+    def time_to_descending_node(self):
+        return self.time_to_true_anomaly(math.pi - self.argument_of_periapsis)
+
+    @property
+    def true_longitude(self):
+        """ Angle from the reference direction to the vessel, for low inclination orbits """
+        return (self.longitude_of_ascending_node + self.argument_of_periapsis + self.true_anomaly) % TWO_PI
@@ -0,0 +1,160 @@
+"""
+A local index of the parts of a vessel.
+
+Finding parts over RPC means walking the parts and their modules one call
+at a time. PartIndex fetches the parts of a vessel once, and indexes them
+by activation stage, decouple stage, resource, module name and the events
+their modules have, so lookups are dictionary reads with no RPCs.
+
+The list of parts is streamed. update() checks it, and only fetches the
+parts that have been added; parts that have gone (after staging or
+decoupling) are dropped from the index. Call update() before querying, or
+schedule the index so it is kept up to date:
+
+    index = PartIndex(conn, vessel)
+    ...
+    index.update()
+    for module in index.modules_with_event('Extend', 'ModuleAnimateGeneric'):
+        module.trigger_event('Extend')
+"""
+
+from krpctoolkit.pool import snapshot_parts
+from krpctoolkit.streams import add_stream
+
+def _modules(part):
+    return [(module, module.name, frozenset(module.events)) for module in part.modules]
+
+FIELDS = [
+    'stage', 'decouple_stage', 'engine',
+    ('resources', lambda part: list(part.resources.names)),
+    ('modules', _modules)
+]
+
+class PartEntry(object):
+    __slots__ = ('part', 'stage', 'decouple_stage', 'engine', 'resources', 'modules')
+
+    def __init__(self, part, stage, decouple_stage, engine, resources, modules):
+        self.part = part
+        self.stage = stage
+        self.decouple_stage = decouple_stage
+        self.engine = engine
+        self.resources = resources
+        self.modules = modules
+
+class PartIndex(object):
+
+    def __init__(self, conn, vessel, pool=None):
+        self.vessel = vessel
+        self.pool = pool
+        self.all = add_stream(conn, getattr, vessel.parts, 'all')
+        self.entries = {}
+        self.fetches = 0
+        self._parts = None
+        self._by_stage = {}
+        self._by_decouple_stage = {}
+        self._by_resource = {}
+        self._by_module = {}
+        self._by_event = {}
+        self._module_part = {}
+        self.update()
+
+    def __call__(self):
+        self.update()
+        return False
+
+    @property
+    def streams(self):
+        return (self.all,)
+
+    def close(self):
+        self.all.remove()
+
+    def update(self):
+        """ Bring the index up to date with the parts of the vessel """
+        parts = self.all()
+        if parts is self._parts:
+            return
+        self._parts = parts
+        current = set(parts)
+        for part in [part for part in self.entries if part not in current]:
+            self._remove(part)
+        added = [part for part in parts if part not in self.entries]
+        if added:
+            self._add(added)
+
+    def _add(self, parts):
+        table = snapshot_parts(self.pool, self.vessel, FIELDS, parts)
+        self.fetches += len(parts)
+        for i, part in enumerate(parts):
+            row = table.row(i)
+            entry = PartEntry(part, row['stage'], row['decouple_stage'], row['engine'],
+                              row['resources'], row['modules'])
+            self.entries[part] = entry
+            self._by_stage.setdefault(entry.stage, set()).add(part)
+            self._by_decouple_stage.setdefault(entry.decouple_stage, set()).add(part)
+            for name in entry.resources:
+                self._by_resource.setdefault(name, set()).add(part)
+            for module, name, events in entry.modules:
+                self._by_module.setdefault(name, set()).add(part)
+                self._module_part[module] = part
+                self._index_events(module, name, events)
+
+    def _remove(self, part):
+        entry = self.entries.pop(part)
+        self._by_stage[entry.stage].discard(part)
+        self._by_decouple_stage[entry.decouple_stage].discard(part)
+        for name in entry.resources:
+            self._by_resource[name].discard(part)
+        for module, name, events in entry.modules:
+            self._by_module[name].discard(part)
+            del self._module_part[module]
+            for event in events:
+                self._by_event[event].pop(module, None)
+
+    def _index_events(self, module, name, events):
+        for event in events:
+            self._by_event.setdefault(event, {})[module] = name
+
+    def in_stage(self, stage):
+        """ Parts activated in the given stage """
+        return list(self._by_stage.get(stage, ()))
+
+    def in_decouple_stage(self, stage):
+        """ Parts decoupled in the given stage """
+        return list(self._by_decouple_stage.get(stage, ()))
+
+    def with_resource(self, name):
+        """ Parts that can hold the named resource """
+        return list(self._by_resource.get(name, ()))
+
+    def with_module(self, name):
+        """ Parts that have a module with the given name """
+        return list(self._by_module.get(name, ()))
+
+    def modules_with_event(self, event, module_name=None):
+        """ Modules that have the given event, optionally only those with the given name """
+        modules = self._by_event.get(event, {})
+        return [module for module, name in modules.items()
+                if module_name is None or name == module_name]
+
+    def engine(self, part):
+        return self.entries[part].engine
+
+    def trigger_event(self, event, module_name=None):
+        """
+        Trigger an event on every module that has it. The events of those
+        modules are then fetched again, as triggering an event usually
+        changes which events are available.
+        """
+        modules = self.modules_with_event(event, module_name)
+        for module in modules:
+            module.trigger_event(event)
+        for module in modules:
+            name = self._by_event[event][module]
+            for indexed in self._by_event.values():
+                indexed.pop(module, None)
+            events = frozenset(module.events)
+            self._index_events(module, name, events)
+            entry = self.entries[self._module_part[module]]
+            entry.modules = [(m, n, events if m == module else e) for m, n, e in entry.modules]
+        return len(modules)
@@ -22,3 +22,76 @@ class PIDController(object):
         output = np.maximum(min_output, np.minimum(max_output, output))
         self.last_position = position
         return output
+
+class PIDBank(object):
+    """ A bank of n PID controllers, updated together with one vectorized call.
+
+        Gains, limits, time steps and controller state are held in preallocated
+        arrays with one element per loop, and update() works on them in place
+        without allocating. The integral term is clamped to the output limits of
+        each loop to prevent windup. Inputs can be written directly into the
+        error and position arrays (e.g. through slices handed out to individual
+        controllers) before calling update() with no arguments. """
+
+    def __init__(self, n, Kp = 1, Ki = 0, Kd = 0, dt = 1, min_output = -1, max_output = 1):
+        self.n = n
+        self.Kp = np.empty(n)
+        self.Ki = np.empty(n)
+        self.Kd = np.empty(n)
+        self.dt = np.empty(n)
+        self.min_output = np.empty(n)
+        self.max_output = np.empty(n)
+        self.error = np.zeros(n)
+        self.position = np.zeros(n)
+        self.Ti = np.zeros(n)
+        self.last_position = np.zeros(n)
+        self.output = np.zeros(n)
+        self._tmp = np.empty(n)
+        self.setparams(slice(None), Kp, Ki, Kd, dt)
+        self.setlimits(slice(None), min_output, max_output)
+
+    def setparams(self, index, Kp = 1, Ki = 0, Kd = 0, dt = 1):
+        """ Set the gains and time step of the loop(s) selected by index """
+        self.Kp[index] = Kp
+        self.Ki[index] = Ki
+        self.Kd[index] = Kd
+        self.dt[index] = dt
+
+    def setlimits(self, index, min_output, max_output):
+        """ Set the output clamp of the loop(s) selected by index """
+        self.min_output[index] = min_output
+        self.max_output[index] = max_output
+
+    def reset(self, index = slice(None)):
+        self.Ti[index] = 0
+        self.last_position[index] = 0
+
+    def update(self, error = None, position = None, dt = None):
+        """ Update all loops and return the output array.
+            The returned array is reused by the next call. """
+        if error is not None:
+            np.copyto(self.error, error)
+        if position is not None:
+            np.copyto(self.position, position)
+        if dt is not None:
+            np.copyto(self.dt, dt)
+        tmp = self._tmp
+        output = self.output
+
+        # Integral term, clamped for anti-windup
+        np.multiply(self.Ki, self.dt, out=tmp)
+        tmp *= self.error
+        self.Ti += tmp
+        np.clip(self.Ti, self.min_output, self.max_output, out=self.Ti)
+
+        # Derivative on measurement
+        np.subtract(self.position, self.last_position, out=tmp)
+        tmp *= self.Kd
+        tmp /= self.dt
+
+        np.multiply(self.Kp, self.error, out=output)
+        output += self.Ti
+        output -= tmp
+        np.clip(output, self.min_output, self.max_output, out=output)
+        np.copyto(self.last_position, self.position)
+        return output
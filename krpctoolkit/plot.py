@@ -1,15 +1,37 @@
-from collections import deque
+import time
+import warnings
+import numpy as np
 import matplotlib.pyplot as plot
 
 class LivePlot(object):
-    def __init__(self, series, defaultopt, window):
+    """ Scrolling plot of several series, one per row.
 
-        data = {}
-        for name,opt in series:
-            data[name] = deque([None] * window)
+        Samples are stored in preallocated NumPy ring buffers. Each buffer is
+        twice the window length and every sample is written to both halves, so
+        the current window is always a contiguous slice and no copy is needed
+        to display it. Windows longer than max_points are decimated to the
+        minimum and maximum of each bucket, so that draw cost does not grow
+        with the window. Axes, labels and grid lines are drawn once and cached,
+        and only the lines are redrawn (blitted) each frame. draw() redraws at
+        most fps times per second, however often samples are added. """
 
+    def __init__(self, series, defaultopt, window, fps=20, max_points=500):
         self.fig = plot.figure(1)
+        self.window = window
+        self.interval = 1. / fps
+        self.last_draw = 0
+        self.head = 0
+
+        # Display positions of the (possibly decimated) samples
+        self.buckets = 1
+        if window > max_points:
+            self.buckets = int(np.ceil(window / float(max_points)))
+        npoints = -(-window // self.buckets)
+        self.xdata = np.repeat(np.arange(npoints) * self.buckets, 2 if self.buckets > 1 else 1)
+
+        data = {}
         axes = {}
+        lines = {}
         for i,(name,opt) in enumerate(series):
 
             mergedopt = defaultopt.copy()
@@ -20,6 +42,7 @@ class LivePlot(object):
             ylabel = opt.get('ylabel', name)
             yticks = opt.get('yticks', [ylim[0], (ylim[1]-ylim[0])/2 + ylim[0], ylim[1]])
             grid = opt.get('grid', 'lightgrey')
+            color = opt.get('color', 'black')
 
             axis = self.fig.add_subplot(len(series),1,i+1)
             axis.axis([0,window,ylim[0],ylim[1]])
@@ -33,15 +56,8 @@ class LivePlot(object):
                     axis.axhline(y=tick, ls='-', color=grid)
             axes[name] = axis
 
-        lines = {}
-        for i,(name,opt) in enumerate(series):
-
-            mergedopt = defaultopt.copy()
-            mergedopt.update(opt)
-            opt = mergedopt
-
-            color = opt.get('color', 'black')
-            line = axes[name].plot(list(range(window)), data[name], '-', color=color)
+            data[name] = np.full(2*window, np.nan)
+            line, = axis.plot(self.xdata, self._display(data[name][:window]), '-', color=color, animated=True)
             lines[name] = line
 
         plot.ion()
@@ -49,13 +65,63 @@ class LivePlot(object):
 
         self.series = series
         self.data = data
+        self.axes = axes
         self.lines = lines
 
+        # Cache the static parts of the figure, and again whenever it is redrawn in full
+        self.background = None
+        self.blit = self.fig.canvas.supports_blit
+        self.fig.canvas.mpl_connect('draw_event', self._on_draw)
+        self.fig.canvas.draw()
+
     def add(self, values):
-        for i,(name,opt) in enumerate(self.series):
-            self.data[name].append(values[i])
-            self.data[name].popleft()
-            self.lines[name][0].set_ydata(self.data[name])
+        i = self.head
+        for (name,opt),value in zip(self.series, values):
+            if value is None:
+                value = np.nan
+            buf = self.data[name]
+            buf[i] = value
+            buf[i + self.window] = value
+        self.head = (i + 1) % self.window
+
+    def window_data(self, name):
+        """ The samples currently in the window, oldest first, as a view """
+        return self.data[name][self.head:self.head + self.window]
+
+    def draw(self, force=False):
+        now = time.time()
+        if not force and now - self.last_draw < self.interval:
+            return
+        self.last_draw = now
+        for name,_ in self.series:
+            self.lines[name].set_ydata(self._display(self.window_data(name)))
+        canvas = self.fig.canvas
+        if not self.blit or self.background is None:
+            canvas.draw_idle()
+        else:
+            canvas.restore_region(self.background)
+            for name,_ in self.series:
+                self.axes[name].draw_artist(self.lines[name])
+            canvas.blit(self.fig.bbox)
+        canvas.flush_events()
+
+    def _display(self, values):
+        if self.buckets == 1:
+            return values
+        n = len(self.xdata) // 2
+        padded = np.full(n * self.buckets, np.nan)
+        padded[:len(values)] = values
+        buckets = padded.reshape(n, self.buckets)
+        out = np.empty(2*n)
+        # Buckets with no samples yet are all NaN, and are left as NaN
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', RuntimeWarning)
+            out[0::2] = np.nanmin(buckets, axis=1)
+            out[1::2] = np.nanmax(buckets, axis=1)
+        return out
 
-    def draw(self):
-        plot.draw()
+    def _on_draw(self, event):
+        if self.blit:
+            self.background = self.fig.canvas.copy_from_bbox(self.fig.bbox)
+            for name,_ in self.series:
+                self.axes[name].draw_artist(self.lines[name])
@@ -0,0 +1,148 @@
+"""
+A pool of kRPC connections, for fetching many independent values in
+parallel.
+
+Calls on one connection are made one at a time, each waiting for a round
+trip to the server. The pool opens several connections and spreads calls
+across them from a thread pool, so that a bulk fetch takes roughly the
+time of one connection divided by the size of the pool.
+
+Remote objects are identified by an id that is valid on any connection to
+the same server, so objects obtained on one connection can be rebound to
+another with bind().
+
+    with ConnectionPool(8, name='Snapshot') as pool:
+        table = snapshot_parts(pool, vessel, ['title', 'mass', 'stage', 'parent'])
+    masses = table['mass']
+"""
+
+import math
+import queue
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+
+def bind(obj, conn):
+    """ Return a remote object (or a list or tuple of them) bound to another connection """
+    if isinstance(obj, (list, tuple)):
+        return type(obj)(bind(x, conn) for x in obj)
+    object_id = getattr(obj, '_object_id', None)
+    if object_id is None or getattr(obj, '_client', None) is conn:
+        return obj
+    cls = type(obj)
+    python_type = conn._types.class_type(cls._service_name, cls._class_name).python_type
+    return python_type(conn, object_id)
+
+class ConnectionPool(object):
+    """
+    Opens size connections using connect (krpc.connect by default, called
+    with kwargs), and runs calls on them from size threads.
+    """
+
+    def __init__(self, size=4, connect=None, **kwargs):
+        if connect is None:
+            import krpc
+            connect = krpc.connect
+        self.size = size
+        self.connections = [connect(**kwargs) for _ in range(size)]
+        self._free = queue.Queue()
+        for conn in self.connections:
+            self._free.put(conn)
+        self._executor = ThreadPoolExecutor(size)
+
+    def _run(self, fn, args):
+        conn = self._free.get()
+        try:
+            return fn(conn, *args)
+        finally:
+            self._free.put(conn)
+
+    def submit(self, fn, *args):
+        """ Call fn(conn, *args) on a connection from the pool. Returns a future. """
+        return self._executor.submit(self._run, fn, args)
+
+    def map(self, fn, items):
+        """ Call fn(conn, item) for each item, in parallel. Returns the results in order. """
+        futures = [self.submit(fn, item) for item in items]
+        return [future.result() for future in futures]
+
+    def close(self):
+        self._executor.shutdown()
+        for conn in self.connections:
+            conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+class PartTable(object):
+    """
+    Values of fields for a list of parts, stored by column. Numeric and
+    boolean columns are NumPy arrays, other columns are lists.
+    """
+
+    def __init__(self, parts, columns):
+        self.parts = parts
+        self.columns = columns
+
+    def __len__(self):
+        return len(self.parts)
+
+    def __getitem__(self, field):
+        return self.columns[field]
+
+    def row(self, i):
+        return dict((name, column[i]) for name, column in self.columns.items())
+
+def _field(field):
+    """ The name and getter for a field, given as an attribute path or a (name, function) pair """
+    if isinstance(field, tuple):
+        return field
+    path = field.split('.')
+    def get(obj):
+        for name in path:
+            obj = getattr(obj, name)
+        return obj
+    return field, get
+
+def snapshot_parts(pool, vessel, fields, parts=None):
+    """
+    Fetch fields for each part of a vessel (or the given parts) across the
+    connections of the pool, and return them as a PartTable. Fields are
+    attribute names such as 'mass' or 'engine.thrust', or (name, function)
+    pairs where the function takes a part. Remote objects in the results
+    are bound to the vessel's connection. If pool is None, the fields are
+    fetched one at a time on the vessel's connection.
+    """
+    if parts is None:
+        parts = vessel.parts.all
+    home = getattr(vessel, '_client', None)
+    getters = [_field(field) for field in fields]
+
+    def fetch(conn, chunk):
+        rows = []
+        for part in chunk:
+            part = bind(part, conn)
+            rows.append([get(part) for _, get in getters])
+        return rows
+
+    if pool is None:
+        rows = fetch(home, parts)
+    else:
+        # A few chunks per connection, so that slow chunks balance out
+        size = max(1, int(math.ceil(len(parts) / float(pool.size * 4))))
+        chunks = [parts[i:i+size] for i in range(0, len(parts), size)]
+        rows = [row for result in pool.map(fetch, chunks) for row in result]
+
+    columns = {}
+    for j, (name, _) in enumerate(getters):
+        column = [row[j] for row in rows]
+        if home is not None:
+            column = [bind(value, home) for value in column]
+        if column and all(isinstance(value, bool) for value in column):
+            column = np.array(column, dtype=bool)
+        elif column and all(isinstance(value, (int, float)) for value in column):
+            column = np.array(column)
+        columns[name] = column
+    return PartTable(parts, columns)
@@ -0,0 +1,178 @@
+import atexit
+import bisect
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from krpctoolkit import batch, strict
+
+# Upper bounds of the latency histogram buckets, in seconds (0.1 ms to 0.8 s)
+BUCKETS = [0.0001 * 2**i for i in range(14)]
+
+_krpc_dir = None
+
+class CallStats(object):
+    def __init__(self):
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    def add(self, latency):
+        self.count += 1
+        self.total += latency
+        self.max = max(self.max, latency)
+
+class PhaseStats(object):
+    def __init__(self, name):
+        self.name = name
+        self.rpcs = 0
+        self.streams = 0
+        self.total = 0
+        self.histogram = [0] * (len(BUCKETS) + 1)
+        self.calls = {}
+
+    def percentile(self, p):
+        """ Approximate latency percentile, as the upper bound of its bucket """
+        target = p * self.rpcs
+        n = 0
+        for bound, count in zip(BUCKETS + [float('inf')], self.histogram):
+            n += count
+            if n >= target:
+                return bound
+        return 0
+
+class Profiler(object):
+    """
+    Counts the RPCs and stream creations made on a connection, with a
+    histogram of their round trip latencies. Each call is attributed to the
+    controller tick that made it (see Scheduler and strict.tick) and to the
+    line of the caller's source that made it, and is recorded against the
+    current phase of the mission.
+
+    The profiler wraps the connection's _invoke method, looking up the
+    client's method on each call so it stays behind strict mode however
+    the two are attached, and its
+    _invoke_batch hook for requests made by batch(), so only adds a clock
+    read and a short walk up the stack to each RPC. A batch is counted as
+    one RPC, named after the calls it makes.
+    """
+
+    def __init__(self, conn, dump_on_exit=False, out=None):
+        self.conn = conn
+        self.out = out
+        self.phases = OrderedDict()
+        self._phase = self._get_phase('default')
+        self._lock = threading.Lock()
+        # A wrapper already set on the connection, otherwise the client's method
+        self._invoke = conn.__dict__.get('_invoke')
+        conn._invoke = self._profiled_invoke
+        self._invoke_batch = getattr(conn, '_invoke_batch', None)
+        conn._invoke_batch = self._profiled_invoke_batch
+        self._dump_on_exit = dump_on_exit
+        if dump_on_exit:
+            atexit.register(self.dump)
+
+    def close(self):
+        """ Stop profiling the connection """
+        if self._dump_on_exit:
+            atexit.unregister(self.dump)
+            self._dump_on_exit = False
+        if self.conn._invoke == self._profiled_invoke:
+            if self._invoke is None:
+                del self.conn._invoke
+            else:
+                self.conn._invoke = self._invoke
+        if self.conn._invoke_batch == self._profiled_invoke_batch:
+            if self._invoke_batch is None:
+                del self.conn._invoke_batch
+            else:
+                self.conn._invoke_batch = self._invoke_batch
+
+    def set_phase(self, name):
+        self._phase = self._get_phase(name)
+
+    @contextmanager
+    def phase(self, name):
+        previous = self._phase
+        self.set_phase(name)
+        try:
+            yield
+        finally:
+            self._phase = previous
+
+    def _get_phase(self, name):
+        if name not in self.phases:
+            self.phases[name] = PhaseStats(name)
+        return self.phases[name]
+
+    def _profiled_invoke(self, service, procedure, *args):
+        start = time.perf_counter()
+        try:
+            if self._invoke is None:
+                return type(self.conn)._invoke(self.conn, service, procedure, *args)
+            return self._invoke(service, procedure, *args)
+        finally:
+            self._record(service, procedure, time.perf_counter() - start)
+
+    def _profiled_invoke_batch(self, request):
+        start = time.perf_counter()
+        try:
+            if self._invoke_batch is None:
+                return batch.invoke_batch(self.conn, request)
+            return self._invoke_batch(request)
+        finally:
+            self._record('batch', batch._procedures(request), time.perf_counter() - start)
+
+    def _record(self, service, procedure, latency):
+        key = (strict.current_tick(), _call_site(), '%s.%s' % (service, procedure))
+        with self._lock:
+            phase = self._phase
+            phase.rpcs += 1
+            phase.total += latency
+            phase.histogram[bisect.bisect_left(BUCKETS, latency)] += 1
+            if service == 'KRPC' and procedure == 'AddStream':
+                phase.streams += 1
+            stats = phase.calls.get(key)
+            if stats is None:
+                stats = phase.calls[key] = CallStats()
+            stats.add(latency)
+
+    def report(self):
+        lines = []
+        with self._lock:
+            for phase in self.phases.values():
+                if phase.rpcs == 0:
+                    continue
+                lines.append('Phase %s: %d RPCs, %d streams added, %.3f s total' % (
+                    phase.name, phase.rpcs, phase.streams, phase.total))
+                lines.append('  latency p50 < %.1f ms, p90 < %.1f ms, p99 < %.1f ms' % (
+                    phase.percentile(0.5)*1000, phase.percentile(0.9)*1000, phase.percentile(0.99)*1000))
+                lines.append('  {:20} {:30} {:40} {:>7} {:>9} {:>9}'.format(
+                    'controller', 'call site', 'procedure', 'count', 'mean ms', 'max ms'))
+                calls = sorted(phase.calls.items(), key=lambda x: -x[1].total)
+                for (tick, site, procedure), stats in calls:
+                    lines.append('  {:20} {:30} {:40} {:7d} {:9.3f} {:9.3f}'.format(
+                        (tick or '-')[:20], site[-30:], procedure[:40], stats.count,
+                        stats.total / stats.count * 1000, stats.max * 1000))
+        return '\n'.join(lines)
+
+    def dump(self):
+        out = self.out or sys.stderr
+        out.write(self.report() + '\n')
+
+def _call_site():
+    """ The first frame on the stack outside of the kRPC client and this module """
+    global _krpc_dir
+    if _krpc_dir is None:
+        import krpc
+        _krpc_dir = os.path.dirname(krpc.__file__)
+    frame = sys._getframe(2)
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if not filename.startswith(_krpc_dir) and filename not in (__file__, batch.__file__) \
+           and not filename.startswith('<frozen'):
+            return '%s:%d' % (os.path.basename(filename), frame.f_lineno)
+        frame = frame.f_back
+    return '?'
@@ -0,0 +1,160 @@
+"""
+Real-time plotting in a separate process, fed through shared memory.
+
+The control process writes samples into a ring buffer in a shared memory
+block. Each plotter runs in its own process, attaches to the block by name
+and draws a LivePlot from it, so a slow redraw or a window resize never
+delays the control loop. Any number of plotters can attach to one buffer.
+
+Writing a sample is a row store into the block followed by a store of the
+sample count; there is no pickling and no lock. The buffer has a single
+writer, and readers detect and drop any rows overwritten while they were
+being copied.
+
+    buffer = SharedBuffer(['altitude', 'throttle'])
+    plotter = start_plotter(buffer.name, [
+        ('altitude', {'ylim': (0, 100000)}),
+        ('throttle', {'ylim': (0, 1)})])
+    ...
+    buffer.add((altitude(), vessel.control.throttle))
+    ...
+    plotter.terminate()
+    buffer.close()
+"""
+
+import json
+import multiprocessing
+import time
+import numpy as np
+from multiprocessing import shared_memory
+
+MAGIC = b'KRPCSHM1'
+HEADER_SIZE = 4096
+
+# Header layout: magic, then the number of samples written as int64, then the schema as JSON
+_SEQ = 8
+_SCHEMA = 16
+
+class SharedBuffer(object):
+    """ Ring buffer of samples in shared memory, written by the control process """
+
+    def __init__(self, names, capacity=10000, name=None):
+        self.names = list(names)
+        self.capacity = capacity
+        self.schema = {'capacity': capacity, 'names': self.names}
+        width = len(self.names)
+        self._shm = shared_memory.SharedMemory(
+            name=name, create=True, size=HEADER_SIZE + capacity * width * 8)
+        self.name = self._shm.name
+        buf = self._shm.buf
+        buf[:len(MAGIC)] = MAGIC
+        schema = json.dumps(self.schema).encode('utf-8')
+        if _SCHEMA + len(schema) > HEADER_SIZE:
+            raise ValueError('Too many series for shared buffer header')
+        buf[_SCHEMA:_SCHEMA+len(schema)] = schema
+        self._seq = np.ndarray((1,), dtype=np.int64, buffer=buf, offset=_SEQ)
+        self._rows = np.ndarray((capacity, width), dtype=np.float64, buffer=buf, offset=HEADER_SIZE)
+        self._seq[0] = 0
+        self.count = 0
+
+    def add(self, values):
+        """ Append a sample. None values are stored as NaN. """
+        row = self._rows[self.count % self.capacity]
+        for i, value in enumerate(values):
+            row[i] = np.nan if value is None else value
+        # Publish the row only once it has been written
+        self.count += 1
+        self._seq[0] = self.count
+
+    def close(self):
+        """ Release the buffer. Attached plotters keep their mapping until they exit. """
+        del self._seq, self._rows
+        self._shm.close()
+        self._shm.unlink()
+
+class SharedBufferReader(object):
+    """ A read-only view of a SharedBuffer, attached by name """
+
+    def __init__(self, name):
+        self._shm = _attach(name)
+        buf = self._shm.buf
+        if bytes(buf[:len(MAGIC)]) != MAGIC:
+            raise ValueError('%s is not a shared sample buffer' % name)
+        schema = bytes(buf[_SCHEMA:HEADER_SIZE]).rstrip(b'\0')
+        self.schema = json.loads(schema.decode('utf-8'))
+        self.names = self.schema['names']
+        self.capacity = self.schema['capacity']
+        self._seq = np.ndarray((1,), dtype=np.int64, buffer=buf, offset=_SEQ)
+        self._rows = np.ndarray(
+            (self.capacity, len(self.names)), dtype=np.float64, buffer=buf, offset=HEADER_SIZE)
+
+    @property
+    def count(self):
+        return int(self._seq[0])
+
+    def read(self, since, limit=None):
+        """
+        Copies of the samples written after sample number since, oldest
+        first, as (count, rows). At most limit samples are returned, and
+        fewer if the writer has overwritten them.
+        """
+        end = self.count
+        start = max(since, end - self.capacity + 1)
+        if limit is not None:
+            start = max(start, end - limit)
+        if start >= end:
+            return end, self._rows[:0].copy()
+        i, j = start % self.capacity, end % self.capacity
+        if i < j:
+            rows = self._rows[i:j].copy()
+        else:
+            rows = np.concatenate((self._rows[i:], self._rows[:j]))
+        # The writer may have lapped the copy; drop the rows it could have touched
+        overwritten = self.count - self.capacity + 1 - start
+        if overwritten > 0:
+            rows = rows[overwritten:]
+        return end, rows
+
+    def close(self):
+        del self._seq, self._rows
+        self._shm.close()
+
+def _attach(name):
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        # Before Python 3.13, attaching registers the block with the resource
+        # tracker, which would unlink it when the plotter exits
+        from multiprocessing import resource_tracker
+        register = resource_tracker.register
+        resource_tracker.register = lambda name, rtype: None
+        try:
+            return shared_memory.SharedMemory(name=name)
+        finally:
+            resource_tracker.register = register
+
+def plot(name, series, defaultopt=None, window=500, fps=20):
+    """ Draw a LivePlot of the given series of a shared buffer, until the window is closed """
+    import matplotlib.pyplot as pyplot
+    from krpctoolkit.plot import LivePlot
+    reader = SharedBufferReader(name)
+    columns = [reader.names.index(series_name) for series_name, _ in series]
+    live = LivePlot(series, defaultopt or {}, window, fps=fps)
+    since = reader.count
+    interval = 1. / fps
+    try:
+        while pyplot.fignum_exists(live.fig.number):
+            since, rows = reader.read(since, limit=window)
+            for row in rows:
+                live.add(row[columns])
+            live.draw(force=True)
+            time.sleep(interval)
+    finally:
+        reader.close()
+
+def start_plotter(name, series, defaultopt=None, window=500, fps=20):
+    """ Start a process plotting from the shared buffer with the given name """
+    process = multiprocessing.Process(target=plot, args=(name, series, defaultopt, window, fps))
+    process.daemon = True
+    process.start()
+    return process
@@ -0,0 +1,153 @@
+"""
+Flight recorder that stores telemetry in a memory-mapped, columnar ring file.
+
+The file starts with a fixed size header holding the schema, followed by
+one float64 array per column (plus the timestamps), each with room for
+capacity samples. Recording a sample is a handful of array stores into the
+mapping. A background thread syncs the file to disk with os.fsync, which
+releases the GIL while it waits (mmap.flush holds it for the whole sync),
+so the control thread never waits on I/O. Once capacity samples have been
+recorded, the oldest samples are overwritten.
+
+    recorder = Recorder('flight.rec', [
+        ('altitude', altitude),
+        ('angular_velocity', angular_velocity),
+        ('throttle', lambda: vessel.control.throttle)], clock=ut)
+    scheduler.add(recorder, rate=50)
+    ...
+    recorder.close()
+
+    recording = Recording('flight.rec')
+    t, altitude = recording['time'], recording['altitude']
+"""
+
+import json
+import os
+import threading
+import time
+import numpy as np
+
+MAGIC = b'KRPCREC1'
+HEADER_SIZE = 4096
+
+# Header layout: magic, then head and count as int64, then the schema as JSON
+_HEAD = 8
+_COUNT = 16
+_SCHEMA = 24
+
+def _layout(schema):
+    """ Offsets and shapes of each column, for a schema of (name, width) pairs """
+    capacity = schema['capacity']
+    offset = HEADER_SIZE
+    layout = []
+    for name, width in [('time', 1)] + [tuple(x) for x in schema['columns']]:
+        layout.append((name, offset, width))
+        offset += capacity * width * 8
+    return layout, offset
+
+class Recorder(object):
+    """
+    Records samples from sources (streams or other callables returning a
+    number or a vector) each time it is called. The width of each column
+    is taken from the first value of its source.
+    """
+
+    def __init__(self, path, sources, capacity=1000000, clock=time.time, flush_interval=1.):
+        self.sources = [source for _, source in sources]
+        self.clock = clock
+        columns = []
+        for name, source in sources:
+            columns.append((name, int(np.size(source()))))
+        self.schema = {'capacity': capacity, 'columns': columns}
+
+        layout, size = _layout(self.schema)
+        self._mm = np.memmap(path, dtype=np.uint8, mode='w+', shape=(size,))
+        self._mm[:len(MAGIC)] = np.frombuffer(MAGIC, dtype=np.uint8)
+        schema = json.dumps(self.schema).encode('utf-8')
+        if _SCHEMA + len(schema) > HEADER_SIZE:
+            raise ValueError('Too many columns for recording header')
+        self._mm[_SCHEMA:_SCHEMA+len(schema)] = np.frombuffer(schema, dtype=np.uint8)
+        self._position = self._mm[_HEAD:_COUNT+8].view(np.int64)
+        self._columns = [_column(self._mm, offset, capacity, width) for _, offset, width in layout]
+        self._time = self._columns[0]
+        self._data = self._columns[1:]
+        self.capacity = capacity
+        self.head = 0
+        self.count = 0
+
+        self._fd = os.open(path, os.O_RDWR)
+        self._stop = threading.Event()
+        self._flusher = threading.Thread(target=self._flush, args=(flush_interval,))
+        self._flusher.daemon = True
+        self._flusher.start()
+
+    def __call__(self):
+        i = self.head
+        self._time[i] = self.clock()
+        for column, source in zip(self._data, self.sources):
+            column[i] = source()
+        self.head = (i + 1) % self.capacity
+        self.count = min(self.count + 1, self.capacity)
+        self._position[0] = self.head
+        self._position[1] = self.count
+
+    def close(self):
+        self._stop.set()
+        self._flusher.join()
+        self._mm.flush()
+        os.close(self._fd)
+
+    def _flush(self, interval):
+        while not self._stop.wait(interval):
+            os.fsync(self._fd)
+
+def _column(mm, offset, capacity, width):
+    column = mm[offset:offset + capacity*width*8].view(np.float64)
+    if width == 1:
+        return column
+    return column.reshape(capacity, width)
+
+class Recording(object):
+    """
+    A recording opened read-only. Columns are views onto the file, so are
+    only paged in as they are used. Until the ring has wrapped, indexing by
+    name returns a zero-copy view of the samples in order. After it has
+    wrapped, segments() returns the older and newer parts as two views.
+    """
+
+    def __init__(self, path):
+        self._mm = np.memmap(path, dtype=np.uint8, mode='r')
+        if self._mm[:len(MAGIC)].tobytes() != MAGIC:
+            raise ValueError('%s is not a flight recording' % path)
+        schema = self._mm[_SCHEMA:HEADER_SIZE].tobytes().rstrip(b'\0')
+        self.schema = json.loads(schema.decode('utf-8'))
+        self.capacity = self.schema['capacity']
+        layout, _ = _layout(self.schema)
+        self.names = [name for name, _, _ in layout]
+        self._columns = dict(
+            (name, _column(self._mm, offset, self.capacity, width)) for name, offset, width in layout)
+
+    @property
+    def head(self):
+        return int(self._mm[_HEAD:_COUNT].view(np.int64)[0])
+
+    @property
+    def count(self):
+        return int(self._mm[_COUNT:_COUNT+8].view(np.int64)[0])
+
+    @property
+    def wrapped(self):
+        return self.count == self.capacity and self.head != 0
+
+    def segments(self, name):
+        """ Views of the samples of a column, oldest first """
+        column = self._columns[name]
+        if not self.wrapped:
+            return (column[:self.count],)
+        return (column[self.head:], column[:self.head])
+
+    def __getitem__(self, name):
+        segments = self.segments(name)
+        if len(segments) == 1:
+            return segments[0]
+        return np.concatenate(segments)
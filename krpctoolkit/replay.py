@@ -0,0 +1,309 @@
+"""
+Record the RPCs and stream updates of a kRPC session, and replay them
+through a connection that needs no server.
+
+Recording works at the level of protobuf messages: every request sent on
+the RPC connection is logged with its response, and every stream update is
+logged as it arrives, all in one time-ordered log. On replay, the kRPC
+client is given a connection that serves the logged responses, so remote
+objects, streams and events decode exactly as they did in flight. A request
+that does not match the next one in the log is a divergence. In strict mode
+it is raised as ReplayDivergence. Otherwise it is recorded in
+Replay.divergences with a warning, and the log is searched ahead (up to
+lookahead records) for a matching request: if one is found, the requests
+before it are skipped, and if not, the request gets an error response and
+the log stays where it was. A request never gets the response to another.
+
+Stream updates are delivered as replay time advances, which happens when a
+logged RPC is made or when the client sleeps. Drive controllers with
+Scheduler(clock=replay.clock, sleep=replay.sleep) to run as fast as the CPU
+allows.
+
+The log is a sequence of length-prefixed records, read sequentially, with
+an index of record offsets and times in a separate .idx file so long
+sessions can be inspected without reading the whole log.
+
+    conn = krpc.connect()
+    capture = replay.record(conn, 'flight.log')
+    ...
+    capture.close()
+
+    session = replay.Replay('flight.log')
+    conn = session.connect()
+"""
+
+import struct
+import threading
+import time
+import warnings
+import numpy as np
+
+RPC = b'R'
+STREAM = b'S'
+
+_RECORD = struct.Struct('<cdI')
+_RPC = struct.Struct('<II')
+_INDEX = np.dtype([('offset', '<i8'), ('time', '<f8')])
+
+class ReplayDivergence(Exception):
+    pass
+
+class Capture(object):
+    """ Records the traffic on a connection to a log file. Use record() to create one. """
+
+    def __init__(self, conn, path):
+        self.conn = conn
+        self._log = open(path, 'wb')
+        self._index = open(path + '.idx', 'wb')
+        self._lock = threading.Lock()
+        self._start = time.perf_counter()
+        self._rpc_connection = conn._rpc_connection
+        self._stream_update = conn._stream_manager.update
+        conn._rpc_connection = _CapturingConnection(self, self._rpc_connection)
+        conn._stream_manager.update = self._update
+
+        # The client asks for the services when it is created, before it can be
+        # captured. Ask again so that a replayed client can be created.
+        conn._invoke('KRPC', 'GetServices', [], [], [], conn._types.services_type)
+
+    def close(self):
+        self.conn._rpc_connection = self._rpc_connection
+        self.conn._stream_manager.update = self._stream_update
+        with self._lock:
+            self._log.close()
+            self._index.close()
+
+    def _write(self, kind, payload):
+        with self._lock:
+            if self._log.closed:
+                return
+            t = time.perf_counter() - self._start
+            offset = self._log.tell()
+            self._log.write(_RECORD.pack(kind, t, len(payload)))
+            self._log.write(payload)
+            self._index.write(np.array([(offset, t)], dtype=_INDEX).tobytes())
+
+    def _rpc(self, request, response):
+        self._write(RPC, _RPC.pack(len(request), len(response)) + request + response)
+
+    def _update(self, results):
+        from krpc.schema import KRPC_pb2 as KRPC
+        update = KRPC.StreamUpdate()
+        update.results.extend(results)
+        self._write(STREAM, update.SerializeToString())
+        self._stream_update(update.results)
+
+class _CapturingConnection(object):
+    def __init__(self, capture, connection):
+        self._capture = capture
+        self._connection = connection
+        self._request = None
+
+    def send_message(self, message):
+        self._request = message.SerializeToString()
+        self._connection.send_message(message)
+
+    def receive_message(self, typ):
+        message = self._connection.receive_message(typ)
+        self._capture._rpc(self._request, message.SerializeToString())
+        return message
+
+    def __getattr__(self, name):
+        return getattr(self._connection, name)
+
+def record(conn, path):
+    """ Start recording the traffic on conn to path """
+    return Capture(conn, path)
+
+def read_index(path):
+    """ Offsets and times of the records in a log, as a memory-mapped array """
+    return np.memmap(path + '.idx', dtype=_INDEX, mode='r')
+
+class Replay(object):
+    """ Replays a log through a kRPC client connected to nothing. """
+
+    def __init__(self, path, strict=True, lookahead=1000):
+        self.strict = strict
+        self.lookahead = lookahead
+        self.divergences = []
+        self.now = 0.
+        self.rpcs = 0
+        self._log = open(path, 'rb')
+        self._lock = threading.Lock()
+        self._next = None
+        self._client = None
+        self._read()
+
+    def connect(self):
+        from krpc.client import Client
+        self._client = Client(_ReplayConnection(self), _ClosedConnection())
+        return self._client
+
+    def clock(self):
+        return self.now
+
+    def sleep(self, seconds):
+        """ Advance replay time, delivering the stream updates logged in that time """
+        with self._lock:
+            self.now += seconds
+            updates = self._take_updates(self.now)
+        self._deliver(updates)
+
+    @property
+    def finished(self):
+        return self._next is None
+
+    def _read(self):
+        header = self._log.read(_RECORD.size)
+        if len(header) < _RECORD.size:
+            self._next = None
+            return
+        kind, t, length = _RECORD.unpack(header)
+        self._next = (kind, t, self._log.read(length))
+
+    def _take_updates(self, until=float('inf')):
+        """ Consume the stream updates up to the next RPC, or time until """
+        updates = []
+        while self._next is not None and self._next[0] == STREAM and self._next[1] <= until:
+            updates.append(self._next[2])
+            self.now = max(self.now, self._next[1])
+            self._read()
+        return updates
+
+    def _deliver(self, updates):
+        # Called without the lock held, as delivering an update takes the
+        # stream's condition, which the client can hold while making an RPC
+        from krpc.schema import KRPC_pb2 as KRPC
+        if self._client is None:
+            return
+        for payload in updates:
+            update = KRPC.StreamUpdate()
+            update.ParseFromString(payload)
+            self._client._stream_manager.update(update.results)
+
+    def _deliver_pending(self):
+        with self._lock:
+            updates = self._take_updates()
+        self._deliver(updates)
+
+    def _take_rpc(self):
+        """ Consume the next record, an RPC, returning its request and response """
+        _, t, payload = self._next
+        self._read()
+        self.now = max(self.now, t)
+        self.rpcs += 1
+        request_size, _ = _RPC.unpack(payload[:_RPC.size])
+        return payload[_RPC.size:_RPC.size+request_size], payload[_RPC.size+request_size:]
+
+    def _skip_to(self, request):
+        """
+        Consume the records up to and including the next RPC matching
+        request, within lookahead records. Returns its response and the
+        stream updates skipped over, or None without consuming anything.
+        """
+        position = self._log.tell()
+        state = (self._next, self.now, self.rpcs)
+        updates = []
+        for _ in range(self.lookahead):
+            if self._next is None:
+                break
+            if self._next[0] == STREAM:
+                updates.extend(self._take_updates())
+                continue
+            expected, response = self._take_rpc()
+            if expected == request:
+                return response, updates
+        self._log.seek(position)
+        self._next, self.now, self.rpcs = state
+        return None
+
+    def _request(self, request):
+        """ Find the logged response to a request """
+        with self._lock:
+            updates = self._take_updates()
+        self._deliver(updates)
+        response = None
+        skipped = None
+        with self._lock:
+            if self._next is None:
+                expected = None
+            else:
+                expected = self._expected()
+                if request == expected:
+                    _, response = self._take_rpc()
+                elif not self.strict:
+                    rpcs = self.rpcs
+                    found = self._skip_to(request)
+                    if found is not None:
+                        response, updates = found
+                        skipped = self.rpcs - rpcs - 1
+        if expected is None:
+            self._diverge('Request made after the end of the recording', request, None)
+        elif request != expected:
+            if self.strict:
+                self._diverge('Request %d does not match the recording' % (self.rpcs + 1), request, expected)
+            elif skipped is None:
+                self._diverge('Request %d does not match the recording, nor do the next %d records'
+                              % (self.rpcs + 1, self.lookahead), request, expected)
+            else:
+                self._diverge('Request %d does not match the recording, skipped %d recorded requests'
+                              % (self.rpcs - skipped, skipped), request, expected)
+                self._deliver(updates)
+        if response is not None and b'StartStream' in request:
+            # The client blocks until the first value of a stream it starts,
+            # so deliver the updates that followed from another thread
+            thread = threading.Thread(target=self._deliver_pending)
+            thread.daemon = True
+            thread.start()
+        return response
+
+    def _expected(self):
+        """ The request of the next record, an RPC """
+        payload = self._next[2]
+        request_size, _ = _RPC.unpack(payload[:_RPC.size])
+        return payload[_RPC.size:_RPC.size+request_size]
+
+    def _diverge(self, message, request, expected):
+        from krpc.schema import KRPC_pb2 as KRPC
+        message = '%s: made %s, recorded %s' % (
+            message, _describe(KRPC, request), _describe(KRPC, expected))
+        self.divergences.append(message)
+        if self.strict:
+            raise ReplayDivergence(message)
+        warnings.warn(message)
+
+def _describe(KRPC, data):
+    if data is None:
+        return 'nothing'
+    request = KRPC.Request()
+    request.ParseFromString(data)
+    return ', '.join('%s.%s' % (call.service, call.procedure) for call in request.calls)
+
+class _ReplayConnection(object):
+    def __init__(self, replay):
+        self._replay = replay
+        self._response = None
+
+    def send_message(self, message):
+        self._response = self._replay._request(message.SerializeToString())
+
+    def receive_message(self, typ):
+        message = typ()
+        if self._response is None:
+            message.error.description = 'No response in the recording'
+        else:
+            message.ParseFromString(self._response)
+        return message
+
+    def close(self):
+        pass
+
+class _ClosedConnection(object):
+    """ Stream connection for a replayed client. Updates are delivered by the
+        replay instead, so the client's stream thread exits immediately. """
+
+    def partial_receive(self, length, timeout=0.01):
+        raise EOFError()
+
+    def close(self):
+        pass
@@ -0,0 +1,86 @@
+import asyncio
+
+class Wakeup(object):
+    """
+    Wakes a coroutine when any of a set of streams receives an update.
+
+    Stream callbacks run on the kRPC stream thread, so the event is set
+    through the event loop. Updates that arrive before the coroutine has
+    woken up are coalesced into a single wakeup.
+    """
+
+    def __init__(self, streams, loop=None):
+        if loop is None:
+            loop = asyncio.get_running_loop()
+        self.loop = loop
+        self.event = asyncio.Event()
+        self.streams = ()
+        self._pending = False
+        self.watch(streams)
+
+    def watch(self, streams):
+        """ Change the set of streams that wake the coroutine. """
+        streams = tuple(streams)
+        if streams == self.streams:
+            return
+        for stream in self.streams:
+            if stream not in streams:
+                stream.remove_callback(self._callback)
+        for stream in streams:
+            if stream not in self.streams:
+                stream.add_callback(self._callback)
+                stream.start(False)
+        self.streams = streams
+
+    def close(self):
+        self.watch(())
+
+    async def wait(self):
+        await self.event.wait()
+        self.event.clear()
+
+    def _callback(self, value):
+        if not self._pending:
+            self._pending = True
+            self.loop.call_soon_threadsafe(self._set)
+
+    def _set(self):
+        self._pending = False
+        self.event.set()
+
+async def run(controller, streams=None, max_rate=None):
+    """
+    Call controller whenever one of its streams updates, until it returns
+    True. The streams default to controller.streams, which is re-read after
+    each call so that controllers such as AutoStage can change what they
+    watch. If max_rate is given, calls are limited to that many per second.
+    """
+    dynamic = streams is None
+    if dynamic:
+        streams = controller.streams
+    wakeup = Wakeup(streams)
+    try:
+        while True:
+            await wakeup.wait()
+            if controller():
+                return True
+            if dynamic:
+                wakeup.watch(controller.streams)
+            if max_rate is not None:
+                await asyncio.sleep(1. / max_rate)
+    finally:
+        wakeup.close()
+
+async def run_until(controller, *others):
+    """
+    Run controller and others concurrently on the current event loop, and
+    return once controller has finished. The other controllers are then
+    cancelled.
+    """
+    tasks = [asyncio.ensure_future(run(x)) for x in others]
+    try:
+        return await run(controller)
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
@@ -0,0 +1,146 @@
+import heapq
+import time
+from krpctoolkit import strict
+
+class TaskStats(object):
+    """ Timing statistics for a scheduled task. Times are in seconds. """
+
+    def __init__(self):
+        self.ticks = 0
+        self.overruns = 0
+        self.misses = 0
+        self.total_jitter = 0
+        self.max_jitter = 0
+        self.total_duration = 0
+        self.max_duration = 0
+
+    @property
+    def mean_jitter(self):
+        if self.ticks == 0:
+            return 0
+        return self.total_jitter / self.ticks
+
+    @property
+    def mean_duration(self):
+        if self.ticks == 0:
+            return 0
+        return self.total_duration / self.ticks
+
+class Task(object):
+    def __init__(self, fn, rate, name, deadline):
+        self.fn = fn
+        self.rate = rate
+        self.period = 1. / rate
+        self.name = name
+        self.deadline = deadline
+        self.done = False
+        self.stats = TaskStats()
+
+    def __lt__(self, other):
+        return self.deadline < other.deadline
+
+class Scheduler(object):
+    """
+    Runs several controllers on one thread, each at its own rate.
+
+    Tasks are callables that are invoked once per period. A task that returns
+    True has finished and is removed from the schedule, matching the
+    convention used by Ascend and ExecuteNode. Deadlines are taken from a
+    monotonic clock and advance by a whole period each tick, so the rate does
+    not drift with the time spent inside the tasks.
+
+    A task with a close() method has it called once the task has finished
+    or been removed, so controllers can release their streams.
+
+    If strict is 'warn' or 'raise', blocking RPCs made by a task are
+    reported (see krpctoolkit.strict).
+    """
+
+    def __init__(self, clock=None, sleep=None, strict=None):
+        self.clock = clock or time.monotonic
+        self.sleep = sleep or time.sleep
+        self.strict = strict
+        self.tasks = []
+        self._queue = []
+
+    def add(self, fn, rate, name=None):
+        """ Schedule fn to be called rate times per second. Returns the task. """
+        if name is None:
+            name = getattr(fn, '__name__', type(fn).__name__)
+        task = Task(fn, rate, name, self.clock())
+        self.tasks.append(task)
+        heapq.heappush(self._queue, task)
+        return task
+
+    def remove(self, task):
+        self._finish(task)
+
+    def _finish(self, task):
+        if task.done:
+            return
+        task.done = True
+        close = getattr(task.fn, 'close', None)
+        if close is not None:
+            close()
+
+    def run(self, until=None):
+        """
+        Run the scheduled tasks. If until is given, return once that task has
+        finished, otherwise return when no tasks are left.
+        """
+        # Tasks left over from a previous run start afresh
+        now = self.clock()
+        for task in self._queue:
+            task.deadline = max(task.deadline, now)
+        heapq.heapify(self._queue)
+        while self._queue:
+            if until is not None and until.done:
+                return
+            task = heapq.heappop(self._queue)
+            if task.done:
+                continue
+            delay = task.deadline - self.clock()
+            if delay > 0:
+                self.sleep(delay)
+            self._tick(task)
+            if not task.done:
+                heapq.heappush(self._queue, task)
+
+    def _tick(self, task):
+        stats = task.stats
+        start = self.clock()
+        jitter = max(0, start - task.deadline)
+        with strict.tick(task.name, self.strict):
+            finished = task.fn()
+        if finished:
+            self._finish(task)
+        end = self.clock()
+
+        duration = end - start
+        stats.ticks += 1
+        stats.total_jitter += jitter
+        stats.max_jitter = max(stats.max_jitter, jitter)
+        stats.total_duration += duration
+        stats.max_duration = max(stats.max_duration, duration)
+        if duration > task.period:
+            stats.overruns += 1
+
+        # Skip deadlines that have already passed rather than
+        # running the task back to back to catch up
+        task.deadline += task.period
+        if task.deadline < end:
+            missed = int((end - task.deadline) / task.period) + 1
+            stats.misses += missed
+            task.deadline += missed * task.period
+
+    def report(self):
+        lines = []
+        for task in self.tasks:
+            stats = task.stats
+            lines.append(
+                '{:20} {:6.1f} Hz  ticks {:6d}  jitter {:7.2f}/{:7.2f} ms  '
+                'overruns {:4d}  misses {:4d}'.format(
+                    task.name[:20], task.rate, stats.ticks,
+                    stats.mean_jitter*1000, stats.max_jitter*1000,
+                    stats.overruns, stats.misses))
+        return '\n'.join(lines)
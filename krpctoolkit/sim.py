@@ -0,0 +1,937 @@
+"""
+Local stand-in for a kRPC server, for running the toolkit without KSP.
+
+Simulation simulates a single vessel around a non-rotating body with
+two-body gravity, an exponential atmosphere with drag, and staged engines
+that burn fuel from the tanks decoupled with them. The auto pilot turns the
+vessel instantly. SimConnection implements the part of the kRPC client and
+SpaceCenter API that the toolkit uses, including streams.
+
+Simulated time advances only when the client waits: through sleep(),
+stream.wait(), or space_center.warp_to(). Controllers driven by a Scheduler
+built with clock=sim.clock and sleep=sim.sleep therefore run as fast as the
+CPU allows. Every non-stream call on a simulated object is counted in
+Simulation.rpcs.
+
+A mission script can be run against the simulation with:
+
+    python -m krpctoolkit.sim kerbal-x.py
+"""
+
+import functools
+import math
+import threading
+
+G0 = 9.82
+
+def rpc(fn):
+    """ Count calls to fn as RPCs. Streams call the uncounted fn.raw. """
+    @functools.wraps(fn)
+    def wrapper(self, *args, **kwargs):
+        self._sim.rpcs += 1
+        return fn(self, *args, **kwargs)
+    wrapper.raw = fn
+    return wrapper
+
+def rpc_property(fget, fset=None):
+    if fset is not None:
+        fset = rpc(fset)
+    return property(rpc(fget), fset)
+
+def _add(a, b):
+    return (a[0]+b[0], a[1]+b[1], a[2]+b[2])
+
+def _sub(a, b):
+    return (a[0]-b[0], a[1]-b[1], a[2]-b[2])
+
+def _scale(a, k):
+    return (a[0]*k, a[1]*k, a[2]*k)
+
+def _dot(a, b):
+    return a[0]*b[0] + a[1]*b[1] + a[2]*b[2]
+
+def _cross(a, b):
+    return (a[1]*b[2] - a[2]*b[1], a[2]*b[0] - a[0]*b[2], a[0]*b[1] - a[1]*b[0])
+
+def _norm(a):
+    return math.sqrt(_dot(a, a))
+
+def _unit(a):
+    n = _norm(a)
+    if n == 0:
+        return (0., 0., 0.)
+    return _scale(a, 1./n)
+
+def _perpendicular(a):
+    """ A unit vector perpendicular to a """
+    if abs(a[2]) < 0.9:
+        return _unit(_cross(a, (0., 0., 1.)))
+    return _unit(_cross(a, (1., 0., 0.)))
+
+class BodySpec(object):
+    def __init__(self, name='Kerbin', gravitational_parameter=3.5316e12,
+                 equatorial_radius=600000., atmosphere_depth=70000.,
+                 scale_height=5600., surface_density=1.225, surface_pressure=101325.):
+        self.name = name
+        self.gravitational_parameter = gravitational_parameter
+        self.equatorial_radius = equatorial_radius
+        self.atmosphere_depth = atmosphere_depth
+        self.scale_height = scale_height
+        self.surface_density = surface_density
+        self.surface_pressure = surface_pressure
+
+    def pressure_ratio(self, altitude):
+        if altitude >= self.atmosphere_depth:
+            return 0.
+        return math.exp(-max(0., altitude) / self.scale_height)
+
+class EngineSpec(object):
+    def __init__(self, thrust, isp_vac, isp_asl):
+        self.thrust = thrust
+        self.isp_vac = isp_vac
+        self.isp_asl = isp_asl
+
+class PartSpec(object):
+    """ Masses in kg, thrust in N. Engines burn fuel from the parts that
+        share their decouple stage. modules are (name, events) pairs. """
+
+    def __init__(self, title, stage, decouple_stage, dry_mass, fuel_mass=0., engine=None, modules=()):
+        self.title = title
+        self.stage = stage
+        self.decouple_stage = decouple_stage
+        self.dry_mass = dry_mass
+        self.fuel_mass = fuel_mass
+        self.engine = engine
+        self.modules = list(modules)
+
+def kerbal_x():
+    """ A two stage rocket, with roughly the performance of the stock Kerbal X """
+    return [
+        PartSpec('Command Pod', -1, -1, 2000.),
+        PartSpec('Upper Tank', -1, 0, 1000., 8000.),
+        PartSpec('Upper Engine', 1, 0, 1250., engine=EngineSpec(215e3, 320., 170.)),
+        PartSpec('Lower Tank', -1, 1, 4000., 52000.),
+        PartSpec('Lower Engine', 2, 1, 3000., engine=EngineSpec(2000e3, 310., 285.)),
+    ]
+
+class Simulation(object):
+
+    def __init__(self, parts=None, body=None, drag_area=1.5, step=0.02, coast_step=1.):
+        if parts is None:
+            parts = kerbal_x()
+        if body is None:
+            body = BodySpec()
+        self.body_spec = body
+        self.drag_area = drag_area
+        self.step_size = step
+        self.coast_step = coast_step
+        self.ut = 0.
+        self.rpcs = 0
+        self.stream_updates = 0
+        self.streams = []
+
+        self.position = (body.equatorial_radius, 0., 0.)
+        self.velocity = (0., 0., 0.)
+        self.attitude = _unit(self.position)
+        self.throttle = 0.
+        self.parts = [Part(self, spec) for spec in parts]
+        self.current_stage = max([p.spec.stage for p in self.parts] +
+                                 [p.spec.decouple_stage for p in self.parts]) + 1
+        self.nodes = []
+
+        self.body = CelestialBody(self)
+        self.space_center = SpaceCenter(self)
+        self.vessel = Vessel(self)
+
+    # Time
+
+    def clock(self):
+        return self.ut
+
+    def sleep(self, seconds):
+        self.advance(self.ut + seconds)
+
+    def advance(self, ut, thrust=True):
+        """ Advance the simulation to ut """
+        while self.ut < ut:
+            if thrust and (self.altitude < self.body_spec.atmosphere_depth or self.throttle > 0):
+                h = self.step_size
+            else:
+                h = self.coast_step
+            self._step(min(h, ut - self.ut), thrust)
+            # Like the server, push stream updates every physics frame
+            self._update_streams()
+
+    def connect(self, name=None, **kwargs):
+        return SimConnection(self)
+
+    # State
+
+    @property
+    def radius(self):
+        return _norm(self.position)
+
+    @property
+    def altitude(self):
+        return self.radius - self.body_spec.equatorial_radius
+
+    @property
+    def mass(self):
+        return sum(p.mass for p in self.parts)
+
+    @property
+    def dynamic_pressure(self):
+        density = self.body_spec.surface_density * self.body_spec.pressure_ratio(self.altitude)
+        return 0.5 * density * _dot(self.velocity, self.velocity)
+
+    def active_engines(self):
+        return [p for p in self.parts if p.spec.engine is not None and p.active]
+
+    def fuel(self, decouple_stage):
+        return sum(p.fuel for p in self.parts if p.spec.decouple_stage == decouple_stage)
+
+    def engine_state(self):
+        """ Returns (thrust, mass flow) at full throttle for the engines that have fuel """
+        ratio = self.body_spec.pressure_ratio(self.altitude)
+        thrust = 0.
+        flow = 0.
+        for part in self.active_engines():
+            if self.fuel(part.spec.decouple_stage) <= 0:
+                continue
+            engine = part.spec.engine
+            isp = engine.isp_vac + (engine.isp_asl - engine.isp_vac) * ratio
+            engine_flow = engine.thrust / (engine.isp_vac * G0)
+            thrust += engine_flow * isp * G0
+            flow += engine_flow
+        return thrust, flow
+
+    # Staging
+
+    def activate_next_stage(self):
+        if self.current_stage <= 0:
+            return []
+        self.current_stage -= 1
+        self.parts = [p for p in self.parts if p.spec.decouple_stage < self.current_stage]
+        for part in self.parts:
+            if part.spec.stage == self.current_stage:
+                part.active = True
+        return []
+
+    # Physics
+
+    def _gravity(self, position):
+        r = _norm(position)
+        return _scale(position, -self.body_spec.gravitational_parameter / (r*r*r))
+
+    def _step(self, h, thrust):
+        accel = (0., 0., 0.)
+        thrust_accel = (0., 0., 0.)
+        mass = self.mass
+        if thrust and self.throttle > 0:
+            force, flow = self.engine_state()
+            if force > 0:
+                thrust_accel = _scale(self.attitude, force * self.throttle / mass)
+                self._burn(flow * self.throttle * h)
+        speed = _norm(self.velocity)
+        if speed > 0:
+            drag = self.dynamic_pressure * self.drag_area / mass
+            accel = _scale(self.velocity, -drag / speed)
+        accel = _add(accel, thrust_accel)
+
+        # RK4, holding thrust and drag constant over the step
+        p, v = self.position, self.velocity
+        a1 = _add(self._gravity(p), accel)
+        p2 = _add(p, _scale(v, h/2))
+        v2 = _add(v, _scale(a1, h/2))
+        a2 = _add(self._gravity(p2), accel)
+        p3 = _add(p, _scale(v2, h/2))
+        v3 = _add(v, _scale(a2, h/2))
+        a3 = _add(self._gravity(p3), accel)
+        p4 = _add(p, _scale(v3, h))
+        v4 = _add(v, _scale(a3, h))
+        a4 = _add(self._gravity(p4), accel)
+        self.position = _add(p, _scale(_add(_add(v, v4), _scale(_add(v2, v3), 2)), h/6))
+        self.velocity = _add(v, _scale(_add(_add(a1, a4), _scale(_add(a2, a3), 2)), h/6))
+        self.ut += h
+
+        # Sit on the surface until thrust exceeds weight
+        if self.radius < self.body_spec.equatorial_radius:
+            self.position = _scale(_unit(self.position), self.body_spec.equatorial_radius)
+            self.velocity = (0., 0., 0.)
+
+        for node in self.nodes:
+            node.burned = _add(node.burned, _scale(thrust_accel, h))
+
+        auto_pilot = self.vessel._auto_pilot
+        if auto_pilot.engaged:
+            self.attitude = auto_pilot.target()
+
+    def _burn(self, mass):
+        groups = {}
+        for part in self.active_engines():
+            stage = part.spec.decouple_stage
+            if self.fuel(stage) > 0:
+                engine = part.spec.engine
+                groups[stage] = groups.get(stage, 0) + engine.thrust / (engine.isp_vac * G0)
+        total = sum(groups.values())
+        for stage, flow in groups.items():
+            remaining = mass * flow / total
+            available = self.fuel(stage)
+            for part in self.parts:
+                if part.spec.decouple_stage == stage and part.fuel > 0:
+                    part.fuel = max(0., part.fuel - remaining * part.fuel / available)
+
+    def _update_streams(self):
+        for stream in list(self.streams):
+            stream._update()
+
+    # Orbit elements
+
+    def elements(self, position=None, velocity=None):
+        """ Returns (a, e, i, lan, argument of periapsis, true anomaly) """
+        if position is None:
+            position, velocity = self.position, self.velocity
+        mu = self.body_spec.gravitational_parameter
+        r = _norm(position)
+        v2 = _dot(velocity, velocity)
+        h = _cross(position, velocity)
+        a = 1. / (2./r - v2/mu)
+        ev = _scale(_sub(_scale(position, v2 - mu/r), _scale(velocity, _dot(position, velocity))), 1./mu)
+        e = _norm(ev)
+        hn = _norm(h)
+        if hn == 0:
+            return a, e, 0., 0., 0., 0.
+        i = math.acos(max(-1., min(1., h[2] / hn)))
+        node = _cross((0., 0., 1.), h)
+        if _norm(node) < 1e-9:
+            lan = 0.
+            node = (1., 0., 0.)
+        else:
+            lan = math.atan2(node[1], node[0]) % (2*math.pi)
+            node = _unit(node)
+        if e < 1e-12:
+            ev = node
+        argument = math.atan2(_dot(_cross(node, ev), _unit(h)), _dot(node, ev)) % (2*math.pi)
+        theta = math.atan2(_dot(_cross(ev, position), _unit(h)), _dot(ev, position))
+        return a, e, i, lan, argument, theta % (2*math.pi)
+
+    def state_at(self, ut):
+        """ Position and velocity at ut, propagated on the current orbit """
+        mu = self.body_spec.gravitational_parameter
+        a, e, _, _, _, theta = self.elements()
+        if e >= 1 or a <= 0:
+            return self.position, self.velocity
+        n = math.sqrt(mu / a**3)
+        M = _mean_anomaly(e, theta) + n * (ut - self.ut)
+        E = M
+        for _ in range(30):
+            E -= (E - e*math.sin(E) - M) / (1 - e*math.cos(E))
+        # Perifocal frame from the current state
+        h = _unit(_cross(self.position, self.velocity))
+        r = self.radius
+        p_hat = _add(_scale(_unit(self.position), math.cos(theta)),
+                     _scale(_cross(h, _unit(self.position)), -math.sin(theta)))
+        q_hat = _cross(h, p_hat)
+        x = a * (math.cos(E) - e)
+        y = a * math.sqrt(1 - e*e) * math.sin(E)
+        rr = a * (1 - e*math.cos(E))
+        vx = -math.sqrt(mu*a) / rr * math.sin(E)
+        vy = math.sqrt(mu*a*(1 - e*e)) / rr * math.cos(E)
+        position = _add(_scale(p_hat, x), _scale(q_hat, y))
+        velocity = _add(_scale(p_hat, vx), _scale(q_hat, vy))
+        return position, velocity
+
+def _mean_anomaly(e, theta):
+    E = 2 * math.atan2(math.sqrt(1 - e) * math.sin(theta/2), math.sqrt(1 + e) * math.cos(theta/2))
+    return (E - e*math.sin(E)) % (2*math.pi)
+
+class SimObject(object):
+    def __init__(self, sim):
+        self._sim = sim
+
+class ReferenceFrame(SimObject):
+    """ A frame given by a function returning its axes in inertial coordinates """
+
+    def __init__(self, sim, axes):
+        super(ReferenceFrame, self).__init__(sim)
+        self.axes = axes
+
+    def to_frame(self, direction):
+        x, y, z = self.axes()
+        return (_dot(direction, x), _dot(direction, y), _dot(direction, z))
+
+    def from_frame(self, direction):
+        x, y, z = self.axes()
+        return _add(_add(_scale(x, direction[0]), _scale(y, direction[1])), _scale(z, direction[2]))
+
+class SimConnection(object):
+
+    def __init__(self, sim):
+        self._sim = sim
+        self.space_center = sim.space_center
+        self.krpc = KRPC(sim)
+
+    def _raw(self, func, *args):
+        """ The uncounted function for a call, given as for add_stream """
+        if func is getattr:
+            obj, name = args
+            fget = getattr(type(obj), name).fget.raw
+            return lambda: fget(obj)
+        raw = func.__func__.raw
+        obj = func.__self__
+        return lambda: raw(obj, *args)
+
+    def add_stream(self, func, *args):
+        self._sim.rpcs += 1
+        stream = SimStream(self._sim, self._raw(func, *args))
+        self._sim.streams.append(stream)
+        return stream
+
+    def _batch(self, calls):
+        """ Make several calls as one RPC (see krpctoolkit.batch) """
+        self._sim.rpcs += 1
+        return [self._raw(*call)() for call in calls]
+
+    def close(self):
+        pass
+
+class KRPC(SimObject):
+    """ The KRPC service. Expressions and events are not supported. """
+
+    def get_status(self):
+        return None
+
+class SimStream(object):
+    """ Stream of a simulated value. Values are computed when read, so are
+        always current. Waiting on a stream advances the simulation by one
+        update interval. Updates are pushed every physics step, or at most
+        rate times per second if rate is set, and counted in
+        Simulation.stream_updates. """
+
+    update_interval = 0.05
+
+    def __init__(self, sim, fn):
+        self._sim = sim
+        self._fn = fn
+        self._callbacks = []
+        self.condition = threading.Condition()
+        self.rate = 0
+        self.started = False
+        self._last_update = None
+
+    def __call__(self):
+        return self._fn()
+
+    def start(self, wait=True):
+        self.started = True
+
+    def wait(self, timeout=None):
+        self._sim.advance(self._sim.ut + self.update_interval)
+
+    def add_callback(self, callback):
+        self._callbacks.append(callback)
+
+    def remove_callback(self, callback):
+        self._callbacks = [x for x in self._callbacks if x != callback]
+
+    def remove(self):
+        if self in self._sim.streams:
+            self._sim.streams.remove(self)
+
+    def _update(self):
+        ut = self._sim.ut
+        if self.rate > 0 and self._last_update is not None and ut - self._last_update < 1. / self.rate - 1e-9:
+            return
+        self._last_update = ut
+        self._sim.stream_updates += 1
+        if not self._callbacks:
+            return
+        value = self._fn()
+        with self.condition:
+            self.condition.notify_all()
+        for callback in self._callbacks:
+            callback(value)
+
+class SpaceCenter(SimObject):
+
+    ut = rpc_property(lambda self: self._sim.ut)
+    active_vessel = rpc_property(lambda self: self._sim.vessel)
+    target_docking_port = rpc_property(lambda self: None)
+
+    @rpc
+    def warp_to(self, ut, max_rails_rate=100000., max_physics_rate=2.):
+        self._sim.advance(ut, thrust=False)
+
+    @rpc
+    def transform_direction(self, direction, from_frame, to_frame):
+        return to_frame.to_frame(from_frame.from_frame(direction))
+
+class CelestialBody(SimObject):
+
+    def __init__(self, sim):
+        super(CelestialBody, self).__init__(sim)
+        self._reference_frame = ReferenceFrame(
+            sim, lambda: ((1., 0., 0.), (0., 1., 0.), (0., 0., 1.)))
+
+    name = rpc_property(lambda self: self._sim.body_spec.name)
+    gravitational_parameter = rpc_property(lambda self: self._sim.body_spec.gravitational_parameter)
+    equatorial_radius = rpc_property(lambda self: self._sim.body_spec.equatorial_radius)
+    atmosphere_depth = rpc_property(lambda self: self._sim.body_spec.atmosphere_depth)
+    has_atmosphere = rpc_property(lambda self: self._sim.body_spec.atmosphere_depth > 0)
+    surface_gravity = rpc_property(
+        lambda self: self._sim.body_spec.gravitational_parameter / self._sim.body_spec.equatorial_radius**2)
+    reference_frame = rpc_property(lambda self: self._reference_frame)
+    non_rotating_reference_frame = rpc_property(lambda self: self._reference_frame)
+
+class Vessel(SimObject):
+
+    def __init__(self, sim):
+        super(Vessel, self).__init__(sim)
+        self._control = Control(sim)
+        self._auto_pilot = AutoPilot(sim)
+        self._orbit = Orbit(sim)
+        self._parts = Parts(sim)
+        self._flights = {}
+        self._reference_frame = ReferenceFrame(sim, self._vessel_axes)
+        self._surface_reference_frame = ReferenceFrame(sim, self._surface_axes)
+        self._orbital_reference_frame = ReferenceFrame(sim, self._orbital_axes)
+
+    name = rpc_property(lambda self: 'Simulated Vessel')
+    control = rpc_property(lambda self: self._control)
+    auto_pilot = rpc_property(lambda self: self._auto_pilot)
+    orbit = rpc_property(lambda self: self._orbit)
+    parts = rpc_property(lambda self: self._parts)
+    mass = rpc_property(lambda self: self._sim.mass)
+    dry_mass = rpc_property(lambda self: sum(p.spec.dry_mass for p in self._sim.parts))
+    thrust = rpc_property(lambda self: self._sim.engine_state()[0] * self._sim.throttle)
+    available_thrust = rpc_property(lambda self: self._sim.engine_state()[0])
+    max_thrust = rpc_property(lambda self: self._sim.engine_state()[0])
+    reference_frame = rpc_property(lambda self: self._reference_frame)
+    surface_reference_frame = rpc_property(lambda self: self._surface_reference_frame)
+    orbital_reference_frame = rpc_property(lambda self: self._orbital_reference_frame)
+
+    def _specific_impulse(self):
+        thrust, flow = self._sim.engine_state()
+        if flow == 0:
+            return 0.
+        return thrust / (flow * G0)
+    specific_impulse = rpc_property(_specific_impulse)
+
+    @rpc
+    def flight(self, reference_frame=None):
+        if reference_frame is None:
+            reference_frame = self._surface_reference_frame
+        if reference_frame not in self._flights:
+            self._flights[reference_frame] = Flight(self._sim, reference_frame)
+        return self._flights[reference_frame]
+
+    @rpc
+    def direction(self, reference_frame):
+        return reference_frame.to_frame(self._sim.attitude)
+
+    @rpc
+    def angular_velocity(self, reference_frame):
+        return (0., 0., 0.)
+
+    @rpc
+    def position(self, reference_frame):
+        return reference_frame.to_frame(self._sim.position)
+
+    @rpc
+    def velocity(self, reference_frame):
+        return reference_frame.to_frame(self._sim.velocity)
+
+    def _vessel_axes(self):
+        forward = self._sim.attitude
+        right = _perpendicular(forward)
+        return right, forward, _cross(right, forward)
+
+    def _surface_axes(self):
+        up = _unit(self._sim.position)
+        north = _unit(_sub((0., 0., 1.), _scale(up, up[2])))
+        east = _cross(north, up)
+        return up, north, east
+
+    def _orbital_axes(self):
+        prograde = _unit(self._sim.velocity)
+        if prograde == (0., 0., 0.):
+            prograde = self._surface_axes()[2]
+        normal = _unit(_cross(self._sim.position, prograde))
+        return _cross(prograde, normal), prograde, normal
+
+class Flight(SimObject):
+
+    def __init__(self, sim, reference_frame):
+        super(Flight, self).__init__(sim)
+        self._reference_frame = reference_frame
+
+    mean_altitude = rpc_property(lambda self: self._sim.altitude)
+    surface_altitude = rpc_property(lambda self: self._sim.altitude)
+    dynamic_pressure = rpc_property(lambda self: self._sim.dynamic_pressure)
+    static_pressure = rpc_property(
+        lambda self: self._sim.body_spec.surface_pressure * self._sim.body_spec.pressure_ratio(self._sim.altitude))
+    speed = rpc_property(lambda self: _norm(self._sim.velocity))
+    velocity = rpc_property(lambda self: self._reference_frame.to_frame(self._sim.velocity))
+    prograde = rpc_property(lambda self: self._reference_frame.to_frame(_unit(self._sim.velocity)))
+    retrograde = rpc_property(lambda self: self._reference_frame.to_frame(_scale(_unit(self._sim.velocity), -1)))
+    direction = rpc_property(lambda self: self._reference_frame.to_frame(self._sim.attitude))
+    vertical_speed = rpc_property(lambda self: _dot(self._sim.velocity, _unit(self._sim.position)))
+    roll = rpc_property(lambda self: 0.)
+
+    def _pitch(self):
+        up = _unit(self._sim.position)
+        return math.degrees(math.asin(max(-1., min(1., _dot(self._sim.attitude, up)))))
+    pitch = rpc_property(_pitch)
+
+    def _g_force(self):
+        thrust, _ = self._sim.engine_state()
+        return thrust * self._sim.throttle / self._sim.mass / G0
+    g_force = rpc_property(_g_force)
+
+class Orbit(SimObject):
+
+    def _elements(self):
+        return self._sim.elements()
+
+    def _apoapsis(self):
+        a, e = self._elements()[:2]
+        if a <= 0:
+            return float('inf')
+        return a * (1 + min(e, 1.))
+
+    def _periapsis(self):
+        a, e = self._elements()[:2]
+        return a * (1 - e)
+
+    def _mean_anomaly(self):
+        _, e, _, _, _, theta = self._elements()
+        return _mean_anomaly(min(e, 1 - 1e-12), theta)
+
+    def _period(self):
+        a = self._elements()[0]
+        if a <= 0:
+            return float('inf')
+        return 2 * math.pi * math.sqrt(a**3 / self._sim.body_spec.gravitational_parameter)
+
+    def _time_to(self, M):
+        period = self._period()
+        return ((M - self._mean_anomaly()) % (2*math.pi)) / (2*math.pi) * period
+
+    def _eccentric_anomaly(self):
+        _, e, _, _, _, theta = self._elements()
+        e = min(e, 1 - 1e-12)
+        return 2 * math.atan2(math.sqrt(1 - e) * math.sin(theta/2), math.sqrt(1 + e) * math.cos(theta/2))
+
+    body = rpc_property(lambda self: self._sim.body)
+    apoapsis = rpc_property(_apoapsis)
+    periapsis = rpc_property(_periapsis)
+    apoapsis_altitude = rpc_property(lambda self: self._apoapsis() - self._sim.body_spec.equatorial_radius)
+    periapsis_altitude = rpc_property(lambda self: self._periapsis() - self._sim.body_spec.equatorial_radius)
+    semi_major_axis = rpc_property(lambda self: self._elements()[0])
+    semi_minor_axis = rpc_property(
+        lambda self: self._elements()[0] * math.sqrt(max(0., 1 - self._elements()[1]**2)))
+    eccentricity = rpc_property(lambda self: self._elements()[1])
+    inclination = rpc_property(lambda self: self._elements()[2])
+    longitude_of_ascending_node = rpc_property(lambda self: self._elements()[3])
+    argument_of_periapsis = rpc_property(lambda self: self._elements()[4])
+    true_anomaly = rpc_property(lambda self: self._elements()[5])
+    mean_anomaly = rpc_property(_mean_anomaly)
+    eccentric_anomaly = rpc_property(_eccentric_anomaly)
+    period = rpc_property(_period)
+    time_to_apoapsis = rpc_property(lambda self: self._time_to(math.pi))
+    time_to_periapsis = rpc_property(lambda self: self._time_to(0.))
+    radius = rpc_property(lambda self: self._sim.radius)
+    speed = rpc_property(lambda self: _norm(self._sim.velocity))
+
+class Control(SimObject):
+
+    def _set_throttle(self, value):
+        self._sim.throttle = max(0., min(1., value))
+
+    throttle = rpc_property(lambda self: self._sim.throttle, _set_throttle)
+    current_stage = rpc_property(lambda self: self._sim.current_stage)
+    nodes = rpc_property(lambda self: list(self._sim.nodes))
+
+    def __init__(self, sim):
+        super(Control, self).__init__(sim)
+        self._sas = False
+        self._rcs = False
+        self._pitch = 0.
+        self._yaw = 0.
+        self._roll = 0.
+
+    sas = rpc_property(lambda self: self._sas, lambda self, x: setattr(self, '_sas', x))
+    rcs = rpc_property(lambda self: self._rcs, lambda self, x: setattr(self, '_rcs', x))
+    pitch = rpc_property(lambda self: self._pitch, lambda self, x: setattr(self, '_pitch', x))
+    yaw = rpc_property(lambda self: self._yaw, lambda self, x: setattr(self, '_yaw', x))
+    roll = rpc_property(lambda self: self._roll, lambda self, x: setattr(self, '_roll', x))
+
+    @rpc
+    def activate_next_stage(self):
+        return self._sim.activate_next_stage()
+
+    @rpc
+    def add_node(self, ut, prograde=0., normal=0., radial=0.):
+        node = Node(self._sim, ut, prograde, normal, radial)
+        self._sim.nodes.append(node)
+        return node
+
+    @rpc
+    def remove_nodes(self):
+        self._sim.nodes = []
+
+class AutoPilot(SimObject):
+    """ Points the vessel instantly at its target """
+
+    def __init__(self, sim):
+        super(AutoPilot, self).__init__(sim)
+        self.engaged = False
+        self._reference_frame = None
+        self._target_direction = None
+        self._target_pitch_and_heading = (90., 90.)
+        self._target_roll = float('nan')
+        self._max_rotation_speed = 1.
+
+    def target(self):
+        if self._target_direction is not None:
+            return _unit(self._reference_frame.from_frame(self._target_direction))
+        pitch, heading = (math.radians(x) for x in self._target_pitch_and_heading)
+        surface = self._sim.vessel._surface_reference_frame
+        return surface.from_frame((math.sin(pitch), math.cos(pitch)*math.cos(heading),
+                                   math.cos(pitch)*math.sin(heading)))
+
+    def _set_reference_frame(self, value):
+        self._reference_frame = value
+
+    def _set_target_direction(self, value):
+        self._target_direction = tuple(value)
+        self._update()
+
+    reference_frame = rpc_property(lambda self: self._reference_frame, _set_reference_frame)
+    target_direction = rpc_property(
+        lambda self: self._reference_frame.to_frame(self.target()), _set_target_direction)
+    target_roll = rpc_property(lambda self: self._target_roll, lambda self, x: setattr(self, '_target_roll', x))
+    max_rotation_speed = rpc_property(
+        lambda self: self._max_rotation_speed, lambda self, x: setattr(self, '_max_rotation_speed', x))
+
+    @rpc
+    def target_pitch_and_heading(self, pitch, heading):
+        self._target_direction = None
+        self._target_pitch_and_heading = (pitch, heading)
+        self._update()
+
+    @rpc
+    def engage(self):
+        self.engaged = True
+        self._update()
+
+    @rpc
+    def disengage(self):
+        self.engaged = False
+
+    @rpc
+    def wait(self):
+        pass
+
+    def _update(self):
+        if self.engaged:
+            self._sim.attitude = self.target()
+
+class Parts(SimObject):
+
+    all = rpc_property(lambda self: list(self._sim.parts))
+
+    @rpc
+    def in_stage(self, stage):
+        return [p for p in self._sim.parts if p.spec.stage == stage]
+
+    @rpc
+    def in_decouple_stage(self, stage):
+        return [p for p in self._sim.parts if p.spec.decouple_stage == stage]
+
+    @rpc
+    def with_module(self, name):
+        return [p for p in self._sim.parts if any(m._name == name for m in p._modules)]
+
+class Part(SimObject):
+
+    def __init__(self, sim, spec):
+        super(Part, self).__init__(sim)
+        self.spec = spec
+        self.fuel = spec.fuel_mass
+        self.active = False
+        self._engine = None
+        if spec.engine is not None:
+            self._engine = Engine(sim, self)
+        self._modules = [Module(sim, self, name, events) for name, events in spec.modules]
+
+    @property
+    def mass(self):
+        return self.spec.dry_mass + self.fuel
+
+    title = rpc_property(lambda self: self.spec.title)
+    stage = rpc_property(lambda self: self.spec.stage)
+    decouple_stage = rpc_property(lambda self: self.spec.decouple_stage)
+    dry_mass = rpc_property(lambda self: self.spec.dry_mass)
+    engine = rpc_property(lambda self: self._engine)
+    modules = rpc_property(lambda self: list(self._modules))
+    resources = rpc_property(lambda self: Resources(self._sim, self))
+
+class Resources(SimObject):
+
+    # Propellant mass ratios, and the density of both propellants in kg/l
+    RATIOS = {'LiquidFuel': 9. / 20., 'Oxidizer': 11. / 20.}
+    DENSITY = 5.
+
+    def __init__(self, sim, part):
+        super(Resources, self).__init__(sim)
+        self._part = part
+
+    def _names(self):
+        if self._part.spec.fuel_mass == 0:
+            return []
+        return sorted(self.RATIOS)
+    names = rpc_property(_names)
+
+    @rpc
+    def amount(self, name):
+        if name not in self._names():
+            return 0.
+        return self._part.fuel * self.RATIOS[name] / self.DENSITY
+
+class Module(SimObject):
+    """ A part module. Triggering an event replaces it with its opposite, if it has one. """
+
+    OPPOSITES = {'Extend': 'Retract', 'Retract': 'Extend', 'Activate': 'Shutdown', 'Shutdown': 'Activate'}
+
+    def __init__(self, sim, part, name, events):
+        super(Module, self).__init__(sim)
+        self._part = part
+        self._name = name
+        self._events = list(events)
+
+    part = rpc_property(lambda self: self._part)
+    name = rpc_property(lambda self: self._name)
+    events = rpc_property(lambda self: list(self._events))
+
+    @rpc
+    def has_event(self, name):
+        return name in self._events
+
+    @rpc
+    def trigger_event(self, name):
+        if name in self._events and name in self.OPPOSITES:
+            self._events[self._events.index(name)] = self.OPPOSITES[name]
+
+class Engine(SimObject):
+
+    def __init__(self, sim, part):
+        super(Engine, self).__init__(sim)
+        self._part = part
+
+    part = rpc_property(lambda self: self._part)
+    active = rpc_property(lambda self: self._part.active)
+    has_fuel = rpc_property(lambda self: self._sim.fuel(self._part.spec.decouple_stage) > 0)
+    max_thrust = rpc_property(lambda self: self._part.spec.engine.thrust)
+
+class Node(SimObject):
+
+    def __init__(self, sim, ut, prograde, normal, radial):
+        super(Node, self).__init__(sim)
+        self._ut = ut
+        self._components = (prograde, normal, radial)
+        position, velocity = sim.state_at(ut)
+        p = _unit(velocity)
+        n = _unit(_cross(position, velocity))
+        r = _cross(p, n)
+        self.delta_v_vector = _add(_add(_scale(p, prograde), _scale(n, normal)), _scale(r, radial))
+        self.burned = (0., 0., 0.)
+        forward = _unit(self.delta_v_vector)
+        if forward == (0., 0., 0.):
+            forward = p
+        right = _perpendicular(forward)
+        axes = (right, forward, _cross(right, forward))
+        self._reference_frame = ReferenceFrame(sim, lambda: axes)
+
+    def _remaining(self):
+        return _sub(self.delta_v_vector, self.burned)
+
+    ut = rpc_property(lambda self: self._ut)
+    prograde = rpc_property(lambda self: self._components[0])
+    normal = rpc_property(lambda self: self._components[1])
+    radial = rpc_property(lambda self: self._components[2])
+    delta_v = rpc_property(lambda self: _norm(self.delta_v_vector))
+    remaining_delta_v = rpc_property(lambda self: _norm(self._remaining()))
+    time_to = rpc_property(lambda self: self._ut - self._sim.ut)
+    reference_frame = rpc_property(lambda self: self._reference_frame)
+
+    @rpc
+    def burn_vector(self, reference_frame=None):
+        return (reference_frame or self._reference_frame).to_frame(self.delta_v_vector)
+
+    @rpc
+    def remaining_burn_vector(self, reference_frame=None):
+        return (reference_frame or self._reference_frame).to_frame(self._remaining())
+
+    @rpc
+    def remove(self):
+        if self in self._sim.nodes:
+            self._sim.nodes.remove(self)
+
+def run(path, sim=None):
+    """ Run a mission script against a simulation. The script's krpc.connect()
+        returns a connection to the simulation, and time.sleep, time.time and
+        time.monotonic follow simulated time. They are restored once the
+        script returns. """
+    import runpy
+    import sys
+    import time
+    import types
+    if sim is None:
+        sim = Simulation()
+    module = types.ModuleType('krpc')
+    module.connect = sim.connect
+    saved_krpc = sys.modules.get('krpc')
+    saved_time = (time.sleep, time.time, time.monotonic)
+    sys.modules['krpc'] = module
+    time.sleep = sim.sleep
+    time.time = sim.clock
+    time.monotonic = sim.clock
+    try:
+        runpy.run_path(path, run_name='__main__')
+    finally:
+        time.sleep, time.time, time.monotonic = saved_time
+        if saved_krpc is None:
+            del sys.modules['krpc']
+        else:
+            sys.modules['krpc'] = saved_krpc
+    return sim
+
+def orbiting(altitude=100000):
+    """ A simulation of the upper stage of the vessel in a circular orbit, with
+        a connection to it and the vessel """
+    sim = Simulation()
+    r = sim.body_spec.equatorial_radius + altitude
+    sim.position = (r, 0., 0.)
+    sim.velocity = (0., math.sqrt(sim.body_spec.gravitational_parameter / r), 0.)
+    sim.parts = [p for p in sim.parts if p.spec.decouple_stage < 1]
+    sim.current_stage = 1
+    for part in sim.parts:
+        if part.spec.stage == 1:
+            part.active = True
+    conn = sim.connect()
+    return sim, conn, conn.space_center.active_vessel
+
+if __name__ == '__main__':
+    import sys
+    import time
+    start = time.perf_counter()
+    sys.argv = sys.argv[1:]
+    sim = run(sys.argv[0])
+    elapsed = time.perf_counter() - start
+    orbit = sim.vessel._orbit
+    print('Simulated %.0f s in %.2f s (%d RPCs, %d stream updates)' % (
+        sim.ut, elapsed, sim.rpcs, sim.stream_updates))
+    print('Apoapsis %.0f m, periapsis %.0f m, mass %.0f kg' % (
+        Orbit.apoapsis_altitude.fget.raw(orbit),
+        Orbit.periapsis_altitude.fget.raw(orbit), sim.mass))
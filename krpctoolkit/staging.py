@@ -1,19 +1,83 @@
-import time
+from krpctoolkit import strict
+from krpctoolkit.streams import add_stream
 
 class AutoStage(object):
-    def __init__(self, conn, vessel, delay=1):
+    """
+    Activate the next stage when none of the engines that it would
+    decouple are still burning.
+
+    The engines in the stage are looked up once and then cached until the
+    current stage changes, and their state is read from streams, so a tick
+    makes no blocking RPCs unless the vessel has staged. rpc_calls counts
+    the blocking RPCs made by the controller.
+
+    If a PartIndex is given, the engines are looked up in it instead of
+    over RPC. If rate is given, the streams update at most that many times
+    per second, which need be no faster than the controller is called.
+    """
+
+    def __init__(self, conn, vessel, delay=1, index=None, rate=0):
+        self.conn = conn
         self.vessel = vessel
+        self.index = index
         self.delay = delay
+        self.rate = rate
         self.wait_until = 0
+        self.rpc_calls = 0
+        self.ut = add_stream(conn, getattr, conn.space_center, 'ut', rate=rate)
+        self.current_stage = add_stream(conn, getattr, vessel.control, 'current_stage', rate=rate)
+        self.stage = None
+        self.engines = []
 
     def __call__(self):
-        if time.time() < self.wait_until:
+        if self.ut() < self.wait_until:
             return
-        stage = self.vessel.control.current_stage
-        parts = self.vessel.parts.in_decouple_stage(stage-1)
-        for part in parts:
-            engine = part.engine
-            if engine and engine.active and engine.has_fuel:
+        stage = self.current_stage()
+        if stage != self.stage:
+            with strict.allowed():
+                self._update_engines(stage)
+        for active, has_fuel in self.engines:
+            if active() and has_fuel():
                 return
-        self.vessel.control.activate_next_stage()
-        self.wait_until = time.time() + self.delay
+        with strict.allowed():
+            self.vessel.control.activate_next_stage()
+        self.rpc_calls += 1
+        self.wait_until = self.ut() + self.delay
+
+    @property
+    def streams(self):
+        streams = (self.current_stage,)
+        for engine_streams in self.engines:
+            streams += engine_streams
+        return streams
+
+    def close(self):
+        self._remove_streams()
+        self.ut.remove()
+        self.current_stage.remove()
+
+    def _update_engines(self, stage):
+        self._remove_streams()
+        if self.index is not None:
+            self.index.update()
+            engines = [self.index.engine(part) for part in self.index.in_decouple_stage(stage-1)]
+        else:
+            parts = self.vessel.parts.in_decouple_stage(stage-1)
+            self.rpc_calls += 1
+            engines = []
+            for part in parts:
+                engines.append(part.engine)
+                self.rpc_calls += 1
+        for engine in engines:
+            if engine:
+                self.engines.append((
+                    add_stream(self.conn, getattr, engine, 'active', rate=self.rate),
+                    add_stream(self.conn, getattr, engine, 'has_fuel', rate=self.rate)))
+                self.rpc_calls += 2
+        self.stage = stage
+
+    def _remove_streams(self):
+        for streams in self.engines:
+            for stream in streams:
+                stream.remove()
+        self.engines = []
@@ -0,0 +1,193 @@
+"""
+Shared, reference-counted streams.
+
+Controllers that each call conn.add_stream for the same value get the
+same server stream back, and removing it for one removes it for all of
+them. add_stream() instead hands out a handle per owner on a stream shared
+through the connection's StreamRegistry. Removing a handle releases it,
+and the server stream is only removed once every handle on it has been
+released:
+
+    altitude = add_stream(conn, getattr, vessel.flight(), 'mean_altitude')
+    ...
+    altitude.remove()
+    print(registry(conn).live, 'streams live')
+
+Streams are keyed on the call: the function, the object it is called on
+and the arguments, including any reference frame. Remote objects compare
+by their server id, so the same object fetched twice shares a stream.
+
+Each handle has its own rate, the updates per second its owner needs,
+where 0 (the default) means as fast as the server can send them. The
+stream is set to the highest rate wanted by any handle on it, and the
+rate is only sent to the server when that changes, so controllers can
+lower their rates when a value hardly matters and raise them again near
+the moments that count. Pass the rate a handle starts with to add_stream,
+so that adding it to a shared stream sends at most one rate:
+
+    altitude = add_stream(conn, getattr, vessel.flight(), 'mean_altitude', rate=2)
+    ...
+    altitude.rate = 0
+"""
+
+import threading
+
+class SharedStream(object):
+    """
+    An owner's handle on a shared stream. It can be read and waited on
+    like the stream, and callbacks added through it are removed when it is
+    released.
+    """
+
+    def __init__(self, registry, entry, stream, rate=0):
+        self._registry = registry
+        self._entry = entry
+        self._callbacks = []
+        self._rate = rate
+        self.stream = stream
+        self.removed = False
+
+    def __call__(self):
+        return self.stream()
+
+    def __getattr__(self, name):
+        return getattr(self.stream, name)
+
+    @property
+    def rate(self):
+        """ Updates per second wanted by this handle, or 0 for as fast as possible """
+        return self._rate
+
+    @rate.setter
+    def rate(self, value):
+        if value == self._rate:
+            return
+        self._rate = value
+        self._registry._update_rate(self._entry)
+
+    def add_callback(self, callback):
+        self._callbacks.append(callback)
+        self.stream.add_callback(callback)
+
+    def remove_callback(self, callback):
+        if callback in self._callbacks:
+            self._callbacks.remove(callback)
+            self.stream.remove_callback(callback)
+
+    def remove(self):
+        """ Release this handle """
+        if self.removed:
+            return
+        self.removed = True
+        for callback in self._callbacks:
+            self.stream.remove_callback(callback)
+        self._callbacks = []
+        self._registry._release(self)
+
+class _Entry(object):
+    def __init__(self, key, stream):
+        self.key = key
+        self.stream = stream
+        self.handles = []
+        self.rate = 0
+
+    def wanted_rate(self):
+        rates = [handle.rate for handle in self.handles]
+        if not rates or 0 in rates:
+            return 0
+        return max(rates)
+
+class StreamRegistry(object):
+    """ The shared streams of a connection """
+
+    def __init__(self, conn):
+        self.conn = conn
+        self._entries = {}
+        self._unshared = []
+        self._lock = threading.Lock()
+
+    @property
+    def live(self):
+        """ Number of server streams held through the registry """
+        return len(self._entries) + len(self._unshared)
+
+    @property
+    def owners(self):
+        """ Number of handles that have not been released """
+        return sum(len(entry.handles) for entry in self._entries.values()) + len(self._unshared)
+
+    def rates(self):
+        """ The rate of each live stream """
+        return [entry.rate for entry in list(self._entries.values()) + self._unshared]
+
+    def add(self, func, *args, rate=0):
+        """ A handle on the stream of func(*args), adding the stream if there is none """
+        key = _key(func, args)
+        with self._lock:
+            # Arguments that can't be compared aren't shared
+            entry = self._entries.get(key) if key is not None else None
+            if entry is None:
+                entry = _Entry(key, self.conn.add_stream(func, *args))
+                if key is None:
+                    self._unshared.append(entry)
+                else:
+                    self._entries[key] = entry
+            handle = SharedStream(self, entry, entry.stream, rate)
+            entry.handles.append(handle)
+            self._apply_rate(entry)
+        return handle
+
+    def _update_rate(self, entry):
+        with self._lock:
+            self._apply_rate(entry)
+
+    def _apply_rate(self, entry):
+        """ Send the rate wanted by the handles on a stream, if it has changed. Call with the lock held. """
+        rate = entry.wanted_rate()
+        if rate != entry.rate and entry.handles:
+            entry.stream.rate = rate
+            entry.rate = rate
+
+    def _release(self, handle):
+        entry = handle._entry
+        with self._lock:
+            entry.handles.remove(handle)
+            if entry.handles:
+                self._apply_rate(entry)
+                return
+            if entry.key is None:
+                self._unshared.remove(entry)
+            else:
+                del self._entries[entry.key]
+        entry.stream.remove()
+
+def _key(func, args):
+    # Bound methods of remote objects compare their objects by identity,
+    # so key on the function and the object instead
+    if hasattr(func, '__func__'):
+        key = (func.__func__, func.__self__) + args
+    else:
+        key = (func,) + args
+    try:
+        hash(key)
+    except TypeError:
+        return None
+    return key
+
+def set_rates(streams, rate):
+    """ Set the rate wanted by several handles """
+    for stream in streams:
+        stream.rate = rate
+
+def registry(conn):
+    """ The stream registry of a connection """
+    try:
+        return conn._stream_registry
+    except AttributeError:
+        conn._stream_registry = StreamRegistry(conn)
+        return conn._stream_registry
+
+def add_stream(conn, func, *args, rate=0):
+    """ A shared handle on the stream of func(*args), wanting rate updates per second.
+        Call remove() on it to release it. """
+    return registry(conn).add(func, *args, rate=rate)
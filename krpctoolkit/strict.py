@@ -0,0 +1,110 @@
+"""
+Strict streaming mode: detect blocking RPCs made while a controller tick is
+running.
+
+Controllers should read telemetry from streams. Property setters and
+procedures that return nothing (setting the throttle, engaging the auto
+pilot) are commands and are always allowed. Any other RPC made inside a tick
+is a hidden round trip, and is reported by warning with the stack trace or
+by raising BlockingCallError.
+
+Strict mode is enabled for a connection with enable(conn), or for the ticks
+of a scheduler with Scheduler(strict='warn') or Scheduler(strict='raise').
+Code that deliberately makes a blocking call, such as activating the next
+stage, can do so inside an allowed() block.
+"""
+
+import threading
+import traceback
+import warnings
+from contextlib import contextmanager
+
+WARN = 'warn'
+RAISE = 'raise'
+
+class BlockingCallError(Exception):
+    pass
+
+class BlockingCallWarning(RuntimeWarning):
+    pass
+
+_state = threading.local()
+_installed = False
+
+def enable(conn, action=RAISE):
+    """ Report blocking RPCs made on conn during a tick. """
+    _check_action(action)
+    _install()
+    conn._strict_action = action
+
+def disable(conn):
+    conn._strict_action = None
+
+@contextmanager
+def tick(name, action=None):
+    """ Mark the body of the block as a controller tick. """
+    if action is not None:
+        _check_action(action)
+        _install()
+    previous = getattr(_state, 'tick', None)
+    _state.tick = (name, action)
+    try:
+        yield
+    finally:
+        _state.tick = previous
+
+def current_tick():
+    """ Name of the tick running on this thread, or None """
+    current = getattr(_state, 'tick', None)
+    if current is None:
+        return None
+    return current[0]
+
+@contextmanager
+def allowed():
+    """ Allow blocking RPCs in the body of the block. """
+    previous = getattr(_state, 'allowed', False)
+    _state.allowed = True
+    try:
+        yield
+    finally:
+        _state.allowed = previous
+
+def check(conn, service, procedure, returns):
+    """
+    Report a call made on conn if it is made during a tick and returns a
+    value. Calls through conn._invoke are checked once strict mode is
+    enabled, so this is only needed for calls sent some other way.
+    """
+    current = getattr(_state, 'tick', None)
+    if current is not None and returns and not getattr(_state, 'allowed', False):
+        name, action = current
+        if action is None:
+            action = getattr(conn, '_strict_action', None)
+        if action is not None:
+            _report(name, action, service, procedure)
+
+def _check_action(action):
+    if action not in (WARN, RAISE):
+        raise ValueError('Invalid strict mode action \'%s\'' % action)
+
+def _install():
+    global _installed
+    if _installed:
+        return
+    from krpc.client import Client
+    invoke = Client._invoke
+
+    def strict_invoke(self, service, procedure, args, param_names, param_types, return_type):
+        check(self, service, procedure, return_type is not None)
+        return invoke(self, service, procedure, args, param_names, param_types, return_type)
+
+    Client._invoke = strict_invoke
+    _installed = True
+
+def _report(name, action, service, procedure):
+    msg = 'Blocking RPC %s.%s during tick of %s' % (service, procedure, name)
+    if action == RAISE:
+        raise BlockingCallError(msg)
+    stack = ''.join(traceback.format_stack()[:-3])
+    warnings.warn('%s\n%s' % (msg, stack), BlockingCallWarning, stacklevel=5)
@@ -1,12 +1,20 @@
 from krpctoolkit.controller import Controller
+from krpctoolkit.streams import add_stream
 
 class ThrottleMaxQController(Controller):
     def __init__(self, conn, vessel, max_q):
         self.control = vessel.control
         flight = vessel.flight(vessel.orbit.body.reference_frame)
-        self.q = conn.add_stream(getattr, flight, 'dynamic_pressure')
+        self.q = add_stream(conn, getattr, flight, 'dynamic_pressure')
         self.max_q = max_q
 
+    @property
+    def streams(self):
+        return (self.q,)
+
+    def close(self):
+        self.q.remove()
+
     def pv(self):
         return self.q()
 
@@ -20,9 +28,16 @@ class ThrottleSpeedController(Controller):
     def __init__(self, conn, vessel, max_speed):
         self.control = vessel.control
         flight = vessel.flight(vessel.orbit.body.reference_frame)
-        self.speed = conn.add_stream(getattr, flight, 'speed')
+        self.speed = add_stream(conn, getattr, flight, 'speed')
         self.max_speed = max_speed
 
+    @property
+    def streams(self):
+        return (self.speed,)
+
+    def close(self):
+        self.speed.remove()
+
     def pv(self):
         return self.speed()
 
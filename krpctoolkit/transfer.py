@@ -0,0 +1,192 @@
+"""
+Transfer planning with a batched Lambert solver and a porkchop search.
+
+lambert() finds the orbits connecting arrays of pairs of positions in
+given flight times. porkchop() propagates two orbits with
+krpctoolkit.kepler, solves Lambert's problem for every pair of departure
+time and flight time on a grid, and finds the transfer with the lowest
+delta-v. Large grids can be split across a process pool.
+
+For a vessel and a target orbiting the same body, transfer() adds a node
+for the best transfer in a window, replacing hohmann_transfer for orbits
+that are not circular or coplanar:
+
+    departures = ut + np.linspace(0, period, 500)
+    flight_times = np.linspace(0.25, 1.5, 500) * period
+    node = transfer(conn, vessel, target, departures, flight_times)
+
+Between planets, call porkchop() with the planets' orbits around the sun;
+the departure delta-v is then the hyperbolic excess speed needed.
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from krpctoolkit.kepler import Elements, propagate
+from krpctoolkit.orbit import OrbitState
+
+# Bisection iterations for the universal variable. The bracket is about
+# 400 wide, so this resolves it to around 1e-12.
+ITERATIONS = 50
+Z_MIN = -400.
+Z_MAX = 4 * np.pi**2
+
+def _stumpff(z):
+    """ The Stumpff functions C(z) and S(z) """
+    C = np.empty(z.shape)
+    S = np.empty(z.shape)
+    small = np.abs(z) < 1e-3
+    pos = (z >= 1e-3)
+    neg = (z <= -1e-3)
+    zs = z[small]
+    C[small] = 1/2. - zs/24. + zs*zs/720.
+    S[small] = 1/6. - zs/120. + zs*zs/5040.
+    sz = np.sqrt(z[pos])
+    C[pos] = (1 - np.cos(sz)) / z[pos]
+    S[pos] = (sz - np.sin(sz)) / sz**3
+    sz = np.sqrt(-z[neg])
+    C[neg] = (np.cosh(sz) - 1) / -z[neg]
+    S[neg] = (np.sinh(sz) - sz) / sz**3
+    return C, S
+
+def lambert(r1, r2, flight_time, mu, prograde=True):
+    """
+    Velocities at r1 and r2 of the orbits that travel from r1 to r2 in the
+    given flight times, with less than one revolution. r1 and r2 are arrays
+    of positions with a trailing axis of length 3, and are broadcast with
+    flight_time. Uses the universal variable formulation, solved by
+    bisection so every element takes the same number of iterations.
+    """
+    r1, r2 = np.broadcast_arrays(np.asarray(r1, dtype=float), np.asarray(r2, dtype=float))
+    flight_time = np.asarray(flight_time, dtype=float)
+    shape = np.broadcast_shapes(r1.shape[:-1], flight_time.shape)
+    r1 = np.broadcast_to(r1, shape + (3,))
+    r2 = np.broadcast_to(r2, shape + (3,))
+    flight_time = np.broadcast_to(flight_time, shape)
+
+    n1 = np.linalg.norm(r1, axis=-1)
+    n2 = np.linalg.norm(r2, axis=-1)
+    cos_angle = np.clip(np.einsum('...i,...i', r1, r2) / (n1*n2), -1, 1)
+    angle = np.arccos(cos_angle)
+    cross_z = r1[..., 0]*r2[..., 1] - r1[..., 1]*r2[..., 0]
+    if prograde:
+        angle = np.where(cross_z >= 0, angle, 2*np.pi - angle)
+    else:
+        angle = np.where(cross_z < 0, angle, 2*np.pi - angle)
+    A = np.sin(angle) * np.sqrt(n1*n2 / (1 - np.cos(angle)))
+
+    sqrt_mu = np.sqrt(mu)
+    low = np.full(shape, Z_MIN)
+    high = np.full(shape, Z_MAX)
+    for _ in range(ITERATIONS):
+        z = (low + high) / 2
+        C, S = _stumpff(z)
+        y = n1 + n2 + A*(z*S - 1)/np.sqrt(C)
+        with np.errstate(invalid='ignore'):
+            t = ((y/C)**1.5 * S + A*np.sqrt(y)) / sqrt_mu
+        # Where y is negative z is too small, so treat the time as too short
+        too_short = (y < 0) | (t < flight_time)
+        low = np.where(too_short, z, low)
+        high = np.where(too_short, high, z)
+
+    z = (low + high) / 2
+    C, S = _stumpff(z)
+    y = np.maximum(n1 + n2 + A*(z*S - 1)/np.sqrt(C), 0)
+    f = 1 - y/n1
+    g = A * np.sqrt(y/mu)
+    gdot = 1 - y/n2
+    with np.errstate(divide='ignore', invalid='ignore'):
+        v1 = (r2 - f[..., None]*r1) / g[..., None]
+        v2 = (gdot[..., None]*r2 - r1) / g[..., None]
+    return v1, v2
+
+class Porkchop(object):
+    """ Delta-v over a grid of departure times and flight times """
+
+    def __init__(self, departures, flight_times, departure_burn, arrival_burn):
+        self.departures = departures
+        self.flight_times = flight_times
+        self.departure_burn = departure_burn
+        self.arrival_burn = arrival_burn
+        self.departure_delta_v = np.linalg.norm(departure_burn, axis=-1)
+        self.arrival_delta_v = np.linalg.norm(arrival_burn, axis=-1)
+
+    def delta_v(self, arrival=True):
+        if arrival:
+            return self.departure_delta_v + self.arrival_delta_v
+        return self.departure_delta_v
+
+    def best(self, arrival=True):
+        """ The transfer with the lowest delta-v, including the arrival burn if arrival is True """
+        delta_v = np.where(np.isfinite(self.delta_v(arrival)), self.delta_v(arrival), np.inf)
+        i, j = np.unravel_index(np.argmin(delta_v), delta_v.shape)
+        return Transfer(self.departures[i], self.flight_times[j],
+                        self.departure_burn[i, j], self.arrival_burn[i, j])
+
+class Transfer(object):
+    """ A transfer found by a porkchop search. Burns are vectors in the propagation frame. """
+
+    def __init__(self, ut, flight_time, departure_burn, arrival_burn):
+        self.ut = ut
+        self.flight_time = flight_time
+        self.departure_burn = departure_burn
+        self.arrival_burn = arrival_burn
+        self.departure_delta_v = np.linalg.norm(departure_burn)
+        self.arrival_delta_v = np.linalg.norm(arrival_burn)
+
+    def components(self, elements):
+        """ Prograde, normal and radial components of the departure burn, for an orbit """
+        position, velocity = propagate(elements, self.ut)
+        prograde = velocity / np.linalg.norm(velocity)
+        normal = np.cross(position, velocity)
+        normal /= np.linalg.norm(normal)
+        radial = np.cross(prograde, normal)
+        burn = self.departure_burn
+        return float(np.dot(burn, prograde)), float(np.dot(burn, normal)), float(np.dot(burn, radial))
+
+    def add_node(self, vessel, elements):
+        """ Add a node for the departure burn, for a vessel on the given orbit """
+        prograde, normal, radial = self.components(elements)
+        return vessel.control.add_node(float(self.ut), prograde=prograde, normal=normal, radial=radial)
+
+def _grid(origin, target, departures, flight_times):
+    r1, v1 = propagate(origin, departures)
+    arrivals = departures[:, None] + flight_times[None, :]
+    r2, v2 = propagate(target, arrivals)
+    mu = float(np.ravel(origin.mu)[0])
+    transfer_v1, transfer_v2 = lambert(r1[:, None, :], r2, flight_times[None, :], mu)
+    return transfer_v1 - v1[:, None, :], v2 - transfer_v2
+
+def porkchop(origin, target, departures, flight_times, processes=None):
+    """
+    Search for transfers from the origin orbit to the target orbit (single
+    Elements orbiting the same body), for every departure time and flight
+    time. If processes is given, the departures are split across a pool of
+    that many processes.
+    """
+    departures = np.asarray(departures, dtype=float)
+    flight_times = np.asarray(flight_times, dtype=float)
+    if not processes or processes <= 1:
+        departure_burn, arrival_burn = _grid(origin, target, departures, flight_times)
+    else:
+        chunks = np.array_split(departures, processes)
+        with ProcessPoolExecutor(processes) as pool:
+            results = list(pool.map(_grid, [origin]*len(chunks), [target]*len(chunks),
+                                    chunks, [flight_times]*len(chunks)))
+        departure_burn = np.concatenate([x[0] for x in results])
+        arrival_burn = np.concatenate([x[1] for x in results])
+    return Porkchop(departures, flight_times, departure_burn, arrival_burn)
+
+def transfer(conn, vessel, target, departures, flight_times, arrival=True, processes=None,
+             state=None, target_state=None):
+    """
+    Add a node for the lowest delta-v transfer from the vessel's orbit to
+    the target's, searching the given departure times and flight times.
+    """
+    if state is None:
+        state = OrbitState.fetch(conn, vessel.orbit)
+    if target_state is None:
+        target_state = OrbitState.fetch(conn, target.orbit)
+    origin = Elements.from_states([state])[0]
+    destination = Elements.from_states([target_state])[0]
+    search = porkchop(origin, destination, departures, flight_times, processes)
+    return search.best(arrival).add_node(vessel, origin)
@@ -0,0 +1,41 @@
+import pytest
+from krpctoolkit.ascent import PitchProgram, Stage, simulate
+
+def test_turn():
+    program = PitchProgram.turn(1000., 31000., points=4)
+    assert program.pitches == pytest.approx([90., 60., 30., 0.])
+    assert program(0.) == 90.
+    assert program(1000.) == 90.
+    assert program(11000.) == pytest.approx(60.)
+    assert program(16000.) == pytest.approx(45.)
+    assert program(31000.) == 0.
+    assert program(1e6) == 0.
+
+def test_interpolation_is_piecewise_linear():
+    program = PitchProgram(0., 300., [90., 80., 40., 30.])
+    for altitude, pitch in ((50., 85.), (100., 80.), (125., 70.), (275., 32.5)):
+        assert program(altitude) == pytest.approx(pitch)
+    # Monotonic between the points of a turn
+    program = PitchProgram.turn(250., 50000., shape=0.5)
+    pitches = [program(x) for x in range(0, 60000, 100)]
+    assert all(a >= b for a, b in zip(pitches, pitches[1:]))
+
+def test_save_and_load(tmp_path):
+    program = PitchProgram.turn(250., 50000., shape=0.7)
+    path = str(tmp_path / 'program.json')
+    program.save(path)
+    loaded = PitchProgram.load(path)
+    assert loaded.turn_start == program.turn_start
+    assert loaded.turn_end == program.turn_end
+    for altitude in (0., 1000., 12345., 49999., 60000.):
+        assert loaded(altitude) == pytest.approx(program(altitude), abs=1e-3)
+
+def test_simulate():
+    stages = [Stage(71250., 19250., 2000e3, 310., 285.), Stage(12250., 4250., 215e3, 320., 170.)]
+    ascent = simulate(stages, PitchProgram.turn(250., 52500.), 100000.)
+    assert ascent is not None
+    assert ascent.apoapsis == pytest.approx(100000., rel=0.01)
+    assert ascent.delta_v > 0
+    # Climbing straight up leaves less delta-v once circularized
+    vertical = simulate(stages, PitchProgram(1e6, 2e6, [90., 90.]), 100000.)
+    assert vertical is None or vertical.delta_v < ascent.delta_v
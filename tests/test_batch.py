@@ -0,0 +1,61 @@
+import threading
+import pytest
+from krpc.schema import KRPC_pb2 as KRPC
+from krpc.types import Types
+from krpc.encoder import Encoder
+from krpctoolkit import strict
+from krpctoolkit.batch import batch
+from krpctoolkit.profiler import Profiler
+
+class Connection(object):
+    """ Answers each call in a request with 1.0 """
+
+    def send_message(self, request):
+        self.calls = len(request.calls)
+
+    def receive_message(self, typ):
+        response = typ()
+        for _ in range(self.calls):
+            response.results.add().value = Encoder.encode(1., Types().double_type)
+        return response
+
+class Client(object):
+    def __init__(self):
+        self._rpc_connection = Connection()
+        self._rpc_connection_lock = threading.Lock()
+
+    def get_call(self, func, *args):
+        call = KRPC.ProcedureCall()
+        call.service = 'SpaceCenter'
+        call.procedure = args[-1]
+        return call
+
+    def _get_return_type(self, func, *args):
+        return Types().double_type
+
+    def _invoke(self, service, procedure, *args):
+        pass
+
+CALLS = [(getattr, None, 'get_UT'), (getattr, None, 'get_Mass')]
+
+def test_batch():
+    assert batch(Client(), CALLS) == [1., 1.]
+
+def test_strict_mode_sees_batch():
+    conn = Client()
+    with strict.tick('controller', strict.RAISE):
+        with pytest.raises(strict.BlockingCallError):
+            batch(conn, CALLS)
+        with strict.allowed():
+            batch(conn, CALLS)
+
+def test_profiler_sees_batch():
+    conn = Client()
+    profiler = Profiler(conn)
+    batch(conn, CALLS)
+    phase = profiler.phases['default']
+    assert phase.rpcs == 1
+    assert [procedure for _, _, procedure in phase.calls] == [
+        'batch.SpaceCenter.get_UT,SpaceCenter.get_Mass']
+    profiler.close()
+    assert not hasattr(conn, '_invoke_batch')
@@ -0,0 +1,118 @@
+import math
+import random
+import pytest
+from krpctoolkit.deltav import G0, EngineData, FuelGraph, PartData, stage_table
+
+def _find_tanks(graph, root, propellant):
+    """ The fuel flow rules, as a recursive search """
+    visited = set()
+
+    def find(part):
+        if part in visited:
+            return []
+        visited.add(part)
+        for sources in (graph.fuel_lines_from[part], graph.crossfeed_from[part]):
+            tanks = []
+            for source in sources:
+                tanks.extend(find(source))
+            if tanks:
+                return tanks
+        if graph.has_fuel(part, propellant):
+            return [part]
+        return []
+
+    return find(root)
+
+def _tree(n, rng):
+    """ A random vessel of n parts, where part 0 is the root """
+    parents = [None] + [rng.randrange(i) for i in range(1, n)]
+    parts = []
+    for i in range(n):
+        fuel = rng.random() < 0.5
+        parts.append(PartData(
+            mass=1., dry_mass=1., stage=0, decouple_stage=-1,
+            parent=parents[i],
+            children=[j for j in range(n) if parents[j] == i],
+            crossfeed=rng.random() < 0.8,
+            axially_attached=rng.random() < 0.8,
+            fuel_lines_from=rng.sample(range(n), 1) if rng.random() < 0.1 else [],
+            resources={'LiquidFuel': 100.} if fuel else {'Oxidizer': 100.}))
+    return parts
+
+def test_stack():
+    # Engine (0) under two tanks (1, 2), with a radial tank (3) on a fuel line to the engine
+    parts = [
+        PartData(1., 1., 0, -1, parent=1),
+        PartData(1., 1., 0, -1, parent=2, children=[0], resources={'LiquidFuel': 100.}),
+        PartData(1., 1., 0, -1, children=[1, 3], resources={'LiquidFuel': 100.}),
+        PartData(1., 1., 0, -1, parent=2, axially_attached=False, resources={'LiquidFuel': 100.})]
+    graph = FuelGraph(parts)
+    # The top tank drains first
+    assert graph.find_tanks(0, 0) == [2]
+    graph.fuel[2, 0] = 0
+    assert graph.find_tanks(0, 0) == [1]
+    parts[0].fuel_lines_from = [3]
+    assert FuelGraph(parts).find_tanks(0, 0) == [3]
+
+@pytest.mark.parametrize('seed', range(50))
+def test_matches_recursive_search(seed):
+    rng = random.Random(seed)
+    graph = FuelGraph(_tree(rng.randrange(2, 40), rng))
+    for root in range(graph.n):
+        for propellant in range(len(graph.propellants)):
+            assert graph.find_tanks(root, propellant) == _find_tanks(graph, root, propellant)
+
+def test_deep_vessel():
+    # Deeper than the recursion limit
+    n = 5000
+    parts = [PartData(1., 1., 0, -1, parent=i-1 if i else None, children=[i+1] if i < n-1 else [])
+             for i in range(n)]
+    parts[-1].resources = {'LiquidFuel': 100.}
+    assert FuelGraph(parts).find_tanks(0, 0) == [n-1]
+
+def _two_stage(lower_engine_stage=2):
+    """ Pod, upper tank and engine, decoupler, lower tank and engine, from the top down """
+    return [
+        PartData(1000., 1000., -1, -1, children=[1]),
+        PartData(4500., 500., -1, 0, parent=0, children=[2], resources={'LiquidFuel': 4000.}),
+        PartData(1000., 1000., 1, 0, parent=1, children=[3], engine=EngineData(100e3, 300., ['LiquidFuel'])),
+        PartData(100., 100., 1, 1, parent=2, children=[4], crossfeed=False),
+        PartData(11000., 1000., -1, 1, parent=3, children=[5], resources={'LiquidFuel': 10000.}),
+        PartData(2000., 2000., lower_engine_stage, 1, parent=4,
+                 engine=EngineData(500e3, 250., ['LiquidFuel']))]
+
+def _check_two_stage(table):
+    assert [info.stage for info in table][:2] == [2, 1]
+    lower, upper = table[:2]
+
+    assert lower.mass == pytest.approx(19600.)
+    assert lower.dry_mass == pytest.approx(9600.)
+    assert lower.isp == pytest.approx(250.)
+    assert lower.time == pytest.approx(10000. / (500e3 / (250. * G0)))
+    assert lower.delta_v == pytest.approx(250. * G0 * math.log(19600. / 9600.))
+    assert lower.twr == pytest.approx(500e3 / (19600. * G0))
+
+    # The decoupler, lower tank and lower engine are jettisoned
+    assert upper.mass == pytest.approx(6500.)
+    assert upper.dry_mass == pytest.approx(2500.)
+    assert upper.time == pytest.approx(4000. / (100e3 / (300. * G0)))
+    assert upper.delta_v == pytest.approx(300. * G0 * math.log(6500. / 2500.))
+    assert upper.twr == pytest.approx(100e3 / (6500. * G0))
+
+def test_stage_table():
+    _check_two_stage(stage_table(_two_stage()))
+
+def test_stages_that_decouple_nothing_are_merged():
+    # Stage 3 only activates the lower engine, so it burns with stage 2
+    _check_two_stage(stage_table(_two_stage(lower_engine_stage=3)))
+
+def test_propellant_ratios():
+    parts = [
+        PartData(1500., 500., -1, -1, children=[1], resources={'LiquidFuel': 450., 'Oxidizer': 550.}),
+        PartData(1000., 1000., 0, -1, parent=0,
+                 engine=EngineData(50e3, 300., ['LiquidFuel', 'Oxidizer'], {'LiquidFuel': 0.45, 'Oxidizer': 0.55}))]
+    info = stage_table(parts)[0]
+    assert info.stage == 0
+    # Both propellants run out together
+    assert info.time == pytest.approx(1000. / (50e3 / (300. * G0)))
+    assert info.dry_mass == pytest.approx(1500.)
@@ -0,0 +1,61 @@
+import numpy as np
+import pytest
+from krpctoolkit.kepler import Elements, solve_kepler, propagate
+from krpctoolkit.orbit import OrbitState
+
+def _series(x, sign):
+    """ x - sin(x) (sign -1) or sinh(x) - x (sign 1), without cancellation for small x """
+    total = np.zeros_like(x)
+    term = x**3 / 6
+    for k in range(3, 30, 2):
+        total += term
+        term = sign * term * x*x / ((k+1)*(k+2))
+    return total
+
+def _residual(e, M, E):
+    """
+    Residual of Kepler's equation relative to M, written as
+    (1 - e) E + e (E - sin E) = M or (e - 1) F + e (sinh F - F) = M
+    """
+    if e < 1:
+        f = (1 - e)*E + e*np.where(np.abs(E) < 0.5, _series(E, -1), E - np.sin(E))
+    else:
+        f = (e - 1)*E + e*np.where(np.abs(E) < 0.5, _series(E, 1), np.sinh(E) - E)
+    return np.abs(f - M) / np.abs(M)
+
+@pytest.mark.parametrize('e', [0., 0.1, 0.5, 0.9, 0.99, 0.999, 0.9999])
+def test_elliptic(e):
+    M = np.concatenate([np.logspace(-12, np.log10(np.pi), 200), -np.logspace(-12, 0, 50)])
+    E = solve_kepler(e, M)
+    assert np.all(_residual(e, M, E) < 1e-15 / (1 - e) + 1e-15)
+
+@pytest.mark.parametrize('e', [1.0000001, 1.001, 1.1, 2., 10.])
+def test_hyperbolic(e):
+    M = np.concatenate([np.logspace(-12, 4, 200), -np.logspace(-12, 4, 50)])
+    E = solve_kepler(e, M)
+    assert np.all(_residual(e, M, E) < 1e-15 / (e - 1) + 1e-15)
+
+def test_near_parabolic():
+    assert _residual(0.999, 1e-8, solve_kepler(0.999, 1e-8)) < 1e-12
+    assert _residual(0.9999, 1e-8, solve_kepler(0.9999, 1e-8)) < 1e-11
+    assert _residual(1.0000001, 1e-3, solve_kepler(1.0000001, 1e-3)) < 1e-8
+
+def test_wraps_mean_anomaly():
+    E = solve_kepler(0.3, [1., 1. + 2*np.pi, 1. - 20*np.pi])
+    assert np.allclose(E[1:], E[0], atol=1e-12)
+
+def test_propagate_matches_orbit_state():
+    mu = 3.5316e12
+    states = [
+        OrbitState(0., mu, 600000., 700000., 0.01, 0.1, 0.2, 0.3, 0.4),
+        OrbitState(0., mu, 600000., 2000000., 0.6, 1., 2., 3., -2.),
+        OrbitState(0., mu, 600000., -900000., 1.5, 0.5, 1., 2., 0.2)]
+    ut = np.linspace(0., 3000., 7)
+    position, velocity = propagate(Elements.from_states(states)[:, None], ut[None, :])
+    for state, r, v in zip(states, position, velocity):
+        for t, rr, vv in zip(ut, r, v):
+            assert np.linalg.norm(rr) == pytest.approx(state.radius_at(t), rel=1e-9)
+            assert np.linalg.norm(vv) == pytest.approx(state.speed_at(t), rel=1e-9)
+            # Angular momentum is along the orbit normal and conserved
+            h = np.cross(rr, vv)
+            assert np.arccos(h[2] / np.linalg.norm(h)) == pytest.approx(state.inclination, abs=1e-9)
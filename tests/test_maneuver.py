@@ -0,0 +1,49 @@
+import pytest
+from krpctoolkit import events
+from krpctoolkit.maneuver import ExecuteNode
+from krpctoolkit.scheduler import Scheduler
+from krpctoolkit.streams import registry
+from krpctoolkit.sim import orbiting
+
+@pytest.mark.parametrize('rate', [5, 20, 40])
+def test_execute_node_cutoff_error(rate):
+    s, conn, vessel = orbiting()
+    node = vessel.control.add_node(s.ut + 30, prograde=100)
+    burn = ExecuteNode(conn, vessel, node)
+    scheduler = Scheduler(clock=s.clock, sleep=s.sleep)
+    scheduler.run(until=scheduler.add(burn, rate))
+    assert abs(burn.cutoff_error) < 0.02
+    assert s.throttle == 0
+    assert registry(conn).live == 0
+
+def test_execute_node_short_burn():
+    s, conn, vessel = orbiting()
+    node = vessel.control.add_node(s.ut + 30, prograde=5)
+    burn = ExecuteNode(conn, vessel, node)
+    scheduler = Scheduler(clock=s.clock, sleep=s.sleep)
+    scheduler.run(until=scheduler.add(burn, 20))
+    assert abs(burn.cutoff_error) < 0.02
+
+def test_execute_node_schedules_cutoff_once(monkeypatch):
+    above = events.above
+    created = []
+    monkeypatch.setattr(events, 'above', lambda *args: created.append(args) or above(*args))
+    s, conn, vessel = orbiting()
+    node = vessel.control.add_node(s.ut + 30, prograde=100)
+    burn = ExecuteNode(conn, vessel, node)
+    scheduler = Scheduler(clock=s.clock, sleep=s.sleep)
+    scheduler.run(until=scheduler.add(burn, 20))
+    assert len(created) == 1
+
+def test_execute_node_cutoff_wins_over_throttle():
+    s, conn, vessel = orbiting()
+    node = vessel.control.add_node(s.ut + 30, prograde=100)
+    burn = ExecuteNode(conn, vessel, node)
+    burn._set_throttle(0.5)
+    # The cutoff fires on the stream thread in the middle of a tick
+    burn._cutoff()
+    burn._set_throttle(0.2)
+    assert s.throttle == 0
+    assert burn()
+    assert s.throttle == 0
+    burn.close()
@@ -0,0 +1,72 @@
+import math
+import pytest
+from krpctoolkit.orbit import OrbitState
+from krpctoolkit.sim import orbiting
+
+MU = 3.5316e12
+R = 600000.
+
+def _elliptic():
+    return OrbitState(100., MU, R, 1000000., 0.2, 0.1, 0.5, 1., 2.)
+
+def _hyperbolic():
+    return OrbitState(100., MU, R, -800000., 1.8, 0.1, 0.5, 1., -0.5)
+
+def test_immutable():
+    state = _elliptic()
+    with pytest.raises(AttributeError):
+        state.eccentricity = 0.
+
+def test_shape():
+    state = _elliptic()
+    assert state.periapsis == pytest.approx(800000.)
+    assert state.apoapsis == pytest.approx(1200000.)
+    assert state.periapsis_altitude == pytest.approx(200000.)
+    assert state.period == pytest.approx(2*math.pi * math.sqrt(1e18 / MU))
+    assert _hyperbolic().apoapsis == float('inf')
+    assert _hyperbolic().periapsis == pytest.approx(640000.)
+
+@pytest.mark.parametrize('state', [_elliptic(), _hyperbolic()])
+def test_anomaly_round_trip(state):
+    for theta in (-1.5, -0.3, 0., 0.3, 1.5):
+        M = state.mean_anomaly_from_true_anomaly(theta)
+        error = state.true_anomaly_from_mean_anomaly(M) - theta
+        assert math.sin(error) == pytest.approx(0., abs=1e-12)
+        assert math.cos(error) == pytest.approx(1.)
+
+@pytest.mark.parametrize('state', [_elliptic(), _hyperbolic()])
+def test_vis_viva(state):
+    # Speed times radius at periapsis is the specific angular momentum
+    h = math.sqrt(MU * state.semi_latus_rectum)
+    assert state.speed_at_radius(state.periapsis) * state.periapsis == pytest.approx(h)
+
+def test_times():
+    state = _elliptic()
+    assert state.radius_at(state.ut + state.time_to_periapsis) == pytest.approx(state.periapsis)
+    assert state.radius_at(state.ut + state.time_to_apoapsis) == pytest.approx(state.apoapsis)
+    assert 0 < state.time_to_periapsis < state.period
+    # The argument of latitude is zero at the ascending node and pi at the descending node
+    for time, latitude in ((state.time_to_ascending_node, 0.), (state.time_to_descending_node, math.pi)):
+        theta = state.true_anomaly_at(state.ut + time)
+        assert math.cos(theta + state.argument_of_periapsis - latitude) == pytest.approx(1.)
+
+def test_time_to_periapsis_hyperbolic():
+    state = _hyperbolic()
+    # The vessel is approaching periapsis
+    assert state.time_to_periapsis > 0
+    assert state.radius_at(state.ut + state.time_to_periapsis) == pytest.approx(state.periapsis)
+
+def test_fetch():
+    s, conn, vessel = orbiting()
+    orbit = vessel.orbit
+    rpcs = s.rpcs
+    state = OrbitState.fetch(conn, orbit)
+    # One call for the body, and one batch for the elements
+    assert s.rpcs == rpcs + 2
+    # Then the body is known
+    OrbitState.fetch(conn, orbit)
+    assert s.rpcs == rpcs + 3
+    OrbitState.fetch(conn, vessel.orbit, body=orbit.body)
+    assert state.radius == pytest.approx(vessel.orbit.radius)
+    assert state.speed == pytest.approx(vessel.orbit.speed)
+    assert state.mu == pytest.approx(s.body_spec.gravitational_parameter)
@@ -0,0 +1,61 @@
+from krpctoolkit import sim
+from krpctoolkit.parts import PartIndex
+
+def _simulation():
+    parts = sim.kerbal_x()
+    parts[0].modules = [('ModuleAnimateGeneric', ['Extend']), ('ModuleCommand', ['Control From Here'])]
+    parts[3].modules = [('ModuleAnimateGeneric', ['Extend'])]
+    s = sim.Simulation(parts)
+    conn = s.connect()
+    return s, conn, conn.space_center.active_vessel
+
+def _titles(parts):
+    return sorted(part.title for part in parts)
+
+def test_index():
+    s, conn, vessel = _simulation()
+    index = PartIndex(conn, vessel)
+    assert index.fetches == 5
+    assert _titles(index.in_stage(2)) == ['Lower Engine']
+    assert _titles(index.in_decouple_stage(1)) == ['Lower Engine', 'Lower Tank']
+    assert _titles(index.with_resource('LiquidFuel')) == ['Lower Tank', 'Upper Tank']
+    assert _titles(index.with_module('ModuleAnimateGeneric')) == ['Command Pod', 'Lower Tank']
+    assert len(index.modules_with_event('Extend', 'ModuleAnimateGeneric')) == 2
+    assert index.modules_with_event('Extend', 'ModuleCommand') == []
+    index.close()
+
+def test_staging_drops_jettisoned_parts():
+    s, conn, vessel = _simulation()
+    index = PartIndex(conn, vessel)
+    rpcs = s.rpcs
+    index.update()
+    assert s.rpcs == rpcs
+
+    vessel.control.activate_next_stage()
+    vessel.control.activate_next_stage()
+    s.sleep(0.1)
+    index.update()
+    # The lower stage has been decoupled, and nothing new was fetched
+    assert index.fetches == 5
+    assert index.in_decouple_stage(1) == []
+    assert _titles(index.with_resource('LiquidFuel')) == ['Upper Tank']
+    assert _titles(index.with_module('ModuleAnimateGeneric')) == ['Command Pod']
+    assert len(index.modules_with_event('Extend')) == 1
+    index.close()
+
+def test_trigger_event_refreshes_events():
+    s, conn, vessel = _simulation()
+    index = PartIndex(conn, vessel)
+    assert index.trigger_event('Extend', 'ModuleAnimateGeneric') == 2
+    assert index.modules_with_event('Extend') == []
+    retract = index.modules_with_event('Retract', 'ModuleAnimateGeneric')
+    assert len(retract) == 2
+    # The other modules of the parts are unchanged
+    assert len(index.modules_with_event('Control From Here')) == 1
+    pod = [part for part in index.with_module('ModuleCommand')][0]
+    assert sorted(events for _, _, events in index.entries[pod].modules) == sorted(
+        [frozenset(['Retract']), frozenset(['Control From Here'])])
+
+    assert index.trigger_event('Retract') == 2
+    assert len(index.modules_with_event('Extend', 'ModuleAnimateGeneric')) == 2
+    index.close()
@@ -0,0 +1,35 @@
+import numpy as np
+from krpctoolkit.pid import PIDBank, PIDController
+
+def test_bank_matches_controllers():
+    gains = [(1., 0., 0., 0.1), (0.5, 2., 0.1, 0.02), (2., 0.3, 1., 0.05)]
+    limits = [(-1., 1.), (0., 1.), (-0.5, 2.)]
+    controllers = [PIDController(*g) for g in gains]
+    bank = PIDBank(3)
+    for i, (g, (low, high)) in enumerate(zip(gains, limits)):
+        bank.setparams(i, *g)
+        bank.setlimits(i, low, high)
+
+    rng = np.random.RandomState(0)
+    for _ in range(200):
+        error = rng.uniform(-2, 2, 3)
+        position = rng.uniform(-10, 10, 3)
+        expected = [c.update(e, p, low, high) for c, e, p, (low, high) in zip(controllers, error, position, limits)]
+        assert np.allclose(bank.update(error, position), expected)
+
+def test_integral_windup_is_clamped():
+    bank = PIDBank(1, Kp=0., Ki=1., dt=1.)
+    for _ in range(10):
+        bank.update([5.], [0.])
+    assert bank.Ti[0] == 1.
+    # The output recovers as soon as the error changes sign
+    assert bank.update([-0.5], [0.])[0] == 0.5
+
+def test_update_in_place():
+    bank = PIDBank(2, Kp=2.)
+    output = bank.update([0.1, 0.2], [0., 0.])
+    bank.error[:] = (0.3, -0.3)
+    assert bank.update() is output
+    assert np.allclose(output, (0.6, -0.6))
+    bank.reset()
+    assert not bank.Ti.any() and not bank.last_position.any()
@@ -0,0 +1,145 @@
+import numpy as np
+from krpctoolkit.pool import ConnectionPool, bind, snapshot_parts
+
+class Server(object):
+    """ Values of the remote parts, shared by every connection """
+
+    def __init__(self, n):
+        self.titles = ['Part %d' % i for i in range(n)]
+        self.parents = [None] + list(range(n-1))
+
+class Remote(object):
+    _service_name = 'SpaceCenter'
+
+    def __init__(self, conn, object_id):
+        self._client = conn
+        self._object_id = object_id
+
+class Part(Remote):
+    _class_name = 'Part'
+
+    def _call(self):
+        self._client.calls += 1
+        return self._client.server
+
+    @property
+    def title(self):
+        return self._call().titles[self._object_id - 1]
+
+    @property
+    def stage(self):
+        self._call()
+        return self._object_id % 3
+
+    @property
+    def mass(self):
+        self._call()
+        return 100. * self._object_id
+
+    @property
+    def massless(self):
+        self._call()
+        return self._object_id % 2 == 0
+
+    @property
+    def parent(self):
+        parent = self._call().parents[self._object_id - 1]
+        return None if parent is None else Part(self._client, parent + 1)
+
+    @property
+    def neighbours(self):
+        self._call()
+        return [Part(self._client, self._object_id), Part(self._client, self._object_id + 1)]
+
+class Vessel(Remote):
+    _class_name = 'Vessel'
+
+class ClassType(object):
+    def __init__(self, python_type):
+        self.python_type = python_type
+
+class Types(object):
+    def class_type(self, service, name):
+        assert service == 'SpaceCenter'
+        return ClassType({'Part': Part, 'Vessel': Vessel}[name])
+
+class Connection(object):
+    def __init__(self, server):
+        self.server = server
+        self._types = Types()
+        self.calls = 0
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+def _pool(server, size=3):
+    def connect():
+        return Connection(server)
+    return ConnectionPool(size, connect=connect)
+
+def test_bind():
+    server = Server(3)
+    home = Connection(server)
+    other = Connection(server)
+    part = Part(home, 2)
+    assert bind(part, home) is part
+    bound = bind(part, other)
+    assert type(bound) is Part
+    assert bound._client is other
+    assert bound._object_id == 2
+
+    parts = bind([Part(home, 1), None, Part(other, 3)], other)
+    assert isinstance(parts, list)
+    assert [p._client for p in parts if p is not None] == [other, other]
+    assert parts[1] is None
+    pair = bind((Part(home, 1), [Part(home, 2)]), other)
+    assert isinstance(pair, tuple)
+    assert pair[0]._client is other and pair[1][0]._client is other
+    assert bind(1.5, other) == 1.5
+
+def test_snapshot_parts():
+    server = Server(50)
+    home = Connection(server)
+    parts = [Part(home, i) for i in range(1, 51)]
+    with _pool(server) as pool:
+        table = snapshot_parts(pool, Vessel(home, 100), [
+            'title', 'stage', 'mass', 'massless', 'parent', 'neighbours',
+            ('heavy', lambda part: part.mass > 2500)], parts)
+        # Every value was fetched on the pool, none on the vessel's connection
+        assert home.calls == 0
+        assert sum(conn.calls for conn in pool.connections) == 50 * 7
+    assert all(conn.closed for conn in pool.connections)
+
+    # Results keep the order of the parts across chunks
+    assert len(table) == 50
+    assert table.parts is parts
+    assert table['title'] == server.titles
+    assert table['parent'][0] is None
+    assert [parent._object_id for parent in table['parent'][1:]] == list(range(1, 50))
+    assert [[p._object_id for p in ps] for ps in table['neighbours']] == [[i, i+1] for i in range(1, 51)]
+
+    # Remote objects are rebound to the vessel's connection
+    assert all(parent._client is home for parent in table['parent'][1:])
+    assert all(p._client is home for ps in table['neighbours'] for p in ps)
+
+    # Numeric and boolean columns are arrays
+    assert table['stage'].dtype.kind == 'i'
+    assert np.array_equal(table['stage'], np.arange(1, 51) % 3)
+    assert table['mass'].dtype.kind == 'f'
+    assert np.array_equal(table['mass'], 100. * np.arange(1, 51))
+    assert table['massless'].dtype == bool
+    assert np.array_equal(table['massless'], np.arange(1, 51) % 2 == 0)
+    assert table['heavy'].dtype == bool
+    assert table['heavy'].sum() == 25
+    assert table.row(0) == dict(
+        (name, table[name][0]) for name in table.columns)
+
+def test_snapshot_parts_without_pool():
+    server = Server(4)
+    home = Connection(server)
+    parts = [Part(home, i) for i in range(1, 5)]
+    table = snapshot_parts(None, Vessel(home, 100), ['title', 'mass'], parts)
+    assert home.calls == 8
+    assert table['title'] == server.titles
+    assert np.array_equal(table['mass'], [100., 200., 300., 400.])
@@ -0,0 +1,49 @@
+import atexit
+import pytest
+from krpctoolkit import strict
+from krpctoolkit.profiler import Profiler
+
+class Client(object):
+    def _invoke(self, service, procedure, *args):
+        return 1.
+
+def test_profiled_invoke():
+    conn = Client()
+    profiler = Profiler(conn)
+    assert conn._invoke('SpaceCenter', 'get_UT') == 1.
+    assert profiler.phases['default'].rpcs == 1
+    profiler.close()
+    conn._invoke('SpaceCenter', 'get_UT')
+    assert profiler.phases['default'].rpcs == 1
+
+def test_close_unregisters_dump(monkeypatch):
+    registered = []
+    monkeypatch.setattr(atexit, 'register', registered.append)
+    monkeypatch.setattr(atexit, 'unregister', registered.remove)
+    profiler = Profiler(Client(), dump_on_exit=True)
+    assert registered == [profiler.dump]
+    profiler.close()
+    assert registered == []
+
+def _client():
+    from krpc.client import Client
+    return Client.__new__(Client)
+
+@pytest.mark.parametrize('profile_first', [True, False])
+def test_strict_mode_sees_profiled_calls(profile_first, monkeypatch):
+    from krpc.client import Client
+    # Start from a client that strict mode has not been installed on
+    monkeypatch.setattr(strict, '_installed', False)
+    monkeypatch.setattr(Client, '_invoke', lambda self, *args: None)
+    conn = _client()
+    if profile_first:
+        profiler = Profiler(conn)
+        strict.enable(conn)
+    else:
+        strict.enable(conn)
+        profiler = Profiler(conn)
+    with strict.tick('controller'):
+        with pytest.raises(strict.BlockingCallError):
+            conn._invoke('SpaceCenter', 'get_UT', [], [], [], float)
+    assert profiler.phases['default'].rpcs == 1
+    profiler.close()
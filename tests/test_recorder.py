@@ -0,0 +1,30 @@
+import numpy as np
+from krpctoolkit.recorder import Recorder, Recording
+
+def test_round_trip(tmp_path):
+    path = str(tmp_path / 'flight.rec')
+    values = iter(range(100))
+    clock = iter(range(100))
+    recorder = Recorder(path, [
+        ('altitude', lambda: float(next(values))),
+        ('vector', lambda: (1., 2., 3.))], capacity=10, clock=lambda: next(clock), flush_interval=0.01)
+    for _ in range(5):
+        recorder()
+    recording = Recording(path)
+    # The first value of each source is read to find the column widths
+    assert list(recording['time']) == [0, 1, 2, 3, 4]
+    assert list(recording['altitude']) == [1, 2, 3, 4, 5]
+    assert recording['vector'].shape == (5, 3)
+    recorder.close()
+
+def test_wrap(tmp_path):
+    path = str(tmp_path / 'flight.rec')
+    values = iter(range(100))
+    recorder = Recorder(path, [('x', lambda: float(next(values)))], capacity=4, clock=lambda: 0.)
+    for _ in range(6):
+        recorder()
+    recorder.close()
+    recording = Recording(path)
+    assert recording.wrapped
+    assert list(recording['x']) == [3, 4, 5, 6]
+    assert all(isinstance(x, np.ndarray) for x in recording.segments('x'))
@@ -0,0 +1,48 @@
+import warnings
+import pytest
+from krpc.schema import KRPC_pb2 as KRPC
+from krpctoolkit import replay
+
+def _request(procedure):
+    request = KRPC.Request()
+    call = request.calls.add()
+    call.service = 'SpaceCenter'
+    call.procedure = procedure
+    return request.SerializeToString()
+
+@pytest.fixture
+def log(tmp_path):
+    path = str(tmp_path / 'flight.log')
+    with open(path, 'wb') as f:
+        for t, procedure in enumerate(['A', 'B', 'C', 'D']):
+            request, response = _request(procedure), procedure.lower().encode()
+            payload = replay._RPC.pack(len(request), len(response)) + request + response
+            f.write(replay._RECORD.pack(replay.RPC, float(t), len(payload)))
+            f.write(payload)
+    return path
+
+def test_strict_divergence_raises(log):
+    session = replay.Replay(log)
+    assert session._request(_request('A')) == b'a'
+    with pytest.raises(replay.ReplayDivergence):
+        session._request(_request('C'))
+
+def test_divergence_skips_ahead_to_matching_request(log):
+    session = replay.Replay(log, strict=False)
+    with warnings.catch_warnings(record=True):
+        warnings.simplefilter('always')
+        assert session._request(_request('A')) == b'a'
+        assert session._request(_request('C')) == b'c'
+        assert session._request(_request('D')) == b'd'
+    assert len(session.divergences) == 1
+    assert session.finished
+
+def test_unmatched_request_gets_no_response(log):
+    session = replay.Replay(log, strict=False)
+    with warnings.catch_warnings(record=True) as caught:
+        warnings.simplefilter('always')
+        assert session._request(_request('X')) is None
+        # The log has not moved on
+        assert session._request(_request('A')) == b'a'
+    assert len(caught) == 1
+    assert session.rpcs == 1
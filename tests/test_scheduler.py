@@ -0,0 +1,90 @@
+from krpctoolkit.scheduler import Scheduler
+
+class Clock(object):
+    def __init__(self):
+        self.now = 0.
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+def _scheduler():
+    clock = Clock()
+    return clock, Scheduler(clock=clock, sleep=clock.sleep)
+
+def test_tasks_run_in_deadline_order():
+    clock, scheduler = _scheduler()
+    calls = []
+
+    def task(name, count):
+        def fn():
+            calls.append((name, clock()))
+            return len([c for c in calls if c[0] == name]) == count
+        return fn
+
+    scheduler.add(task('fast', 4), rate=4)
+    scheduler.add(task('slow', 2), rate=1)
+    scheduler.run()
+    times = [t for _, t in calls]
+    assert times == sorted(times)
+    assert [t for name, t in calls if name == 'fast'] == [0., 0.25, 0.5, 0.75]
+    assert [t for name, t in calls if name == 'slow'] == [0., 1.]
+
+def test_deadlines_do_not_drift():
+    clock, scheduler = _scheduler()
+    times = []
+
+    def task():
+        times.append(clock())
+        clock.now += 0.03
+        return len(times) == 5
+
+    task = scheduler.add(task, rate=10)
+    scheduler.run()
+    assert [round(t, 9) for t in times] == [0., 0.1, 0.2, 0.3, 0.4]
+    assert task.stats.overruns == 0
+    assert task.stats.misses == 0
+
+def test_missed_deadlines_are_skipped():
+    clock, scheduler = _scheduler()
+    times = []
+
+    def task():
+        times.append(clock())
+        if len(times) == 1:
+            clock.now += 0.35
+        return len(times) == 3
+
+    task = scheduler.add(task, rate=10)
+    scheduler.run()
+    assert [round(t, 9) for t in times] == [0., 0.4, 0.5]
+    assert task.stats.overruns == 1
+    assert task.stats.misses == 3
+
+def test_run_until_and_close():
+    clock, scheduler = _scheduler()
+    closed = []
+
+    class Task(object):
+        def __init__(self, ticks):
+            self.ticks = ticks
+
+        def __call__(self):
+            self.ticks -= 1
+            return self.ticks == 0
+
+        def close(self):
+            closed.append(self)
+
+    short = Task(2)
+    forever = Task(-1)
+    until = scheduler.add(short, rate=10)
+    other = scheduler.add(forever, rate=10)
+    scheduler.run(until=until)
+    assert until.done and not other.done
+    assert closed == [short]
+    scheduler.remove(other)
+    assert closed == [short, forever]
+    scheduler.run()
@@ -0,0 +1,13 @@
+import sys
+import time
+from krpctoolkit import sim
+
+def test_run_restores_environment(tmp_path):
+    script = tmp_path / 'mission.py'
+    script.write_text('import krpc, time\nconn = krpc.connect()\ntime.sleep(10)\n')
+    krpc = sys.modules.get('krpc')
+    functions = (time.sleep, time.time, time.monotonic)
+    simulation = sim.run(str(script))
+    assert simulation.ut >= 10
+    assert sys.modules.get('krpc') is krpc
+    assert (time.sleep, time.time, time.monotonic) == functions
@@ -0,0 +1,56 @@
+from krpctoolkit.streams import add_stream, registry
+
+class Stream(object):
+    def __init__(self):
+        self._rate = 0
+        self.rates = []
+        self.removed = False
+
+    @property
+    def rate(self):
+        return self._rate
+
+    @rate.setter
+    def rate(self, value):
+        self._rate = value
+        self.rates.append(value)
+
+    def remove(self):
+        self.removed = True
+
+class Connection(object):
+    def add_stream(self, func, *args):
+        return Stream()
+
+def test_shared():
+    conn = Connection()
+    a = add_stream(conn, getattr, 'x', 'y')
+    b = add_stream(conn, getattr, 'x', 'y')
+    assert a.stream is b.stream
+    assert registry(conn).live == 1
+    a.remove()
+    assert not b.stream.removed
+    b.remove()
+    assert b.stream.removed
+    assert registry(conn).live == 0
+
+def test_rate_is_highest_wanted():
+    conn = Connection()
+    a = add_stream(conn, getattr, 'x', 'y', rate=2)
+    b = add_stream(conn, getattr, 'x', 'y', rate=10)
+    assert a.stream.rate == 10
+    b.rate = 1
+    assert a.stream.rate == 2
+    a.rate = 0
+    assert a.stream.rate == 0
+    a.remove()
+    assert b.stream.rate == 1
+
+def test_rate_only_sent_when_it_changes():
+    conn = Connection()
+    a = add_stream(conn, getattr, 'x', 'y', rate=5)
+    # Adding a handle with its rate sends at most one rate
+    b = add_stream(conn, getattr, 'x', 'y', rate=5)
+    b.rate = 2
+    b.rate = 5
+    assert a.stream.rates == [5]
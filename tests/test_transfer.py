@@ -0,0 +1,43 @@
+import numpy as np
+import pytest
+from krpctoolkit.kepler import Elements, propagate
+from krpctoolkit.transfer import lambert
+
+MU = 3.5316e12
+
+def _arcs(elements, flight_times):
+    """ Positions and velocities at the start and end of arcs of the orbits """
+    r1, v1 = propagate(elements, 0.)
+    r2, v2 = propagate(elements, flight_times)
+    return r1, v1, r2, v2
+
+@pytest.mark.parametrize('a, e', [(700000., 0.), (1000000., 0.3), (3000000., 0.8), (-1000000., 1.5)])
+def test_recovers_orbit(a, e):
+    elements = Elements(a, e, 0.2, 1., 2., 0.3, 0., MU)
+    n = np.sqrt(MU / abs(a)**3)
+    # Arcs of less than one revolution, avoiding half and whole revolutions
+    fractions = np.array([0.05, 0.3, 0.45, 0.55, 0.8, 0.95]) if e < 1 else np.array([0.2, 0.5, 1.])
+    flight_times = fractions * 2*np.pi / n
+    r1, v1, r2, v2 = _arcs(elements, flight_times)
+    w1, w2 = lambert(r1, r2, flight_times, MU)
+    assert np.allclose(w1, v1, rtol=1e-6, atol=1e-6 * np.linalg.norm(v1))
+    assert np.allclose(w2, v2, rtol=1e-6, atol=1e-6 * np.linalg.norm(v2))
+
+def test_retrograde():
+    elements = Elements(1000000., 0.1, 3., 1., 2., 0.3, 0., MU)
+    flight_time = 1000.
+    r1, v1, r2, v2 = _arcs(elements, flight_time)
+    w1, _ = lambert(r1, r2, flight_time, MU, prograde=False)
+    assert np.allclose(w1, v1, atol=1e-6 * np.linalg.norm(v1))
+    # The prograde solution goes the other way round
+    w1, _ = lambert(r1, r2, flight_time, MU)
+    assert np.dot(np.cross(r1, w1), (0, 0, 1)) > 0
+
+def test_broadcasts():
+    r1 = np.array([700000., 0., 0.])
+    r2 = np.array([[0., 700000., 0.], [-500000., 500000., 0.]])
+    flight_times = np.array([[600.], [900.], [1200.]])
+    v1, v2 = lambert(r1, r2[None, :, :], flight_times, MU)
+    assert v1.shape == (3, 2, 3)
+    single, _ = lambert(r1, r2[1], 900., MU)
+    assert np.allclose(v1[1, 1], single)
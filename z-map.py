@@ -1,20 +1,24 @@
 import krpc
-import time
+from krpctoolkit import events
 from krpctoolkit.launch import Ascend
 from krpctoolkit.staging import AutoStage
+from krpctoolkit.parts import PartIndex
 from krpctoolkit.maneuver import circularize, ExecuteNode
+from krpctoolkit.scheduler import Scheduler
+from krpctoolkit.streams import registry
 
 target_altitude = 100000
 
 conn = krpc.connect(name='Z-MAP')
 vessel = conn.space_center.active_vessel
 
+index = PartIndex(conn, vessel)
+scheduler = Scheduler()
+
 print('Launching')
-ascend = Ascend(conn, vessel, target_altitude)
-staging = AutoStage(conn, vessel)
-while not ascend():
-    staging()
-    time.sleep(0.1)
+ascend = scheduler.add(Ascend(conn, vessel, target_altitude), rate=10)
+staging = scheduler.add(AutoStage(conn, vessel, index=index, rate=2), rate=2)
+scheduler.run(until=ascend)
 
 vessel.auto_pilot.max_rotation_speed = 0.2
 vessel.auto_pilot.reference_frame = vessel.orbital_reference_frame
@@ -23,18 +27,21 @@ vessel.auto_pilot.target_roll = float('nan')
 vessel.auto_pilot.engage()
 
 print('Coasting out of atmosphere')
-altitude = conn.add_stream(getattr, vessel.flight(), 'mean_altitude')
 atmosphere_altitude = vessel.orbit.body.atmosphere_depth * 1.01
-while altitude() < atmosphere_altitude:
-    pass
+coast = events.above(conn, atmosphere_altitude, getattr, vessel.flight(), 'mean_altitude')
+# Nothing to do until the vessel leaves the atmosphere
+coast.stream.rate = 2
+coast.wait()
+coast.remove()
 
 print('Circularizing')
 vessel.control.remove_nodes()
 node = circularize(conn, vessel)
-execute = ExecuteNode(conn, vessel, node)
-while not execute():
-    staging()
-    time.sleep(0.1)
+burn = ExecuteNode(conn, vessel, node)
+execute = scheduler.add(burn, rate=20)
+scheduler.run(until=execute)
+print('Cutoff error %.3f m/s' % burn.cutoff_error)
+scheduler.remove(staging)
 node.remove()
 
 vessel.auto_pilot.reference_frame = vessel.orbital_reference_frame
@@ -43,11 +50,9 @@ vessel.auto_pilot.target_roll = float('nan')
 vessel.auto_pilot.engage()
 
 print('Deploying Satellite')
-for part in vessel.parts.all:
-    for module in part.modules:
-        if module.name == 'ModuleAnimateGeneric':
-            if module.has_event('Extend'):
-                module.trigger_event('Extend')
+index.update()
+index.trigger_event('Extend', 'ModuleAnimateGeneric')
+index.close()
 vessel.control.activate_next_stage()
 
-print('Complete')
+print('Complete, %d streams live' % registry(conn).live)